@@ -0,0 +1,18 @@
+class CursorPaginationMixin:
+    """
+    Mixin для ViewSet: включает курсорную пагинацию (cursor_pagination_class) вместо pagination_class,
+    если клиент передал ?pagination=cursor или уже получил курсор (?cursor=...).
+    Без этих параметров ответы остаются прежними (номер страницы, count).
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if self.cursor_pagination_class is not None and (
+                    params.get('pagination') == 'cursor' or 'cursor' in params):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
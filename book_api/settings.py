@@ -27,6 +27,23 @@ env = environ.Env(
     DATABASES_PASSWORD_BOOK_API=str,
     DATABASE_HOST_BOOK_API=str,
     DATABASE_PORT_BOOK_API=(int, 5434),
+
+    BOOK_INGESTION_WORKERS=(int, 2),
+    BOOK_INGESTION_JOB_TIMEOUT=(int, 10 * 60),
+    BOOK_INGESTION_HEARTBEAT_INTERVAL=(int, 60),
+    BOOK_INGESTION_MAX_ATTEMPTS=(int, 3),
+    BOOK_INGESTION_QUEUED_GRACE=(int, 60),
+    BOOK_INGESTION_RECOVERY_INTERVAL=(int, 5 * 60),
+    BOOK_PAGE_BULK_BATCH_SIZE=(int, 500),
+    BOOK_PDF_EXTRACT_WORKERS=(int, 1),
+    BOOK_PDF_EXTRACT_CHUNK_PAGES=(int, 16),
+    BOOK_PAGE_COMPRESSION=(str, ''),
+    BOOK_PAGE_ZSTD_DICTIONARIES=(dict, {}),
+    BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES=(list, []),
+    BOOK_PAGE_WINDOW_MAX_RADIUS=(int, 10),
+    BOOK_CONTENT_CACHE_CONTROL=(str, 'max-age=0, must-revalidate'),
+    BOOK_PAGE_CACHE_ALIAS=(str, 'default'),
+    BOOK_PAGE_CACHE_TIMEOUT=(int, 24 * 60 * 60),
 )
 
 # Quick-start development settings - unsuitable for production
@@ -53,6 +70,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'corsheaders',
@@ -181,6 +199,39 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Количество потоков фоновой обработки загруженных книг (в каждом процессе gunicorn)
+BOOK_INGESTION_WORKERS = env('BOOK_INGESTION_WORKERS')
+# Восстановление задач после перезапуска процессов (секунды): воркер отмечается в задаче каждые HEARTBEAT_INTERVAL,
+# задача в статусе running без отметки дольше JOB_TIMEOUT считается потерянной и возвращается в очередь
+# (не больше MAX_ATTEMPTS попыток), задача в queued дольше QUEUED_GRACE отправляется в пул повторно;
+# проверка выполняется при старте и каждые RECOVERY_INTERVAL (одновременно только в одном процессе)
+BOOK_INGESTION_JOB_TIMEOUT = env('BOOK_INGESTION_JOB_TIMEOUT')
+BOOK_INGESTION_HEARTBEAT_INTERVAL = env('BOOK_INGESTION_HEARTBEAT_INTERVAL')
+BOOK_INGESTION_MAX_ATTEMPTS = env('BOOK_INGESTION_MAX_ATTEMPTS')
+BOOK_INGESTION_QUEUED_GRACE = env('BOOK_INGESTION_QUEUED_GRACE')
+BOOK_INGESTION_RECOVERY_INTERVAL = env('BOOK_INGESTION_RECOVERY_INTERVAL')
+# Размер пачки страниц для bulk_create при сохранении глав
+BOOK_PAGE_BULK_BATCH_SIZE = env('BOOK_PAGE_BULK_BATCH_SIZE')
+# Количество процессов для извлечения текста из PDF (1 — без пула) и размер диапазона страниц на задачу
+BOOK_PDF_EXTRACT_WORKERS = env('BOOK_PDF_EXTRACT_WORKERS')
+BOOK_PDF_EXTRACT_CHUNK_PAGES = env('BOOK_PDF_EXTRACT_CHUNK_PAGES')
+# Сжатие текста новых страниц: '' (выключено), 'zlib' или 'zstd' (нужен пакет zstandard).
+# Словари zstd по языкам книг в формате "ru=/path/ru.dict,en=/path/en.dict" (см. команду train_page_dictionary)
+BOOK_PAGE_COMPRESSION = env('BOOK_PAGE_COMPRESSION')
+BOOK_PAGE_ZSTD_DICTIONARIES = env('BOOK_PAGE_ZSTD_DICTIONARIES')
+# Прежние файлы словарей zstd через запятую: новые страницы ими не сжимаются, но страницы, сжатые ими раньше,
+# читаются (словарь выбирается по dict_id). После переобучения словаря добавьте сюда старый файл
+BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES = env('BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES')
+# Максимальное количество соседних страниц с каждой стороны в books/{id}/page_window/
+BOOK_PAGE_WINDOW_MAX_RADIUS = env('BOOK_PAGE_WINDOW_MAX_RADIUS')
+# Заголовок Cache-Control для страниц и списков страниц глав (ответы с ETag/Last-Modified).
+# По умолчанию кэш (в т.ч. обратный прокси) хранит ответ, но перепроверяет его при каждом запросе (304 без тела)
+BOOK_CONTENT_CACHE_CONTROL = env('BOOK_CONTENT_CACHE_CONTROL')
+# Кэш готовых ответов со страницами: алиас из CACHES (пустая строка — кэш выключен) и время жизни записи в секундах.
+# Без настройки CACHES используется локальный кэш процесса (LocMemCache); для нескольких процессов — Redis/Memcached
+BOOK_PAGE_CACHE_ALIAS = env('BOOK_PAGE_CACHE_ALIAS')
+BOOK_PAGE_CACHE_TIMEOUT = env('BOOK_PAGE_CACHE_TIMEOUT')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_api.settings')
 
 application = get_wsgi_application()
+
+# Пул обработки книг живёт в памяти процесса: при старте процесса возвращаем в работу
+# задачи, потерянные при перезапуске или падении предыдущих процессов, и проверяем их периодически.
+# Поток запускается в каждом процессе gunicorn, но проверку в один момент выполняет только один из них
+# (advisory-блокировка). Вместо периодической проверки в потоке (BOOK_INGESTION_RECOVERY_INTERVAL=0 — только
+# при старте) можно запускать по расписанию команду recover_ingestion_jobs
+from book_service.services.ingestion import start_ingestion_recovery  # noqa: E402
+
+start_ingestion_recovery()
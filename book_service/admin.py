@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Book, BookChapter, Genre, BookGenre, Page
+from .models import Book, BookChapter, Genre, BookGenre, Page, IngestionJob
+from .services.content_version import mark_book_content_changed
 
 
 class BookGenreInline(admin.TabularInline):
@@ -11,12 +12,20 @@ class BookGenreInline(admin.TabularInline):
 
 
 class PageInline(admin.TabularInline):
+    """
+    Страницы главы только для просмотра: текст редактируется на странице PageAdmin по ссылке,
+    где он распаковывается (get_content) и сохраняется через set_content — со сжатием и поисковым вектором.
+    """
     model = Page
-    extra = 1
-    readonly_fields = ('id',)
-    fields = ('page_number', 'content')
+    extra = 0
+    can_delete = False
+    readonly_fields = ('id', 'page_number')
+    fields = ('page_number',)
     show_change_link = True
 
+    def has_add_permission(self, request, obj=None):
+        return False
+
 
 class BookChapterInline(admin.TabularInline):
     model = BookChapter
@@ -36,6 +45,14 @@ class BookAdmin(admin.ModelAdmin):
     inlines = [BookGenreInline, BookChapterInline]
     # Удален filter_horizontal, так как он несовместим с промежуточной моделью
 
+    # Добавление, изменение и удаление глав в инлайне дают новую версию содержимого книги, как в BookChapterAdmin;
+    # изменение только полей книги или жанров версию не меняет
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if any(formset.model is BookChapter and (
+                formset.new_objects or formset.changed_objects or formset.deleted_objects) for formset in formsets):
+            mark_book_content_changed(form.instance.id)
+
 
 @admin.register(BookChapter)
 class BookChapterAdmin(admin.ModelAdmin):
@@ -45,6 +62,15 @@ class BookChapterAdmin(admin.ModelAdmin):
     readonly_fields = ('id',)
     inlines = [PageInline]
 
+    # Изменения глав и страниц в админке тоже дают новую версию содержимого книги (ETag, кэш страниц)
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        mark_book_content_changed(form.instance.book_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        mark_book_content_changed(obj.book_id)
+
 
 @admin.register(Page)
 class PageAdmin(admin.ModelAdmin):
@@ -52,9 +78,39 @@ class PageAdmin(admin.ModelAdmin):
     search_fields = ('chapter__book__title', 'chapter__chapter_title', 'content')
     list_filter = ('chapter__book',)
     readonly_fields = ('id',)
+    exclude = ('content_compressed',)
+
+    def get_object(self, request, object_id, from_field=None):
+        # В форме редактируется распакованный текст страницы
+        page = super().get_object(request, object_id, from_field)
+        if page is not None:
+            page.content = page.get_content()
+        return page
+
+    def save_model(self, request, obj, form, change):
+        obj.set_content(obj.content, language=obj.chapter.book.language)
+        super().save_model(request, obj, form, change)
+        mark_book_content_changed(obj.book_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        mark_book_content_changed(obj.book_id)
+
+    def delete_queryset(self, request, queryset):
+        book_ids = set(queryset.values_list('book_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for book_id in book_ids:
+            mark_book_content_changed(book_id)
 
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
     list_display = ('id', 'name')
     search_fields = ('name',)
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('file_path', 'user_id', 'status', 'total_chapters', 'total_pages', 'created_at', 'finished_at')
+    list_filter = ('status', 'file_extension')
+    readonly_fields = ('id', 'created_at', 'updated_at', 'started_at', 'finished_at')
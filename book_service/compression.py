@@ -0,0 +1,141 @@
+# Сжатие текста страниц (Page.content_compressed).
+# Формат значения: байт кодека (\x00 — без сжатия, \x01 — zlib, \x03 — zstd) и сжатые данные; для zstd после
+# байта кодека идут 4 байта идентификатора словаря (dict_id, big-endian, 0 — без словаря) и кадр zstd.
+# Словарь ищется по dict_id среди текущих (BOOK_PAGE_ZSTD_DICTIONARIES) и выведенных из употребления
+# (BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES), так что после переобучения словаря старые страницы продолжают читаться.
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+_CODEC_MARKERS = {
+    CODEC_NONE: b'\x00',
+    CODEC_ZLIB: b'\x01',
+    CODEC_ZSTD: b'\x03',
+}
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+
+def require_zstandard():
+    """
+    Импортирует необязательный пакет zstandard или сообщает, что он не установлен.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured(
+            "Для BOOK_PAGE_COMPRESSION='zstd' нужен пакет zstandard (pip install zstandard)"
+        )
+    return zstandard
+
+
+def normalize_language(language):
+    """
+    Приводит код языка книги ('en-US', 'ru_RU') к ключу словаря ('en', 'ru').
+    """
+    if not language:
+        return ''
+    return language.split('-')[0].split('_')[0].lower()
+
+
+def get_page_codec():
+    """
+    Возвращает кодек, выбранный в BOOK_PAGE_COMPRESSION, или None, если сжатие выключено.
+    """
+    codec = settings.BOOK_PAGE_COMPRESSION
+    if not codec:
+        return None
+    if codec not in _CODEC_MARKERS:
+        raise ImproperlyConfigured(
+            f"Неизвестное значение BOOK_PAGE_COMPRESSION: {codec!r} (допустимо: zlib, zstd)"
+        )
+    if codec == CODEC_ZSTD:
+        require_zstandard()
+    return codec
+
+
+@lru_cache(maxsize=None)
+def _load_zstd_dictionary_file(path):
+    with open(path, 'rb') as f:
+        return require_zstandard().ZstdCompressionDict(f.read())
+
+
+def _get_language_zstd_dictionary(name):
+    """
+    Текущий словарь zstd для языка (BOOK_PAGE_ZSTD_DICTIONARIES) или None.
+    """
+    path = settings.BOOK_PAGE_ZSTD_DICTIONARIES.get(name)
+    return _load_zstd_dictionary_file(path) if path else None
+
+
+def _get_zstd_dictionary_by_id(dict_id):
+    """
+    Словарь zstd с указанным dict_id среди текущих и выведенных из употребления словарей.
+    """
+    paths = list(settings.BOOK_PAGE_ZSTD_DICTIONARIES.values()) + list(settings.BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES)
+    for path in paths:
+        dictionary = _load_zstd_dictionary_file(path)
+        if dictionary.dict_id() == dict_id:
+            return dictionary
+    raise ImproperlyConfigured(
+        f"Страница сжата словарём zstd с dict_id={dict_id}, но его нет ни в BOOK_PAGE_ZSTD_DICTIONARIES, "
+        f"ни в BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES"
+    )
+
+
+def compress_text(text, codec=None, language=None):
+    """
+    Сжимает текст страницы.
+
+    :param text: Текст страницы
+    :param codec: 'zlib', 'zstd' или 'none'; по умолчанию кодек из BOOK_PAGE_COMPRESSION
+    :param language: Код языка книги; для zstd выбирает словарь из BOOK_PAGE_ZSTD_DICTIONARIES, если он задан
+    :return: bytes с заголовком кодека
+    """
+    codec = codec or get_page_codec() or CODEC_NONE
+    data = text.encode('utf-8')
+
+    if codec == CODEC_ZLIB:
+        return _CODEC_MARKERS[CODEC_ZLIB] + zlib.compress(data, ZLIB_LEVEL)
+
+    if codec == CODEC_ZSTD:
+        zstandard = require_zstandard()
+        name = normalize_language(language)
+        dictionary = _get_language_zstd_dictionary(name) if name else None
+        dict_id = dictionary.dict_id() if dictionary is not None else 0
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        return _CODEC_MARKERS[CODEC_ZSTD] + dict_id.to_bytes(4, 'big') + compressor.compress(data)
+
+    return _CODEC_MARKERS[CODEC_NONE] + data
+
+
+def decompress_text(value):
+    """
+    Восстанавливает текст страницы из значения, полученного compress_text.
+    """
+    value = bytes(value)
+    marker, payload = value[:1], value[1:]
+
+    if marker == _CODEC_MARKERS[CODEC_NONE]:
+        data = payload
+    elif marker == _CODEC_MARKERS[CODEC_ZLIB]:
+        data = zlib.decompress(payload)
+    elif marker == _CODEC_MARKERS[CODEC_ZSTD]:
+        dict_id = int.from_bytes(payload[:4], 'big')
+        data = _zstd_decompress(payload[4:], dict_id)
+    else:
+        raise ValueError('Неизвестный формат сжатой страницы')
+
+    return data.decode('utf-8')
+
+
+def _zstd_decompress(frame, dict_id):
+    dictionary = _get_zstd_dictionary_by_id(dict_id) if dict_id else None
+    return require_zstandard().ZstdDecompressor(dict_data=dictionary).decompress(frame)
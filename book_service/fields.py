@@ -0,0 +1,34 @@
+from django.db import models
+
+from .compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Текстовое поле, которое хранится в базе данных в сжатом виде (bytea).
+
+    В Python значение поля — строка (распаковывается при чтении из БД) или уже сжатые bytes
+    из compress_text (так Page.set_content выбирает словарь по языку книги).
+    Строка при сохранении сжимается кодеком из BOOK_PAGE_COMPRESSION.
+    """
+    description = "Compressed text"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return compress_text(value)
+        return bytes(value)
+
+    def value_to_string(self, obj):
+        return self.to_python(self.value_from_object(obj))
@@ -7,6 +7,7 @@ class BookFilter(django_filters.FilterSet):
     Фильтр для модели Book, позволяющий искать книги по частичному совпадению названия (title)
     и выбирать книги сразу по нескольким жанрам (genres). Использует соединённую фильтрацию (conjoined=True),
     требуя, чтобы все выбранные жанры присутствовали у книги.
+    Поиск по названию (UPPER(title) LIKE ...) обслуживается триграммным GIN-индексом book_title_trgm_idx.
 
     :param title: Поиск по названию книги (регистр не учитывается)
     :param genres: Выбор книг, содержащих все указанные жанры
@@ -0,0 +1,159 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book_service.services.utils import clean_text, get_chapter_title_detector
+
+
+def legacy_detect_chapter_title(line):
+    """
+    Прежняя реализация detect_chapter_title (для сравнения).
+    """
+    if not line:
+        return None
+
+    line = line.strip()
+
+    if len(line) < 3:
+        return None
+
+    words = line.split()
+    if len(words) > 8:
+        return None
+
+    chapter_keywords = [
+        'chapter',
+        'глава',
+        'part',
+        'часть',
+        'section',
+        'раздел'
+    ]
+    line_lower = line.lower()
+
+    for keyword in chapter_keywords:
+        if line_lower.startswith(keyword):
+            return line
+
+    return None
+
+
+def legacy_clean_text(text):
+    """
+    Прежняя реализация clean_text (для сравнения).
+    """
+    if not text:
+        return ''
+
+    text = text.replace('\t', ' ')
+    text = re.sub(r' {2,}', ' ', text)
+    text = re.sub(r'\n{3,}', '\n', text)
+
+    lines = text.split('\n')
+    cleaned_lines = [line.strip() for line in lines]
+    cleaned_text = '\n'.join(cleaned_lines)
+
+    return cleaned_text.strip()
+
+
+def build_corpus(size_bytes, seed=0):
+    """
+    Генерирует синтетический текст книги (английский и русский) размером не меньше size_bytes:
+    обычные строки разной длины, лишние пробелы и табуляции, пустые строки и изредка заголовки глав.
+    """
+    rng = random.Random(seed)
+    words = (
+        'the of and to in that was he his it with as had for on but not be at by '
+        'particular partner sectional chapters '
+        'и в не на что он с как его но это по к из у за от так же '
+        'главный частный разделить'
+    ).split()
+    headings = ['Chapter {}', 'CHAPTER {}', 'Part {}', 'Section {}', 'Глава {}', 'Часть {}', 'Раздел {}']
+
+    lines = []
+    size = 0
+    number = 0
+    while size < size_bytes:
+        roll = rng.random()
+        if roll < 0.005:
+            number += 1
+            line = rng.choice(headings).format(number)
+        elif roll < 0.05:
+            line = ''
+        else:
+            line = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 18)))
+            if roll < 0.1:
+                line = '\t' + line.replace(' ', '   ', 2) + '  '
+        lines.append(line)
+        size += len(line.encode('utf-8')) + 1
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = (
+        "Микробенчмарк определения заголовков глав и очистки текста: "
+        "сравнивает прежнюю и текущую реализации (строк в секунду)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=8.0,
+                            help='Размер синтетического корпуса в мегабайтах (по умолчанию 8)')
+        parser.add_argument('--file', help='Путь к текстовому файлу (UTF-8) вместо синтетического корпуса')
+        parser.add_argument('--language', default=None, help="Код языка книги для детектора, например 'en-US'")
+        parser.add_argument('--repeat', type=int, default=3, help='Количество повторов, берётся лучшее время')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                with open(options['file'], encoding='utf-8') as f:
+                    corpus = f.read()
+            except OSError as e:
+                raise CommandError(f'Не удалось прочитать файл: {e}')
+        else:
+            corpus = build_corpus(int(options['size_mb'] * 1024 * 1024))
+
+        lines = corpus.split('\n')
+        detector = get_chapter_title_detector(options['language'])
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f'Корпус: {len(corpus.encode("utf-8")) / 1024 / 1024:.1f} MB, {len(lines)} строк')
+
+        legacy_titles = [legacy_detect_chapter_title(line) for line in lines]
+        titles = [detector.detect(line) for line in lines]
+        if options['language'] is None and legacy_titles != titles:
+            raise CommandError('Результаты detect_chapter_title расходятся с прежней реализацией')
+        if legacy_clean_text(corpus) != clean_text(corpus):
+            raise CommandError('Результаты clean_text расходятся с прежней реализацией')
+
+        self._report(
+            'detect_chapter_title',
+            len(lines),
+            self._best_time(lambda: [legacy_detect_chapter_title(line) for line in lines], repeat),
+            self._best_time(lambda: [detector.detect(line) for line in lines], repeat),
+        )
+        self._report(
+            'clean_text',
+            len(lines),
+            self._best_time(lambda: legacy_clean_text(corpus), repeat),
+            self._best_time(lambda: clean_text(corpus), repeat),
+        )
+        self.stdout.write(f'Найдено заголовков: {sum(1 for title in titles if title)}')
+
+    @staticmethod
+    def _best_time(func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _report(self, name, line_count, legacy_seconds, current_seconds):
+        self.stdout.write(
+            f'{name}: до {line_count / legacy_seconds:,.0f} строк/с, '
+            f'после {line_count / current_seconds:,.0f} строк/с '
+            f'(x{legacy_seconds / current_seconds:.2f})'
+        )
@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.functions import Length
+
+from book_service.compression import get_page_codec
+from book_service.models import Page
+
+
+class Command(BaseCommand):
+    help = (
+        "Сжимает текст уже сохранённых страниц кодеком из BOOK_PAGE_COMPRESSION (пачками) "
+        "и выводит, насколько уменьшился объём текста. С --decompress возвращает страницы в несжатый вид."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество страниц в одной пачке')
+        parser.add_argument('--book', help='Обработать только страницы указанной книги (UUID)')
+        parser.add_argument('--decompress', action='store_true', help='Распаковать сжатые страницы')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать результат, ничего не записывая')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        decompress = options['decompress']
+        if not decompress and get_page_codec() is None:
+            raise CommandError('Сжатие выключено: задайте BOOK_PAGE_COMPRESSION (zlib или zstd)')
+
+        if decompress:
+            queryset = Page.objects.filter(content_compressed__isnull=False).annotate(
+                stored_size=Length('content_compressed'))
+            columns = ('id', 'content_compressed', 'chapter__book__language', 'stored_size')
+        else:
+            queryset = Page.objects.filter(content_compressed__isnull=True).exclude(content='')
+            columns = ('id', 'content', 'chapter__book__language')
+        if options['book']:
+            queryset = queryset.filter(chapter__book_id=options['book'])
+
+        table_size_before = self._table_size()
+        processed = 0
+        size_before = 0
+        size_after = 0
+        last_id = None
+
+        while True:
+            batch = queryset.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            rows = list(batch.values_list(*columns)[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            pages = []
+            for page_id, text, language, *stored_size in rows:
+                page = Page(id=page_id)
+                if decompress:
+                    page.content = text
+                    page.content_compressed = None
+                    size_before += stored_size[0]
+                    size_after += len(text.encode('utf-8'))
+                else:
+                    page.set_content(text, language=language)
+                    size_before += len(text.encode('utf-8'))
+                    size_after += len(page.content_compressed)
+                pages.append(page)
+
+            if not options['dry_run']:
+                with transaction.atomic():
+                    Page.objects.bulk_update(pages, ['content', 'content_compressed'])
+
+            processed += len(pages)
+            self.stdout.write(f'Обработано страниц: {processed}')
+
+        self._report(processed, size_before, size_after)
+        if not options['dry_run'] and table_size_before is not None:
+            self.stdout.write(
+                f'Размер таблицы страниц: до {_format_size(table_size_before)}, '
+                f'сейчас {_format_size(self._table_size())} '
+                f'(место освобождается после VACUUM)'
+            )
+
+    @staticmethod
+    def _table_size():
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [Page._meta.db_table])
+            return cursor.fetchone()[0]
+
+    def _report(self, processed, size_before, size_after):
+        if not processed:
+            self.stdout.write('Нет страниц для обработки')
+            return
+        ratio = size_after / size_before * 100 if size_before else 100
+        self.stdout.write(self.style.SUCCESS(
+            f'Страниц: {processed}; объём текста: до {_format_size(size_before)}, '
+            f'после {_format_size(size_after)} ({ratio:.1f}% от исходного)'
+        ))
+
+
+def _format_size(size):
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f} KB'
+    return f'{size / 1024 / 1024:.1f} MB'
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from book_service.services.ingestion import get_ingestion_executor, recover_ingestion_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Возвращает в работу задачи обработки книг, потерянные при перезапуске процессов: "
+        "зависшие в running без отметки воркера дольше BOOK_INGESTION_JOB_TIMEOUT и ожидающие в queued дольше "
+        "BOOK_INGESTION_QUEUED_GRACE. Задачи выполняются в пуле этого процесса, команда ждёт их завершения."
+    )
+
+    def handle(self, *args, **options):
+        result = recover_ingestion_jobs()
+        if result['skipped']:
+            self.stdout.write("Восстановление задач уже выполняется в другом процессе")
+            return
+        get_ingestion_executor().shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Возвращено в очередь: {result['requeued']}, помечено failed: {result['failed']}, "
+            f"обработано: {result['submitted']}"
+        ))
@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book_service.compression import require_zstandard, normalize_language
+from book_service.models import Page
+
+
+class Command(BaseCommand):
+    help = (
+        "Обучает словарь zstd на страницах книг указанного языка. "
+        "Путь к словарю затем указывается в BOOK_PAGE_ZSTD_DICTIONARIES (например ru=/path/ru-2.dict). "
+        "При замене словаря запишите новый в другой файл, а прежний добавьте в BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES: "
+        "страницы, сжатые им, продолжат читаться."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('language', help="Код языка книг, например 'ru' или 'en'")
+        parser.add_argument('output', help='Файл, в который будет записан словарь')
+        parser.add_argument('--size', type=int, default=112640, help='Размер словаря в байтах (по умолчанию 110 KB)')
+        parser.add_argument('--samples', type=int, default=20000, help='Максимальное количество страниц-образцов')
+
+    def handle(self, *args, **options):
+        zstandard = require_zstandard()
+        language = normalize_language(options['language'])
+        if not language:
+            raise CommandError('Не указан язык')
+        if os.path.exists(options['output']):
+            # Перезапись словаря, которым уже сжаты страницы, сделала бы их нечитаемыми
+            raise CommandError(f"Файл {options['output']} уже существует, укажите другой путь")
+
+        pages = (
+            Page.objects.filter(chapter__book__language__istartswith=language)
+            .iterator(chunk_size=1000)
+        )
+        samples = []
+        for page in pages:
+            text = page.get_content()
+            if text:
+                samples.append(text.encode('utf-8'))
+            if len(samples) >= options['samples']:
+                break
+
+        if not samples:
+            raise CommandError(f"Нет страниц книг с языком '{language}'")
+
+        try:
+            dictionary = zstandard.train_dictionary(options['size'], samples)
+        except zstandard.ZstdError as e:
+            raise CommandError(f'Не удалось обучить словарь: {e}')
+
+        with open(options['output'], 'wb') as f:
+            f.write(dictionary.as_bytes())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Словарь для '{language}' (dict_id={dictionary.dict_id()}, {len(dictionary.as_bytes())} байт, "
+            f"образцов: {len(samples)}) записан в {options['output']}"
+        ))
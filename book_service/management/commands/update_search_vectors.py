@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from book_service.models import Page
+from book_service.search_config import build_search_vector
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет полнотекстовые векторы страниц (Page.search_vector) пачками. "
+        "По умолчанию обрабатываются только страницы без вектора; --all пересчитывает все "
+        "(например, после изменения языка книги или SEARCH_CONFIGS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество страниц в одной пачке')
+        parser.add_argument('--book', help='Обработать только страницы указанной книги (UUID)')
+        parser.add_argument('--all', action='store_true', help='Пересчитать векторы всех страниц')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        queryset = Page.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(search_vector__isnull=True)
+        if options['book']:
+            queryset = queryset.filter(book_id=options['book'])
+
+        processed = 0
+        last_id = None
+        while True:
+            batch = queryset.order_by('id')
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            rows = list(batch.values_list('id', 'content', 'content_compressed', 'book__language')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            pages = []
+            for page_id, content, content_compressed, language in rows:
+                page = Page(id=page_id)
+                text = content if content_compressed is None else content_compressed
+                page.search_vector = build_search_vector(text, language)
+                pages.append(page)
+
+            with transaction.atomic():
+                Page.objects.bulk_update(pages, ['search_vector'])
+
+            processed += len(pages)
+            self.stdout.write(f'Обработано страниц: {processed}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, обновлено страниц: {processed}'))
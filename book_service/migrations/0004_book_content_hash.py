@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0003_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='SHA-256 исходного файла; сбрасывается при изменении содержимого книги', max_length=64, null=True),
+        ),
+    ]
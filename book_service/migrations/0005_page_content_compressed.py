@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:03
+
+import book_service.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0004_book_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='content_compressed',
+            field=book_service.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='page',
+            name='content',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:05
+
+import django.db.models.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0005_page_content_compressed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['user_id', '-created_at'], name='book_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookchapter',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('book', 'start_page_number'), name='bookchapter_book_start_page_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='page',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('chapter', 'page_number'), name='page_chapter_page_number_uniq'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='book',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='book_service.book'),
+        ),
+        # Заполняем book_id страниц из их глав. NOT NULL выставляется в следующей миграции:
+        # в одной транзакции с этим UPDATE PostgreSQL не даст изменить таблицу (pending trigger events)
+        migrations.RunSQL(
+            sql="""
+                UPDATE book_service_page
+                SET book_id = book_service_bookchapter.book_id
+                FROM book_service_bookchapter
+                WHERE book_service_page.chapter_id = book_service_bookchapter.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:06
+
+import django.db.models.constraints
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0007_page_book'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='page',
+            name='book',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='book_service.book'),
+        ),
+        migrations.AddConstraint(
+            model_name='page',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('book', 'page_number'), name='page_book_page_number_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0010_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Версия глав и страниц книги (для ETag и кэша страниц)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0011_book_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Количество запусков обработки (с учётом перезапусков)'),
+        ),
+    ]
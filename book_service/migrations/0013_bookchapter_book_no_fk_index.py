@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0012_ingestionjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookchapter',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='chapters', to='book_service.book'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book_service', '0013_bookchapter_book_no_fk_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Последний сигнал воркера, выполняющего задачу', null=True),
+        ),
+    ]
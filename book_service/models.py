@@ -1,6 +1,13 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 import uuid
 
+from .compression import compress_text, get_page_codec
+from .fields import CompressedTextField
+from .search_config import build_search_vector
+
 
 def book_cover_upload_path(instance, filename):
     """
@@ -14,7 +21,8 @@ class Book(models.Model):
     """
     Модель книги с основной информацией (название, описание, язык, обложка),
     привязкой к пользователю (user_id) и связью с жанрами.
-    Хранит общее количество глав и страниц.
+    Хранит общее количество глав и страниц, хэш исходного файла (для повторных загрузок)
+    и версию содержимого (content_version), которая увеличивается при любом изменении глав или страниц.
     """
     user_id = models.UUIDField(editable=False)
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -28,6 +36,19 @@ class Book(models.Model):
     total_chapters = models.IntegerField(default=0)
     total_pages = models.IntegerField(default=0)
     genres = models.ManyToManyField('Genre', through='BookGenre', related_name='books')
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True, editable=False,
+                                    help_text="SHA-256 исходного файла; сбрасывается при изменении содержимого книги")
+    content_version = models.PositiveIntegerField(default=1, editable=False,
+                                                  help_text="Версия глав и страниц книги (для ETag и кэша страниц)")
+
+    class Meta:
+        indexes = [
+            # Список книг пользователя: WHERE user_id = ... ORDER BY created_at DESC
+            models.Index(fields=['user_id', '-created_at'], name='book_user_created_idx'),
+            # Триграммный индекс для поиска по подстроке названия: title__icontains
+            # превращается в UPPER(title) LIKE UPPER('%...%') и использует этот индекс
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='book_title_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -65,7 +86,8 @@ class BookChapter(models.Model):
     а также названием главы. Связана с моделью Book.
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='chapters')
+    # Отдельный индекс по book не нужен: его покрывает уникальный индекс (book, start_page_number)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='chapters', db_index=False)
     start_page_number = models.IntegerField(null=True, blank=True)
     end_page_number = models.IntegerField(null=True, blank=True)
     chapter_title = models.CharField(
@@ -75,6 +97,16 @@ class BookChapter(models.Model):
         blank=True
     )
 
+    class Meta:
+        constraints = [
+            # Отложенная проверка: перенумерация глав внутри транзакции может временно давать совпадения
+            models.UniqueConstraint(
+                fields=['book', 'start_page_number'],
+                name='bookchapter_book_start_page_uniq',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
+
     def __str__(self):
         return f"{self.book.title} - {self.chapter_title or 'Глава с страницы ' + str(self.start_page_number)}"
 
@@ -83,11 +115,109 @@ class Page(models.Model):
     """
     Модель страницы, содержащая полный текст (content),
     привязанная к определённой главе (BookChapter).
+    Если включено сжатие (BOOK_PAGE_COMPRESSION), текст хранится в content_compressed, а content остаётся пустым;
+    читать и записывать текст следует через get_content() и set_content().
+    search_vector хранит полнотекстовый вектор страницы для поиска (индекс GIN).
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     chapter = models.ForeignKey(BookChapter, on_delete=models.CASCADE, related_name='pages')
+    # Денормализованная ссылка на книгу главы: страница находится по (book, page_number) одним индексным запросом
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='pages', editable=False, db_index=False)
     page_number = models.IntegerField()
-    content = models.TextField()
+    content = models.TextField(blank=True)
+    content_compressed = CompressedTextField(null=True, blank=True)
+    # Полнотекстовый вектор текста страницы (конфигурация по языку книги), обновляется в set_content()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='page_search_vector_gin'),
+        ]
+        constraints = [
+            # Отложенная проверка: перенумерация страниц внутри транзакции может временно давать совпадения
+            models.UniqueConstraint(
+                fields=['chapter', 'page_number'],
+                name='page_chapter_page_number_uniq',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+            # Номер страницы сквозной по всей книге; индекс обслуживает поиск страницы по книге и номеру
+            models.UniqueConstraint(
+                fields=['book', 'page_number'],
+                name='page_book_page_number_uniq',
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Книга страницы всегда совпадает с книгой её главы
+        self.book_id = self.chapter.book_id
+        super().save(*args, **kwargs)
+
+    def get_content(self):
+        """
+        Возвращает текст страницы (сжатый текст распаковывается).
+        """
+        if self.content_compressed is None:
+            return self.content
+        return self._meta.get_field('content_compressed').to_python(self.content_compressed)
+
+    def set_content(self, text, language=None):
+        """
+        Записывает текст страницы: сжимает его, если сжатие включено, иначе сохраняет как есть в content.
+        Полнотекстовый вектор страницы вычисляется базой данных при сохранении.
+
+        :param text: Текст страницы
+        :param language: Код языка книги (выбирает словарь zstd и конфигурацию полнотекстового поиска)
+        """
+        self.search_vector = build_search_vector(text, language)
+        codec = get_page_codec()
+        if codec is None:
+            self.content = text
+            self.content_compressed = None
+        else:
+            self.content = ''
+            self.content_compressed = compress_text(text, codec, language)
 
     def __str__(self):
         return f"Страница {self.page_number} главы {self.chapter.chapter_title or 'Без названия'}"
+
+
+class IngestionJob(models.Model):
+    """
+    Задача фоновой обработки загруженного файла книги.
+    Создаётся при загрузке (upload) и выполняется пулом воркеров,
+    хранит статус обработки (queued/running/done/failed), итоговое количество глав и страниц
+    и текст ошибки, если обработка не удалась. Задачи, потерянные при перезапуске процесса,
+    возвращаются в очередь функцией recover_ingestion_jobs.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.UUIDField(editable=False)
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True, related_name='ingestion_jobs')
+    file_path = models.CharField(max_length=500, help_text="Путь к исходному файлу в хранилище")
+    file_extension = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    total_chapters = models.IntegerField(default=0)
+    total_pages = models.IntegerField(default=0)
+    chapter_titles = models.JSONField(default=list, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0, help_text="Количество запусков обработки (с учётом перезапусков)")
+    heartbeat_at = models.DateTimeField(null=True, blank=True,
+                                        help_text="Последний сигнал воркера, выполняющего задачу")
+
+    def __str__(self):
+        return f"Обработка {self.file_path} ({self.status})"
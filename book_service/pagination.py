@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class BookPagination(PageNumberPagination):
@@ -11,3 +11,19 @@ class BookPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'page_size'
     max_page_size = 24
+
+
+class BookCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация списка книг в том же порядке, что и BookPagination (-created_at, -id).
+    - Курсор хранит created_at последней книги (первое поле ordering) и смещение среди книг с тем же created_at;
+      следующая страница выбирается условием created_at < курсора (индекс book_user_created_idx), а не OFFSET
+      по всему списку, поэтому дальние страницы стоят столько же, сколько первая
+    - id только делает порядок однозначным и в курсор не входит
+    - Курсор не «съезжает» при добавлении новых книг между запросами
+    - Размер страницы — как у BookPagination
+    """
+    page_size = BookPagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = BookPagination.max_page_size
+    ordering = ('-created_at', '-id')
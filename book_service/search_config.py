@@ -0,0 +1,43 @@
+from django.contrib.postgres.search import SearchVector
+from django.db.models import Value
+
+from .compression import normalize_language
+
+# Конфигурации полнотекстового поиска PostgreSQL по коду языка книги; для остальных языков — 'simple'
+SEARCH_CONFIGS = {
+    'en': 'english',
+    'ru': 'russian',
+    'de': 'german',
+    'fr': 'french',
+    'es': 'spanish',
+    'it': 'italian',
+    'pt': 'portuguese',
+    'nl': 'dutch',
+    'sv': 'swedish',
+    'da': 'danish',
+    'no': 'norwegian',
+    'nb': 'norwegian',
+    'fi': 'finnish',
+    'hu': 'hungarian',
+    'ro': 'romanian',
+    'tr': 'turkish',
+    'el': 'greek',
+    'ca': 'catalan',
+    'lt': 'lithuanian',
+    'sr': 'serbian',
+}
+DEFAULT_SEARCH_CONFIG = 'simple'
+
+
+def get_search_config(language):
+    """
+    Возвращает конфигурацию полнотекстового поиска PostgreSQL для кода языка книги ('en-US' -> 'english').
+    """
+    return SEARCH_CONFIGS.get(normalize_language(language), DEFAULT_SEARCH_CONFIG)
+
+
+def build_search_vector(text, language):
+    """
+    Выражение to_tsvector для текста страницы; вычисляется базой данных при INSERT/UPDATE страницы.
+    """
+    return SearchVector(Value(text), config=get_search_config(language))
@@ -4,7 +4,7 @@ from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from rest_framework import serializers
 
-from book_service.models import Book, Genre, BookGenre, BookChapter, Page
+from book_service.models import Book, Genre, BookGenre, BookChapter, Page, IngestionJob
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -27,6 +27,15 @@ class BookChapterSerializer(serializers.ModelSerializer):
         model = BookChapter
         fields = ['id', 'book', 'start_page_number', 'end_page_number', 'chapter_title']
 
+    def validate_book(self, value):
+        """
+        Книгу главы можно указать только при создании: при переносе в другую книгу страницы сохранили бы
+        старые номера и нарушили бы уникальность номеров страниц и начала глав в новой книге.
+        """
+        if self.instance is not None and value.id != self.instance.book_id:
+            raise serializers.ValidationError('Нельзя перенести главу в другую книгу.')
+        return value
+
 
 class BookSerializer(serializers.ModelSerializer):
     """
@@ -61,12 +70,15 @@ class BookSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user_id', 'created_at', 'updated_at']
 
+    # Методы берут связанные объекты только через .all(): во ViewSet жанры и главы загружены prefetch_related
+    # (главы — уже упорядоченными), поэтому сериализация не делает запросов на каждую книгу
     def get_genre_details(self, obj):
-        genres = obj.bookgenre_set.all().select_related('genre')
-        return GenreSerializer([bg.genre for bg in genres], many=True).data
+        return GenreSerializer(obj.genres.all(), many=True).data
 
     def get_chapters(self, obj):
-        chapters = obj.chapters.all().order_by('start_page_number')
+        chapters = obj.chapters.all()
+        if 'chapters' not in getattr(obj, '_prefetched_objects_cache', {}):
+            chapters = chapters.order_by('start_page_number')
         return BookChapterSerializer(chapters, many=True, read_only=True).data
 
     def create(self, validated_data):
@@ -103,11 +115,76 @@ class BookSerializer(serializers.ModelSerializer):
         return instance
 
 
+class BookListSerializer(BookSerializer):
+    """
+    Облегчённый сериализатор книги для списка: те же поля, что у BookSerializer, но без глав.
+    Главы отдаются в детальном представлении книги.
+    """
+    chapters = None
+
+    class Meta(BookSerializer.Meta):
+        fields = [field for field in BookSerializer.Meta.fields if field != 'chapters']
+
+
+class PageContentField(serializers.CharField):
+    """
+    Текст страницы: читается через Page.get_content(), поэтому сжатые страницы отдаются уже распакованными.
+    """
+
+    def get_attribute(self, instance):
+        return instance.get_content()
+
+
 class PageSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Page, включающий информацию о главе, номере и тексте страницы.
+    Сжатие и распаковка текста (BOOK_PAGE_COMPRESSION) для клиента незаметны.
+    Необязательный аргумент fields ограничивает набор полей в ответе (например, без content).
     """
+    content = PageContentField()
 
     class Meta:
         model = Page
-        fields = ['id', 'chapter', 'page_number', 'content']  # id нужно для bulk действия теперь
+        fields = ['id', 'chapter', 'book', 'page_number', 'content']  # id нужно для bulk действия теперь
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    def create(self, validated_data):
+        content = validated_data.pop('content')
+        page = Page(**validated_data)
+        page.set_content(content, language=page.chapter.book.language)
+        page.save()
+        return page
+
+    def update(self, instance, validated_data):
+        content = validated_data.pop('content', None)
+        if content is not None:
+            instance.set_content(content, language=instance.chapter.book.language)
+        return super().update(instance, validated_data)
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для модели IngestionJob (только чтение).
+    Возвращает статус фоновой обработки книги, количество глав и страниц и текст ошибки.
+    """
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id',
+            'book',
+            'status',
+            'total_chapters',
+            'total_pages',
+            'chapter_titles',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
@@ -1,27 +1,30 @@
 from django.core.files.storage import default_storage
 from django.db import transaction
+from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework import status
 import os
 import uuid
 
 from django.conf import settings
-from book_service.models import Book, Genre, BookGenre
-from .pdf_processing import process_pdf_file
-from .fb2_processing import process_fb2_file
-from .epub_processing import process_epub_file
-from .txt_processing import process_txt_file
-from .rtf_processing import process_rtf_file
+from book_service.models import Book, Genre, BookGenre, IngestionJob
+from book_service.serializers import IngestionJobSerializer
+from .deduplication import clone_book_content, compute_file_hash, find_processed_duplicate
+from .ingestion import FILE_PROCESSORS, submit_ingestion_job
 
 
 def process_uploaded_book(request):
     """
-    Обрабатывает загруженную книгу, создаёт запись в базе данных и прикрепляет выбранные жанры.
-    Определяет тип файла и обрабатывает его соответствующим способом (PDF, FB2, EPUB, TXT или RTF),
-    а затем удаляет исходный файл.
+    Принимает загруженную книгу, создаёт запись в базе данных и прикрепляет выбранные жанры.
+    Сам разбор файла (PDF, FB2, EPUB, TXT или RTF) не выполняется в запросе: создаётся задача IngestionJob,
+    которая после фиксации транзакции передаётся в фоновый пул воркеров. Исходный файл удаляется воркером.
+
+    Если такой же файл (по SHA-256) с тем же языком уже был успешно обработан, файл не сохраняется и не разбирается:
+    главы и страницы копируются из ранее обработанной книги, а задача сразу создаётся завершённой.
 
     :param request: HTTP-запрос, содержащий данные (user_id, title, description, language, genres, file, cover_image)
-    :return: Response объект со статусом выполнения и результатом обработки (имена глав, статус, ошибки)
+    :return: Response объект со статусом 202 и данными задачи обработки (id, статус),
+             201 — если содержимое скопировано из уже обработанной книги, либо с ошибкой валидации
     """
     with transaction.atomic():
         user_id = request.user.id  # берем user_id НЕ из request.data, а используем request.user.id.
@@ -42,13 +45,17 @@ def process_uploaded_book(request):
         if genres.count() != len(genre_ids):
             return Response({'error': 'Один или несколько жанров неверны'}, status=status.HTTP_400_BAD_REQUEST)
 
+        file_extension = uploaded_file.name.lower().split('.')[-1]
+        if file_extension not in FILE_PROCESSORS:
+            return Response({'error': 'Неподдерживаемый тип файла'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_hash = compute_file_hash(uploaded_file)
+        duplicate_book = find_processed_duplicate(content_hash, language, user_id)
+
         book_id = uuid.uuid4()
         book_path = os.path.join(str(user_id))
         os.makedirs(os.path.join(settings.MEDIA_ROOT, book_path), exist_ok=True)
 
-        original_file_path = os.path.join(book_path, uploaded_file.name)
-        full_original_path = default_storage.save(original_file_path, uploaded_file)
-
         cover_image_path = None
         if cover_image:
             cover_image_path = default_storage.save(os.path.join(book_path, 'cover', cover_image.name), cover_image)
@@ -59,41 +66,65 @@ def process_uploaded_book(request):
             title=title,
             description=description,
             language=language,
-            cover_image=cover_image_path
+            cover_image=cover_image_path,
+            content_hash=content_hash
         )
 
         BookGenre.objects.bulk_create([
             BookGenre(book=book, genre=genre) for genre in genres
         ])
 
-        file_extension = uploaded_file.name.lower().split('.')[-1]
-
-        if file_extension == 'pdf':
-            result = process_pdf_file(book, full_original_path)
-        elif file_extension == 'fb2':
-            result = process_fb2_file(book, full_original_path)
-        elif file_extension == 'epub':
-            result = process_epub_file(book, full_original_path)
-        elif file_extension == 'txt':
-            result = process_txt_file(book, full_original_path)
-        elif file_extension == 'rtf':
-            result = process_rtf_file(book, full_original_path)
-        else:
-            return Response({'error': 'Неподдерживаемый тип файла'}, status=status.HTTP_400_BAD_REQUEST)
+        if duplicate_book is not None:
+            return _clone_processed_book(duplicate_book, book, uploaded_file, file_extension)
 
-        if not result['success']:
-            return Response({'error': result['error']}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        original_file_path = os.path.join(book_path, uploaded_file.name)
+        full_original_path = default_storage.save(original_file_path, uploaded_file)
 
-        book.total_chapters = result['total_chapters']
-        book.total_pages = result['total_pages']
-        book.save()
+        job = IngestionJob.objects.create(
+            user_id=user_id,
+            book=book,
+            file_path=full_original_path,
+            file_extension=file_extension
+        )
 
-        try:
-            default_storage.delete(full_original_path)
-        except Exception as e:
-            return Response({'error': f'Не удалось удалить исходный файл: {str(e)}'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Воркер должен увидеть уже зафиксированные книгу и задачу
+        transaction.on_commit(lambda: submit_ingestion_job(job.id))
 
         return Response(
-            {'message': 'Книга успешно загружена и обработана', 'chapter_titles': result['chapter_titles']},
-            status=status.HTTP_201_CREATED)
+            {'message': 'Книга загружена и поставлена в очередь на обработку',
+             'job': IngestionJobSerializer(job).data},
+            status=status.HTTP_202_ACCEPTED)
+
+
+def _clone_processed_book(source_book, book, uploaded_file, file_extension):
+    """
+    Копирует содержимое уже обработанной книги в новую и создаёт для неё завершённую задачу IngestionJob.
+
+    :param source_book: Ранее обработанная книга с тем же исходным файлом
+    :param book: Только что созданная книга
+    :param uploaded_file: Загруженный файл (сохраняется только его имя)
+    :param file_extension: Расширение файла
+    :return: Response объект со статусом 201 и данными задачи
+    """
+    clone_book_content(source_book, book)
+
+    now = timezone.now()
+    job = IngestionJob.objects.create(
+        user_id=book.user_id,
+        book=book,
+        file_path=uploaded_file.name,
+        file_extension=file_extension,
+        status=IngestionJob.STATUS_DONE,
+        total_chapters=book.total_chapters,
+        total_pages=book.total_pages,
+        chapter_titles=list(
+            book.chapters.order_by('start_page_number').values_list('chapter_title', flat=True)
+        ),
+        started_at=now,
+        finished_at=now
+    )
+
+    return Response(
+        {'message': 'Книга загружена, содержимое взято из ранее обработанной копии файла',
+         'job': IngestionJobSerializer(job).data},
+        status=status.HTTP_201_CREATED)
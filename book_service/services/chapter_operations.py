@@ -0,0 +1,228 @@
+from django.db import connection, transaction
+from django.db.models import Case, F, Max, Value, When
+
+from book_service.models import Book, BookChapter, Page
+from book_service.services.content_version import mark_book_content_changed
+
+
+class ChapterOperationError(Exception):
+    """
+    Структурную операцию над главами нельзя выполнить
+    (главы из разных книг или не соседние, номер страницы вне главы и т.п.).
+    """
+
+
+def renumber_book(book_id):
+    """
+    Перенумеровывает страницы и главы книги подряд с 1 одним SQL-запросом, без загрузки страниц в Python.
+
+    Порядок сохраняется: главы — по прежнему start_page_number, страницы внутри главы — по прежнему page_number.
+    Для каждой главы оконной функцией считается число страниц до неё (pages_before), после чего:
+      - главе назначается диапазон pages_before + 1 .. pages_before + page_count
+        (у главы без страниц диапазон сбрасывается в NULL, чтобы не совпасть с началом следующей главы);
+      - странице назначается номер pages_before + row_number() внутри главы;
+      - в книге обновляются total_chapters и total_pages.
+    Обновляются только строки, номер которых действительно изменился. Уникальность номеров проверяется
+    отложенно (в конце транзакции), поэтому временные совпадения внутри запроса допустимы.
+
+    Вызывать внутри transaction.atomic() с заблокированной строкой книги.
+
+    :param book_id: ID книги
+    :return: Кортеж (total_chapters, total_pages) после перенумерации
+    """
+    book_table = Book._meta.db_table
+    chapter_table = BookChapter._meta.db_table
+    page_table = Page._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH chapter_ranges AS (
+                SELECT chapter.id, COUNT(page.id) AS page_count,
+                       (SUM(COUNT(page.id)) OVER (
+                            ORDER BY chapter.start_page_number NULLS LAST, chapter.id
+                        ) - COUNT(page.id))::integer AS pages_before
+                FROM {chapter_table} AS chapter
+                LEFT JOIN {page_table} AS page ON page.chapter_id = chapter.id
+                WHERE chapter.book_id = %(book)s
+                GROUP BY chapter.id
+            ), updated_chapters AS (
+                UPDATE {chapter_table} AS chapter
+                SET start_page_number = CASE WHEN ranges.page_count > 0 THEN ranges.pages_before + 1 END,
+                    end_page_number = CASE WHEN ranges.page_count > 0
+                                           THEN ranges.pages_before + ranges.page_count END
+                FROM chapter_ranges AS ranges
+                WHERE chapter.id = ranges.id
+                  AND (chapter.start_page_number IS DISTINCT FROM
+                           CASE WHEN ranges.page_count > 0 THEN ranges.pages_before + 1 END
+                       OR chapter.end_page_number IS DISTINCT FROM
+                           CASE WHEN ranges.page_count > 0 THEN ranges.pages_before + ranges.page_count END)
+            ), updated_pages AS (
+                UPDATE {page_table} AS page
+                SET page_number = numbered.new_number
+                FROM (
+                    SELECT page.id,
+                           ranges.pages_before + row_number() OVER (
+                               PARTITION BY page.chapter_id ORDER BY page.page_number, page.id
+                           ) AS new_number
+                    FROM {page_table} AS page
+                    JOIN chapter_ranges AS ranges ON ranges.id = page.chapter_id
+                ) AS numbered
+                WHERE page.id = numbered.id AND page.page_number <> numbered.new_number
+            )
+            UPDATE {book_table}
+            SET total_chapters = (SELECT COUNT(*) FROM chapter_ranges),
+                total_pages = (SELECT COALESCE(SUM(page_count), 0) FROM chapter_ranges),
+                updated_at = now()
+            WHERE id = %(book)s
+            RETURNING total_chapters, total_pages
+            """,
+            {'book': book_id}
+        )
+        return cursor.fetchone()
+
+
+def _lock_book(book_id):
+    """
+    Блокирует строку книги до конца транзакции: структурные операции над главами одной книги
+    выполняются по очереди и видят согласованные диапазоны страниц.
+    """
+    list(Book.objects.select_for_update().filter(id=book_id).values_list('id', flat=True))
+
+
+def merge_chapters(chapter, other_chapter):
+    """
+    Объединяет две соседние главы: страницы следующей главы переходят в предыдущую, следующая глава удаляется.
+    Номера страниц не меняются, обновляется только chapter_id страниц присоединяемой главы.
+
+    :param chapter: Глава книги
+    :param other_chapter: Соседняя глава той же книги (предыдущая или следующая)
+    :return: Объединённая глава (предыдущая из двух)
+    """
+    if chapter.book_id != other_chapter.book_id:
+        raise ChapterOperationError('Главы должны принадлежать одной книге.')
+    if chapter.id == other_chapter.id:
+        raise ChapterOperationError('Нельзя объединить главу саму с собой.')
+
+    with transaction.atomic():
+        _lock_book(chapter.book_id)
+        chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+        other_chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+
+        if chapter.start_page_number is None or other_chapter.start_page_number is None:
+            raise ChapterOperationError('Нельзя объединить главу без страниц; пустую главу можно удалить.')
+        first, second = sorted((chapter, other_chapter), key=lambda item: item.start_page_number)
+        if second.start_page_number != first.end_page_number + 1:
+            raise ChapterOperationError('Объединять можно только соседние главы.')
+
+        Page.objects.filter(chapter=second).update(chapter=first)
+        first.end_page_number = second.end_page_number
+        first.save(update_fields=['end_page_number'])
+        second.delete()
+        mark_book_content_changed(first.book_id, chapters_delta=-1)
+
+    return first
+
+
+def split_chapter(chapter, page_number, chapter_title=None):
+    """
+    Разделяет главу на две: страницы начиная с page_number переходят в новую главу.
+    Номера страниц не меняются, обновляется только chapter_id страниц второй части.
+
+    :param chapter: Разделяемая глава
+    :param page_number: Номер первой страницы новой главы
+    :param chapter_title: Заголовок новой главы (по умолчанию — заголовок модели по умолчанию)
+    :return: Кортеж (исходная глава, новая глава)
+    """
+    with transaction.atomic():
+        _lock_book(chapter.book_id)
+        chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+
+        if chapter.start_page_number is None or not (
+                chapter.start_page_number < page_number <= chapter.end_page_number):
+            raise ChapterOperationError(
+                'Номер страницы должен быть внутри главы и не совпадать с её первой страницей.'
+            )
+
+        new_chapter = BookChapter(
+            book_id=chapter.book_id,
+            start_page_number=page_number,
+            end_page_number=chapter.end_page_number
+        )
+        if chapter_title:
+            new_chapter.chapter_title = chapter_title
+        new_chapter.save()
+
+        Page.objects.filter(chapter=chapter, page_number__gte=page_number).update(chapter=new_chapter)
+        chapter.end_page_number = page_number - 1
+        chapter.save(update_fields=['end_page_number'])
+        mark_book_content_changed(chapter.book_id, chapters_delta=1)
+
+    return chapter, new_chapter
+
+
+def move_chapter(chapter, before_chapter=None):
+    """
+    Переносит главу вместе со страницами перед другой главой (или в конец книги, если before_chapter не задан).
+
+    Перенумеровываются только страницы и главы между старым и новым местом главы: страницы главы сдвигаются
+    на расстояние переноса, а страницы между ними — на размер главы в обратную сторону. Каждое из двух
+    обновлений (страницы, главы) — один UPDATE по диапазону номеров; остальная книга не затрагивается.
+
+    :param chapter: Переносимая глава
+    :param before_chapter: Глава той же книги, перед которой нужно поставить chapter, или None
+    :return: Перенесённая глава
+    """
+    if before_chapter is not None:
+        if before_chapter.book_id != chapter.book_id:
+            raise ChapterOperationError('Главы должны принадлежать одной книге.')
+        if before_chapter.id == chapter.id:
+            raise ChapterOperationError('Нельзя перенести главу перед ней самой.')
+
+    with transaction.atomic():
+        _lock_book(chapter.book_id)
+        chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+        if chapter.start_page_number is None:
+            raise ChapterOperationError('Нельзя перенести главу без страниц.')
+
+        if before_chapter is not None:
+            before_chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+            if before_chapter.start_page_number is None:
+                raise ChapterOperationError('Нельзя перенести главу перед главой без страниц.')
+            target = before_chapter.start_page_number
+        else:
+            target = BookChapter.objects.filter(book_id=chapter.book_id).aggregate(
+                last=Max('end_page_number')
+            )['last'] + 1
+
+        start, end = chapter.start_page_number, chapter.end_page_number
+        if start <= target <= end + 1:
+            # Глава уже стоит на этом месте
+            return chapter
+
+        size = end - start + 1
+        if target > end:
+            # Вперёд: страницы между главой и целью сдвигаются назад на размер главы
+            low, high = start, target - 1
+            chapter_shift, others_shift = target - 1 - end, -size
+        else:
+            # Назад: страницы между целью и главой сдвигаются вперёд на размер главы
+            low, high = target, end
+            chapter_shift, others_shift = target - start, size
+
+        Page.objects.filter(book_id=chapter.book_id, page_number__range=(low, high)).update(
+            page_number=F('page_number') + Case(
+                When(chapter_id=chapter.id, then=Value(chapter_shift)),
+                default=Value(others_shift)
+            )
+        )
+        shift = Case(When(id=chapter.id, then=Value(chapter_shift)), default=Value(others_shift))
+        BookChapter.objects.filter(book_id=chapter.book_id, start_page_number__range=(low, high)).update(
+            start_page_number=F('start_page_number') + shift,
+            end_page_number=F('end_page_number') + shift
+        )
+        mark_book_content_changed(chapter.book_id)
+
+        chapter.refresh_from_db(fields=['start_page_number', 'end_page_number'])
+
+    return chapter
@@ -0,0 +1,29 @@
+from django.db.models import F
+from django.utils import timezone
+
+from book_service.models import Book
+
+
+def mark_book_content_changed(book_id, chapters_delta=0):
+    """
+    Отмечает изменение глав или страниц книги одним UPDATE:
+      - увеличивает content_version — от неё зависят ETag ответов со страницами, поэтому клиенты
+        и прокси получат новое содержимое вместо 304;
+      - обновляет updated_at (Last-Modified);
+      - сбрасывает хэш исходного файла: изменённая книга больше не должна служить источником
+        для повторных загрузок того же файла;
+      - при необходимости изменяет total_chapters на chapters_delta.
+    Если изменение выполняется в транзакции, вызывать внутри неё: тогда новая версия становится видна
+    вместе с изменёнными главами, а не после них.
+
+    :param book_id: ID книги
+    :param chapters_delta: На сколько изменилось количество глав книги
+    """
+    changes = {
+        'content_version': F('content_version') + 1,
+        'updated_at': timezone.now(),
+        'content_hash': None,
+    }
+    if chapters_delta:
+        changes['total_chapters'] = F('total_chapters') + chapters_delta
+    Book.objects.filter(id=book_id).update(**changes)
@@ -0,0 +1,80 @@
+import hashlib
+
+from django.db import connection
+
+from book_service.models import Book, BookChapter, Page, IngestionJob
+
+
+def compute_file_hash(uploaded_file):
+    """
+    Считает SHA-256 загруженного файла, читая его по частям (chunks), без загрузки целиком в память.
+
+    :param uploaded_file: Загруженный файл (UploadedFile)
+    :return: Хэш в виде шестнадцатеричной строки
+    """
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return hasher.hexdigest()
+
+
+def find_processed_duplicate(content_hash, language, user_id):
+    """
+    Ищет уже обработанную книгу того же пользователя с тем же исходным файлом и языком
+    (язык влияет на разбор глав). Книги других пользователей не рассматриваются: иначе по ответу
+    на загрузку можно было бы узнать, загружал ли кто-то другой этот файл, а их книги блокировались бы.
+    Найденная книга блокируется до конца транзакции, чтобы её главы не изменились во время копирования.
+
+    :return: Book или None
+    """
+    return (
+        Book.objects.select_for_update(of=('self',))
+        .filter(
+            user_id=user_id,
+            content_hash=content_hash,
+            language=language,
+            ingestion_jobs__status=IngestionJob.STATUS_DONE
+        )
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def clone_book_content(source_book, target_book):
+    """
+    Копирует главы и страницы одной книги в другую двумя INSERT ... SELECT в одном SQL-запросе,
+    без разбора файла и без загрузки страниц в Python. Номера страниц и диапазоны глав сохраняются.
+
+    :param source_book: Обработанная книга-источник
+    :param target_book: Новая книга, в которую копируется содержимое
+    """
+    chapter_table = BookChapter._meta.db_table
+    page_table = Page._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH chapter_map AS (
+                SELECT id AS old_id, gen_random_uuid() AS new_id,
+                       start_page_number, end_page_number, chapter_title
+                FROM {chapter_table}
+                WHERE book_id = %(source)s
+            ), new_chapters AS (
+                INSERT INTO {chapter_table} (id, book_id, start_page_number, end_page_number, chapter_title)
+                SELECT new_id, %(target)s, start_page_number, end_page_number, chapter_title
+                FROM chapter_map
+            )
+            INSERT INTO {page_table} (id, chapter_id, book_id, page_number, content, content_compressed, search_vector)
+            SELECT gen_random_uuid(), chapter_map.new_id, %(target)s, page.page_number,
+                   page.content, page.content_compressed, page.search_vector
+            FROM {page_table} AS page
+            JOIN chapter_map ON chapter_map.old_id = page.chapter_id
+            """,
+            {'source': source_book.id, 'target': target_book.id}
+        )
+
+    target_book.total_chapters = source_book.total_chapters
+    target_book.total_pages = source_book.total_pages
+    target_book.save(update_fields=['total_chapters', 'total_pages', 'updated_at'])
+
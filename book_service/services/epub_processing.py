@@ -1,20 +1,214 @@
+from itertools import chain, groupby
+from urllib.parse import unquote
+import logging
+import posixpath
+
 import ebooklib
+import lxml.html
 from django.core.files.storage import default_storage
 from ebooklib import epub
-from bs4 import BeautifulSoup
+from lxml import etree
 from .utils import (
+    ChapterWriter,
     clean_text,
-    split_text_into_chapters,
-    split_text_into_pages_by_lines,
-    save_chapter,
-    add_paragraph_indent,
+    get_chapter_title_detector,
+    iter_paragraph_lines,
+    iter_text_pages,
 )
 
+logger = logging.getLogger(__name__)
+
+# Блочные элементы HTML: на их границах заканчивается один абзац и начинается другой
+EPUB_BLOCK_TAGS = {
+    'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'pre', 'blockquote', 'section', 'article', 'aside', 'header', 'footer', 'figure', 'figcaption',
+    'table', 'tr', 'td', 'th', 'caption', 'hr',
+}
+
+# Элементы, текст которых не относится к содержимому книги
+EPUB_SKIPPED_TAGS = {'script', 'style', 'head', 'title'}
+
+
+def _normalize_href(href):
+    return posixpath.normpath(unquote(href))
+
+
+def _flatten_toc(toc):
+    """
+    Разворачивает дерево оглавления EbookLib (Link и пары (Section, дочерние элементы))
+    в плоский список пар (href, название) в порядке оглавления.
+    """
+    for entry in toc:
+        if isinstance(entry, (tuple, list)):
+            section, children = entry
+            if getattr(section, 'href', None):
+                yield section.href, section.title
+            yield from _flatten_toc(children)
+        elif getattr(entry, 'href', None):
+            yield entry.href, entry.title
+
+
+def build_toc_index(toc):
+    """
+    Строит индекс оглавления по файлам: имя файла -> список пар (id якоря или None, название главы).
+    Ссылка без якоря означает начало файла.
+    """
+    toc_index = {}
+    for href, title in _flatten_toc(toc):
+        file_name, _, fragment = href.partition('#')
+        toc_index.setdefault(_normalize_href(file_name), []).append((fragment or None, (title or '').strip()))
+    return toc_index
+
+
+def _toc_entries_for_item(toc_index, file_name):
+    file_name = _normalize_href(file_name)
+    if file_name in toc_index:
+        return toc_index[file_name]
+    # Ссылки в NCX/nav могут быть заданы относительно другого каталога — сравниваем по имени файла
+    base_name = posixpath.basename(file_name)
+    for toc_file_name, entries in toc_index.items():
+        if posixpath.basename(toc_file_name) == base_name:
+            return entries
+    return []
+
+
+def iter_html_blocks(content, anchors=None):
+    """
+    Разбирает XHTML-документ (lxml) и возвращает события в порядке документа:
+      - ('anchor', название) — в документе встретился элемент с id из anchors (точка оглавления);
+      - ('text', текст абзаца) — текст очередного блочного элемента.
+
+    Пустой документ событий не даёт.
+
+    :param content: Содержимое документа (bytes)
+    :param anchors: Словарь id элемента -> название главы
+    """
+    anchors = anchors or {}
+    try:
+        document = lxml.html.document_fromstring(content)
+    except etree.ParserError:
+        # Пустой документ (или только пробелы) — в нём нет текста, пропускаем его, а не всю книгу
+        return
+    root = document.find('body')
+    if root is None:
+        root = document
+
+    buffer_ = []
+    skip_depth = 0
+
+    def flush():
+        text = ''.join(buffer_)
+        buffer_.clear()
+        if text.strip():
+            return text
+        return None
+
+    for event, elem in etree.iterwalk(root, events=('start', 'end')):
+        if not isinstance(elem.tag, str):
+            # Комментарии и инструкции обработки: учитываем только текст после них
+            if event == 'end' and not skip_depth and elem.tail:
+                buffer_.append(elem.tail)
+            continue
+        tag = elem.tag
+
+        if event == 'start':
+            if tag in EPUB_SKIPPED_TAGS:
+                skip_depth += 1
+                continue
+            if skip_depth:
+                continue
+
+            anchor_title = anchors.get(elem.get('id'))
+            if tag in EPUB_BLOCK_TAGS or anchor_title is not None:
+                text = flush()
+                if text:
+                    yield 'text', text
+            if anchor_title is not None:
+                yield 'anchor', anchor_title
+
+            if tag == 'br':
+                buffer_.append('\n')
+            elif elem.text:
+                buffer_.append(elem.text)
+            continue
+
+        if tag in EPUB_SKIPPED_TAGS:
+            skip_depth -= 1
+        elif not skip_depth and tag in EPUB_BLOCK_TAGS:
+            text = flush()
+            if text:
+                yield 'text', text
+
+        if not skip_depth and elem.tail and elem is not root:
+            buffer_.append(elem.tail)
+
+    text = flush()
+    if text:
+        yield 'text', text
+
+
+def iter_epub_events(epub_book, language=None):
+    """
+    Обходит документы EPUB в порядке spine и возвращает события ('anchor', название) и ('text', абзац).
+
+    Границы глав берутся из оглавления (epub_book.toc): начало файла или элемент с указанным id.
+    Если оглавления нет, заголовки определяются эвристикой (детектор для языка language) по отдельным абзацам.
+    """
+    toc_index = build_toc_index(epub_book.toc)
+    detector = get_chapter_title_detector(language)
+
+    for idref, _ in epub_book.spine:
+        item = epub_book.get_item_with_id(idref)
+        # Документ навигации (nav.xhtml) дублирует оглавление и в текст книги не входит
+        if item is None or item.get_type() != ebooklib.ITEM_DOCUMENT or isinstance(item, epub.EpubNav):
+            continue
+
+        anchors = {}
+        for fragment, title in _toc_entries_for_item(toc_index, item.get_name()):
+            if fragment is None:
+                yield 'anchor', title
+            else:
+                anchors.setdefault(fragment, title)
+
+        for kind, value in iter_html_blocks(item.get_content(), anchors):
+            if kind == 'text' and not toc_index:
+                potential_title = detector.detect(clean_text(value))
+                if potential_title:
+                    yield 'anchor', potential_title
+                    continue
+            yield kind, value
+
+
+def iter_epub_chapters(events):
+    """
+    Группирует события EPUB по главам и возвращает пары (название главы, итератор абзацев).
+    Итератор абзацев ленивый и должен быть исчерпан до перехода к следующей главе.
+
+    - Текст до первой точки оглавления попадает в главу без названия.
+    - Из нескольких точек оглавления подряд (без текста между ними) используется последняя.
+    - Первый абзац главы, совпадающий с её названием (заголовок в тексте), пропускается.
+    """
+    current_chapter_title = None
+    for is_anchor, chapter_events in groupby(events, key=lambda event: event[0] == 'anchor'):
+        if is_anchor:
+            for _, title in chapter_events:
+                current_chapter_title = title
+            continue
+
+        paragraphs = (text for _, text in chapter_events)
+        if current_chapter_title:
+            first = next(paragraphs)
+            if ' '.join(first.split()) != ' '.join(current_chapter_title.split()):
+                paragraphs = chain([first], paragraphs)
+        yield current_chapter_title, paragraphs
+
 
 def process_epub_file(book, full_original_path):
     """
-    Обрабатывает загруженный EPUB-файл, извлекает текст и разбивает его на главы и страницы.
-    Затем сохраняет каждую главу в базе данных, вычисляя общее количество глав и страниц.
+    Обрабатывает загруженный EPUB-файл: документы читаются по одному в порядке spine (lxml),
+    главы формируются по точкам оглавления (TOC) прямо во время обхода, абзацы очищаются,
+    получают отступ и разбиваются на страницы по 20 строк.
+    Затем каждая глава сохраняется в базе данных, вычисляя общее количество глав и страниц.
 
     :param book: Модель Book, к которой будут привязаны новые главы
     :param full_original_path: Полный путь к файлу EPUB
@@ -28,52 +222,32 @@ def process_epub_file(book, full_original_path):
     try:
         epub_full_path = default_storage.path(full_original_path)
         epub_book = epub.read_epub(epub_full_path)
-        chapter_titles_detected = []
-        total_chapters = 0
-        total_pages = 0
-        current_page_number = 1  # Инициализируем номер страницы с 1
-
-        # Извлекаем весь текст из EPUB файла
-        text_content = ''
-        for item in epub_book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-            content = item.get_content()
-            soup = BeautifulSoup(content, 'html.parser')
-            text_content += soup.get_text() + '\n'
+        writer = ChapterWriter(book)
 
-        # Проверяем, что текст был извлечен
-        if not text_content.strip():
-            return {'success': False, 'error': 'Не удалось извлечь текст из EPUB файла'}
-
-        # Очищаем текст от лишних пустых строк
-        text_content = clean_text(text_content)
+        for chapter_title, paragraphs in iter_epub_chapters(iter_epub_events(epub_book, language=book.language)):
+            lines = (line for text in paragraphs for line in iter_paragraph_lines(text))
+            first_line = next(lines, None)
+            if first_line is None:
+                continue  # В главе был только заголовок
 
-        # Добавляем отступы к абзацам
-        text_content = add_paragraph_indent(text_content, indent='    ')
+            writer.start_chapter(chapter_title)
+            for page_content in iter_text_pages(chain([first_line], lines)):
+                writer.add_page(page_content)
+            writer.end_chapter()
 
-        # Разбиваем текст на главы
-        chapters, chapter_titles_detected = split_text_into_chapters(text_content)
-
-        # Проверяем, что главы были обнаружены
-        if not chapters:
-            return {'success': False, 'error': 'Не удалось разделить текст на главы'}
+        # Проверяем, что текст был извлечен
+        if not writer.total_chapters:
+            return {'success': False, 'error': 'Не удалось извлечь текст из EPUB файла'}
 
-        # Сохраняем главы
-        for chapter_title, chapter_text in chapters:
-            pages = split_text_into_pages_by_lines(chapter_text)
-            end_page_number = save_chapter(book, chapter_title, pages, current_page_number)
-            total_chapters += 1
-            pages_in_chapter = len(pages)
-            total_pages += pages_in_chapter
-            current_page_number = end_page_number + 1  # Обновляем номер страницы для следующей главы
+        writer.close()
 
         return {
             'success': True,
-            'chapter_titles': chapter_titles_detected,
-            'total_chapters': total_chapters,
-            'total_pages': total_pages
+            'chapter_titles': writer.chapter_titles,
+            'total_chapters': writer.total_chapters,
+            'total_pages': writer.total_pages
         }
     except Exception as e:
         # Логируем полную информацию об исключении
-        import traceback
-        traceback.print_exc()
+        logger.exception("Ошибка обработки EPUB-файла %s", full_original_path)
         return {'success': False, 'error': str(e)}
@@ -1,18 +1,127 @@
+from itertools import groupby
+
 from django.core.files.storage import default_storage
 from lxml import etree
 from .utils import (
-    split_text_into_chapters,
-    split_text_into_pages_by_lines,
-    save_chapter,
+    ChapterWriter,
     clean_text,
-    add_paragraph_indent,
+    iter_paragraph_lines,
+    iter_text_pages,
 )
 
+# Элементы FB2, текст которых сохраняется как отдельный абзац
+FB2_PARAGRAPH_TAGS = {'p', 'v', 'subtitle', 'text-author'}
+
+# Блочные элементы, которые можно освобождать из памяти сразу после их закрытия
+FB2_DISPOSABLE_TAGS = FB2_PARAGRAPH_TAGS | {
+    'section', 'title', 'epigraph', 'poem', 'stanza', 'cite', 'annotation',
+    'empty-line', 'image', 'table', 'binary', 'description',
+}
+
+
+class Fb2BodyNotFound(Exception):
+    """
+    В FB2-файле нет элемента <body>.
+    """
+
+
+def _free_element(elem):
+    """
+    Освобождает уже обработанный элемент и его предыдущих соседей,
+    чтобы дерево не росло по мере чтения файла.
+    """
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_fb2_paragraphs(fb2_file):
+    """
+    Потоково читает FB2 (lxml.etree.iterparse) и возвращает абзацы основного тела книги
+    в виде троек (номер главы, название главы, текст абзаца).
+
+    Границы глав берутся из структуры документа: новую главу начинают секции верхнего уровня и вложенные
+    секции со своим <title>, название главы — текст этого <title>. Вложенные секции без заголовка (обычно
+    разрывы сцен) остаются в главе родительской секции, текст после вложенной главы наследует заголовок родителя.
+    Учитывается только первый <body>; тела с примечаниями пропускаются.
+    Закрытые элементы сразу освобождаются, поэтому потребление памяти не зависит от размера файла.
+
+    :raises Fb2BodyNotFound: если в файле нет ни одного <body>
+    """
+    chapter_index = 0
+    chapter_has_text = False
+    section_titles = []
+    title_parts = None
+    bodies_seen = 0
+    in_body = False
+
+    for event, elem in etree.iterparse(fb2_file, events=('start', 'end'), recover=True, huge_tree=True):
+        if not isinstance(elem.tag, str):
+            continue
+        tag = etree.QName(elem).localname
+
+        if event == 'start':
+            if tag == 'body':
+                bodies_seen += 1
+                in_body = bodies_seen == 1
+            elif in_body and tag == 'section':
+                # Секция верхнего уровня всегда начинает главу; вложенная — только если у неё есть свой <title>
+                if not section_titles and chapter_has_text:
+                    chapter_index += 1
+                    chapter_has_text = False
+                section_titles.append(None)
+            elif in_body and tag == 'title':
+                title_parts = []
+            continue
+
+        if tag == 'body':
+            in_body = False
+        elif in_body and tag == 'title':
+            parent_tag = etree.QName(elem.getparent()).localname
+            if parent_tag == 'section':
+                title = clean_text(' '.join(title_parts)).replace('\n', ' ')
+                if title:
+                    section_titles[-1] = title
+                    if chapter_has_text:
+                        chapter_index += 1
+                        chapter_has_text = False
+            elif parent_tag != 'body':
+                # Заголовки стихов и эпиграфов остаются частью текста главы
+                chapter_title = next((title for title in reversed(section_titles) if title), None)
+                for text in title_parts:
+                    if text.strip():
+                        yield chapter_index, chapter_title, text
+                        chapter_has_text = True
+            title_parts = None
+        elif in_body and tag in FB2_PARAGRAPH_TAGS:
+            text = ''.join(elem.itertext())
+            if title_parts is not None:
+                title_parts.append(text)
+            elif text.strip():
+                chapter_title = next((title for title in reversed(section_titles) if title), None)
+                yield chapter_index, chapter_title, text
+                chapter_has_text = True
+        elif in_body and tag == 'section':
+            # Вложенная секция без заголовка (например, разрыв сцены) остаётся частью текущей главы
+            section_title = section_titles.pop()
+            if (section_title or not section_titles) and chapter_has_text:
+                chapter_index += 1
+                chapter_has_text = False
+
+        if tag in FB2_DISPOSABLE_TAGS:
+            _free_element(elem)
+
+    if not bodies_seen:
+        raise Fb2BodyNotFound('FB2 body not found')
+
 
 def process_fb2_file(book, full_original_path):
     """
-    Обрабатывает загруженный FB2-файл, извлекает текст, разбивает его на главы и страницы.
-    Затем сохраняет каждую главу в базе данных, вычисляя общее количество глав и страниц.
+    Обрабатывает загруженный FB2-файл в один проход: главы формируются по секциям (<section>/<title>)
+    прямо во время чтения файла, абзацы очищаются, получают отступ и разбиваются на страницы по 20 строк.
+    Затем каждая глава сохраняется в базе данных, вычисляя общее количество глав и страниц.
 
     :param book: Модель Book, к которой будут привязаны новые главы
     :param full_original_path: Полный путь к файлу FB2
@@ -24,49 +133,24 @@ def process_fb2_file(book, full_original_path):
         - 'error': текст ошибки (если возникла)
     """
     try:
-        with default_storage.open(full_original_path, 'rb') as f:
-            xml_content = f.read()
-
-        parser = etree.XMLParser(encoding='utf-8', recover=True)
-        tree = etree.fromstring(xml_content, parser=parser)
+        writer = ChapterWriter(book)
 
-        namespaces = {'fb2': 'http://www.gribuser.ru/xml/fictionbook/2.0'}
-        body = tree.find('fb2:body', namespaces)
-
-        if body is None:
-            return {'success': False, 'error': 'FB2 body not found'}
-
-        # Извлекаем весь текст из тела документа
-        paragraphs = body.findall('.//fb2:p', namespaces)
-        text_content = '\n'.join([p.text for p in paragraphs if p.text])
-
-        # Очищаем текст от лишних пустых строк
-        text_content = clean_text(text_content)
-
-        # Добавляем отступы к абзацам
-        text_content = add_paragraph_indent(text_content, indent='    ')
-
-        # Разбиваем текст на главы
-        chapters, chapter_titles_detected = split_text_into_chapters(text_content)
-
-        total_chapters = 0
-        total_pages = 0
-        current_page_number = 1  # Инициализируем номер страницы с 1
+        with default_storage.open(full_original_path, 'rb') as f:
+            paragraphs = iter_fb2_paragraphs(f)
+            for (_, chapter_title), chapter_paragraphs in groupby(paragraphs, key=lambda p: (p[0], p[1])):
+                writer.start_chapter(chapter_title)
+                lines = (line for _, _, text in chapter_paragraphs for line in iter_paragraph_lines(text))
+                for page_content in iter_text_pages(lines):
+                    writer.add_page(page_content)
+                writer.end_chapter()
 
-        # Сохраняем главы
-        for chapter_title, chapter_text in chapters:
-            pages = split_text_into_pages_by_lines(chapter_text)
-            end_page_number = save_chapter(book, chapter_title, pages, current_page_number)
-            total_chapters += 1
-            pages_in_chapter = len(pages)
-            total_pages += pages_in_chapter
-            current_page_number = end_page_number + 1  # Обновляем номер страницы для следующей главы
+        writer.close()
 
         return {
             'success': True,
-            'chapter_titles': chapter_titles_detected,
-            'total_chapters': total_chapters,
-            'total_pages': total_pages
+            'chapter_titles': writer.chapter_titles,
+            'total_chapters': writer.total_chapters,
+            'total_pages': writer.total_pages
         }
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def book_content_etag(book_id, content_version):
+    """
+    Сильный ETag содержимого книги: меняется при каждом изменении её глав или страниц (Book.content_version).
+    """
+    return quote_etag(f'{book_id}-{content_version}')
+
+
+def conditional_content_response(request, book_id, content_version, updated_at, build_response):
+    """
+    Условный GET для ответов со страницами книги (If-None-Match / If-Modified-Since).
+
+    Если версия у клиента совпадает с текущей, сразу возвращается 304 — build_response не вызывается,
+    поэтому текст страниц не читается из базы данных и не сериализуется. Иначе строится обычный ответ.
+    В обоих случаях добавляются ETag, Last-Modified, Cache-Control (BOOK_CONTENT_CACHE_CONTROL)
+    и Vary: Authorization, Cookie (JWT приходит в заголовке или в cookie access_token) — ответы разных
+    пользователей не должны смешиваться в кэше прокси.
+
+    :param request: Запрос
+    :param book_id: ID книги
+    :param content_version: Book.content_version
+    :param updated_at: Book.updated_at
+    :param build_response: Функция без аргументов, возвращающая полный ответ
+    :return: Ответ 304 или результат build_response с заголовками кэширования
+    """
+    etag = book_content_etag(book_id, content_version)
+    last_modified = int(updated_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_response()
+
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = settings.BOOK_CONTENT_CACHE_CONTROL
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
@@ -0,0 +1,338 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from book_service.models import Book, IngestionJob
+from .pdf_processing import process_pdf_file
+from .fb2_processing import process_fb2_file
+from .epub_processing import process_epub_file
+from .txt_processing import process_txt_file
+from .rtf_processing import process_rtf_file
+
+logger = logging.getLogger(__name__)
+
+# Обработчики форматов по расширению файла
+FILE_PROCESSORS = {
+    'pdf': process_pdf_file,
+    'fb2': process_fb2_file,
+    'epub': process_epub_file,
+    'txt': process_txt_file,
+    'rtf': process_rtf_file,
+}
+
+# Ключ advisory-блокировки PostgreSQL: восстановление задач выполняется одновременно только в одном процессе
+INGESTION_RECOVERY_LOCK_ID = 7_301_452_019
+
+_executor = None
+_executor_lock = threading.Lock()
+_recovery_thread = None
+
+
+class IngestionError(Exception):
+    """
+    Ошибка обработки файла книги (обработчик формата вернул success=False).
+    """
+
+
+class IngestionSuperseded(Exception):
+    """
+    Задача была перезапущена восстановлением (recover_ingestion_jobs), пока этот воркер её выполнял:
+    результат текущего запуска отбрасывается, задачу завершит новый запуск.
+    """
+
+
+def get_ingestion_executor():
+    """
+    Возвращает общий для процесса пул потоков, в котором выполняется обработка книг.
+    Пул создаётся лениво, размер задаётся настройкой BOOK_INGESTION_WORKERS.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BOOK_INGESTION_WORKERS,
+                thread_name_prefix='book-ingestion'
+            )
+    return _executor
+
+
+def submit_ingestion_job(job_id):
+    """
+    Ставит задачу обработки в очередь пула воркеров.
+
+    :param job_id: Идентификатор IngestionJob
+    :return: Future выполняемой задачи
+    """
+    return get_ingestion_executor().submit(run_ingestion_job, job_id)
+
+
+def run_ingestion_job(job_id):
+    """
+    Точка входа воркера: выполняет задачу и закрывает соединение с БД потока,
+    чтобы оно не оставалось открытым между задачами.
+    """
+    close_old_connections()
+    try:
+        process_ingestion_job(job_id)
+    except Exception:
+        logger.exception("Необработанная ошибка в задаче обработки книги %s", job_id)
+    finally:
+        connection.close()
+
+
+def process_ingestion_job(job_id):
+    """
+    Обрабатывает файл книги, привязанный к задаче IngestionJob.
+    Главы и страницы сохраняются в одной транзакции: при ошибке они откатываются,
+    книга удаляется, а задача помечается как failed.
+
+    :param job_id: Идентификатор IngestionJob
+    """
+    # Забираем задачу только из состояния queued, чтобы не выполнить её дважды.
+    # started_at служит меткой запуска: по ней воркер проверяет, что задача всё ещё его
+    started_at = timezone.now()
+    claimed = IngestionJob.objects.filter(id=job_id, status=IngestionJob.STATUS_QUEUED).update(
+        status=IngestionJob.STATUS_RUNNING,
+        started_at=started_at,
+        heartbeat_at=started_at,
+        attempts=F('attempts') + 1,
+        updated_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    job = IngestionJob.objects.select_related('book').get(id=job_id)
+    book = job.book
+    # Задача этого запуска: статус running и та же метка started_at
+    own_job = IngestionJob.objects.filter(id=job_id, status=IngestionJob.STATUS_RUNNING, started_at=started_at)
+
+    try:
+        if book is None:
+            raise IngestionError('Книга была удалена до начала обработки')
+
+        processor = FILE_PROCESSORS.get(job.file_extension)
+        if processor is None:
+            raise IngestionError('Неподдерживаемый тип файла')
+
+        # Пока идёт обработка, воркер отмечается в задаче: долгая обработка не считается потерянной
+        with IngestionHeartbeat(own_job), transaction.atomic():
+            result = processor(book, job.file_path)
+            if not result['success']:
+                raise IngestionError(result['error'])
+
+            # Главы сохраняются, только если задачу не перезапустили за время обработки
+            if not own_job.select_for_update().exists():
+                raise IngestionSuperseded()
+
+            # Новая версия содержимого: ответы, закэшированные по ETag до окончания обработки, устаревают
+            Book.objects.filter(id=book.id).update(
+                total_chapters=result['total_chapters'],
+                total_pages=result['total_pages'],
+                content_version=F('content_version') + 1,
+                updated_at=timezone.now()
+            )
+
+            own_job.update(
+                status=IngestionJob.STATUS_DONE,
+                total_chapters=result['total_chapters'],
+                total_pages=result['total_pages'],
+                chapter_titles=result['chapter_titles'],
+                finished_at=timezone.now(),
+                updated_at=timezone.now()
+            )
+    except IngestionSuperseded:
+        logger.warning("Задача обработки книги %s перезапущена, результат этого запуска отброшен", job_id)
+        return
+    except Exception as e:
+        logger.exception("Ошибка обработки книги (задача %s)", job_id)
+        if not _fail_job(own_job, job, book, str(e)):
+            return
+
+    _delete_source_file(job.file_path)
+
+
+class IngestionHeartbeat:
+    """
+    Контекстный менеджер: пока он открыт, фоновый поток каждые BOOK_INGESTION_HEARTBEAT_INTERVAL секунд
+    обновляет heartbeat_at задачи. Отметка делается в отдельном соединении с БД (у потока своё соединение),
+    поэтому видна восстановлению сразу, а не после завершения транзакции обработки.
+
+    :param jobs: QuerySet задачи с условием на статус и метку запуска — перезапущенную задачу поток не отмечает
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        """
+        Отмечает задачу; возвращает False, если задача уже не принадлежит этому запуску.
+        """
+        return bool(self.jobs.update(heartbeat_at=timezone.now()))
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(settings.BOOK_INGESTION_HEARTBEAT_INTERVAL):
+                try:
+                    if not self.beat():
+                        return
+                except Exception:
+                    logger.exception("Не удалось отметить задачу обработки книги")
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='book-ingestion-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        return False
+
+
+def _fail_job(jobs, job, book, error):
+    """
+    Помечает задачу как failed и удаляет книгу, которую не удалось обработать.
+    Ничего не делает, если задачу уже перезапустили (jobs пуст).
+
+    :param jobs: QuerySet задачи с условием на статус и метку запуска
+    :return: True, если задача помечена как failed
+    """
+    failed = jobs.update(
+        status=IngestionJob.STATUS_FAILED,
+        error=error,
+        book=None,
+        finished_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    if failed and book is not None:
+        _discard_book(book)
+    return bool(failed)
+
+
+def recover_ingestion_jobs():
+    """
+    Восстанавливает задачи, потерянные при перезапуске или падении процесса (пул воркеров живёт в памяти процесса):
+      - задачи в статусе running, воркер которых не отмечался (heartbeat_at) дольше BOOK_INGESTION_JOB_TIMEOUT
+        секунд, возвращаются в очередь, а после BOOK_INGESTION_MAX_ATTEMPTS попыток помечаются как failed
+        (книга удаляется);
+      - задачи, которые ждут в статусе queued дольше BOOK_INGESTION_QUEUED_GRACE секунд,
+        и возвращённые в очередь задачи отправляются в пул этого процесса.
+
+    Восстановление запускается в каждом процессе, но выполняется одновременно только в одном:
+    процесс берёт advisory-блокировку PostgreSQL, остальные в это время пропускают проверку.
+    Повторная отправка всё равно безопасна: задачу выполняет только тот воркер, который первым переведёт её
+    в running, а прежний запуск перезапущенной задачи, если он всё же завершится, свой результат отбросит.
+
+    :return: Словарь с количеством возвращённых в очередь, проваленных и отправленных в пул задач
+             и признаком skipped (восстановление уже выполняется в другом процессе)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [INGESTION_RECOVERY_LOCK_ID])
+        if not cursor.fetchone()[0]:
+            return {'requeued': 0, 'failed': 0, 'submitted': 0, 'skipped': True}
+    try:
+        return _recover_ingestion_jobs()
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [INGESTION_RECOVERY_LOCK_ID])
+
+
+def _recover_ingestion_jobs():
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.BOOK_INGESTION_JOB_TIMEOUT)
+    # Задачи, запущенные до появления heartbeat_at, проверяются по времени запуска
+    stale_jobs = IngestionJob.objects.filter(
+        Q(heartbeat_at__lt=stale_before) | Q(heartbeat_at__isnull=True, started_at__lt=stale_before),
+        status=IngestionJob.STATUS_RUNNING
+    )
+
+    failed = 0
+    for job in stale_jobs.filter(attempts__gte=settings.BOOK_INGESTION_MAX_ATTEMPTS).select_related('book'):
+        jobs = IngestionJob.objects.filter(id=job.id, status=IngestionJob.STATUS_RUNNING, started_at=job.started_at)
+        error = f'Обработка не завершилась за {job.attempts} попыток'
+        if _fail_job(jobs, job, job.book, error):
+            _delete_source_file(job.file_path)
+            failed += 1
+
+    requeued_ids = list(stale_jobs.values_list('id', flat=True))
+    # Условие устаревания повторяется: задачу, воркер которой успел отметиться, не трогаем
+    requeued = stale_jobs.filter(id__in=requeued_ids).update(
+        status=IngestionJob.STATUS_QUEUED,
+        started_at=None,
+        heartbeat_at=None,
+        updated_at=now
+    )
+
+    waiting_ids = IngestionJob.objects.filter(
+        status=IngestionJob.STATUS_QUEUED,
+        updated_at__lt=now - timedelta(seconds=settings.BOOK_INGESTION_QUEUED_GRACE)
+    ).values_list('id', flat=True)
+    submit_ids = set(requeued_ids) | set(waiting_ids)
+    for job_id in submit_ids:
+        submit_ingestion_job(job_id)
+
+    if requeued or failed or submit_ids:
+        logger.warning("Восстановление задач обработки книг: в очередь %s, failed %s, отправлено в пул %s",
+                       requeued, failed, len(submit_ids))
+    return {'requeued': requeued, 'failed': failed, 'submitted': len(submit_ids), 'skipped': False}
+
+
+def start_ingestion_recovery():
+    """
+    Запускает в процессе фоновый поток, который вызывает recover_ingestion_jobs при старте
+    и затем каждые BOOK_INGESTION_RECOVERY_INTERVAL секунд (0 — только при старте).
+    Вызывается при запуске WSGI-приложения в каждом процессе; повторный вызов в том же процессе ничего не делает.
+    Сама проверка одновременно выполняется только в одном процессе (см. recover_ingestion_jobs).
+    """
+    global _recovery_thread
+    with _executor_lock:
+        if _recovery_thread is not None:
+            return
+        _recovery_thread = threading.Thread(target=_recovery_loop, name='book-ingestion-recovery', daemon=True)
+    _recovery_thread.start()
+
+
+def _recovery_loop():
+    interval = settings.BOOK_INGESTION_RECOVERY_INTERVAL
+    while True:
+        close_old_connections()
+        try:
+            recover_ingestion_jobs()
+        except Exception:
+            logger.exception("Ошибка восстановления задач обработки книг")
+        finally:
+            connection.close()
+        if interval <= 0:
+            return
+        time.sleep(interval)
+
+
+def _discard_book(book):
+    """
+    Удаляет книгу, которую не удалось обработать, вместе с её обложкой.
+    """
+    if book.cover_image and default_storage.exists(book.cover_image.name):
+        try:
+            default_storage.delete(book.cover_image.name)
+        except Exception as e:
+            logger.warning("Не удалось удалить обложку книги %s: %s", book.id, e)
+    book.delete()
+
+
+def _delete_source_file(file_path):
+    try:
+        default_storage.delete(file_path)
+    except Exception as e:
+        logger.warning("Не удалось удалить исходный файл %s: %s", file_path, e)
@@ -0,0 +1,127 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from book_service.models import Page
+from book_service.serializers import PageSerializer
+
+logger = logging.getLogger(__name__)
+
+# Ключ готового ответа со страницей. Версия содержимого книги входит в ключ, поэтому после любого изменения
+# глав или страниц (mark_book_content_changed, перенумерация в bulk_delete) старые записи просто перестают
+# читаться и со временем вытесняются из кэша — удалять их по одной не нужно
+PAGE_CACHE_KEY = 'book-page:{book_id}:{content_version}:{page_number}'
+
+# Счётчики попаданий и промахов хранятся в том же кэше, что и страницы (общие для процессов, если кэш общий)
+PAGE_CACHE_STATS_KEYS = {
+    'hits': 'book-page-cache:hits',
+    'misses': 'book-page-cache:misses',
+}
+
+
+def get_page_cache():
+    """
+    Возвращает кэш страниц (BOOK_PAGE_CACHE_ALIAS из CACHES) или None, если кэш страниц выключен.
+    """
+    if not settings.BOOK_PAGE_CACHE_ALIAS:
+        return None
+    return caches[settings.BOOK_PAGE_CACHE_ALIAS]
+
+
+def _count(cache, name):
+    """
+    Увеличивает счётчик попаданий или промахов. Счётчики — только статистика: их ошибки
+    (в том числе недоступность кэша) записываются в лог и не мешают отдать страницу.
+    """
+    key = PAGE_CACHE_STATS_KEYS[name]
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счётчика ещё нет или он вытеснен из кэша; если его успел создать другой процесс — увеличиваем
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+    except Exception:
+        logger.warning("Не удалось обновить счётчик кэша страниц %s", name, exc_info=True)
+
+
+def get_page_payload(book_id, content_version, page_number, load_page):
+    """
+    Read-through кэш сериализованных страниц (PageSerializer) по (книга, номер страницы, версия содержимого).
+
+    При попадании страница не читается из базы данных и не сериализуется заново.
+    При промахе страница загружается через load_page, сериализуется и сохраняется
+    на BOOK_PAGE_CACHE_TIMEOUT секунд. Если кэш страниц выключен, страница всегда читается из базы.
+
+    :param book_id: ID книги
+    :param content_version: Book.content_version
+    :param page_number: Сквозной номер страницы в книге
+    :param load_page: Функция без аргументов, возвращающая Page или None, если страницы нет
+    :return: Кортеж (данные страницы или None, статус кэша: 'HIT', 'MISS' или None, если кэш выключен)
+    """
+    cache = get_page_cache()
+    if cache is None:
+        page = load_page()
+        return (PageSerializer(page).data if page is not None else None), None
+
+    key = PAGE_CACHE_KEY.format(book_id=book_id, content_version=content_version, page_number=page_number)
+    payload = cache.get(key)
+    if payload is not None:
+        _count(cache, 'hits')
+        return payload, 'HIT'
+
+    _count(cache, 'misses')
+    page = load_page()
+    if page is None:
+        return None, 'MISS'
+    payload = dict(PageSerializer(page).data)
+    cache.set(key, payload, settings.BOOK_PAGE_CACHE_TIMEOUT)
+    return payload, 'MISS'
+
+
+def cached_page_response(book, page_number, chapter_id=None):
+    """
+    Ответ со страницей книги из кэша страниц (get_page_payload) с заголовком X-Cache: HIT/MISS.
+
+    :param book: Книга (нужны id и content_version)
+    :param page_number: Сквозной номер страницы в книге
+    :param chapter_id: Если указан, страница должна принадлежать этой главе
+    """
+    def load_page():
+        try:
+            return Page.objects.get(book_id=book.id, page_number=page_number)
+        except Page.DoesNotExist:
+            return None
+
+    payload, cache_status = get_page_payload(book.id, book.content_version, page_number, load_page)
+    if payload is None or (chapter_id is not None and payload['chapter'] != chapter_id):
+        response = Response({'error': 'Страница не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    else:
+        response = Response(payload, status=status.HTTP_200_OK)
+    if cache_status:
+        response['X-Cache'] = cache_status
+    return response
+
+
+def get_page_cache_stats():
+    """
+    Возвращает счётчики кэша страниц: попадания, промахи и долю попаданий.
+    """
+    cache = get_page_cache()
+    if cache is None:
+        return {'enabled': False, 'hits': 0, 'misses': 0, 'hit_ratio': None}
+
+    counters = cache.get_many(PAGE_CACHE_STATS_KEYS.values())
+    hits = counters.get(PAGE_CACHE_STATS_KEYS['hits'], 0)
+    misses = counters.get(PAGE_CACHE_STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'enabled': True,
+        'alias': settings.BOOK_PAGE_CACHE_ALIAS,
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
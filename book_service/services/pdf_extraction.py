@@ -0,0 +1,59 @@
+# Извлечение текста страниц PDF в пуле процессов.
+# Модуль намеренно не импортирует Django: он загружается в дочерних процессах,
+# запущенных через spawn, где проект не инициализирован.
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from PyPDF2 import PdfReader
+
+_worker_reader = None
+
+
+def _init_worker(pdf_path):
+    """
+    Открывает PDF один раз на процесс-воркер.
+    """
+    global _worker_reader
+    _worker_reader = PdfReader(pdf_path)
+
+
+def extract_page_texts(start, stop):
+    """
+    Извлекает текст страниц [start, stop) из PDF, открытого в процессе-воркере.
+
+    :return: Список текстов страниц в исходном порядке
+    """
+    return [_worker_reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def iter_page_texts_parallel(pdf_path, total_pages, workers, chunk_pages):
+    """
+    Извлекает текст страниц PDF диапазонами по chunk_pages страниц в пуле из workers процессов
+    и возвращает тексты строго в исходном порядке страниц.
+
+    Одновременно в работе не более 2 * workers диапазонов, поэтому память не растёт с размером книги.
+    Если потребитель прекращает чтение (например, найдено оглавление), оставшиеся диапазоны отменяются.
+    """
+    ranges = iter([(start, min(start + chunk_pages, total_pages)) for start in range(0, total_pages, chunk_pages)])
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(pdf_path,)
+    )
+    try:
+        pending = deque()
+        for start, stop in ranges:
+            pending.append(executor.submit(extract_page_texts, start, stop))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            texts = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(executor.submit(extract_page_texts, *next_range))
+            yield from texts
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -1,13 +1,134 @@
+from itertools import groupby
+
+from django.conf import settings
 from django.core.files.storage import default_storage
 from PyPDF2 import PdfReader
+from .pdf_extraction import iter_page_texts_parallel
 from .utils import (
-    save_chapter,
-    detect_chapter_title,
-    split_text_into_pages_by_lines,
-    clean_text
+    ChapterWriter,
+    get_chapter_title_detector,
+    clean_text,
+    iter_text_pages,
 )
 import re
 
+# Пороговое количество заголовков на странице, чтобы считать её оглавлением (TOC)
+TOC_CHAPTER_THRESHOLD = 3
+
+# Количество абзацев (строк) на одной странице книги: 10 абзацев по 3 предложения
+PDF_LINES_PER_PAGE = 10
+
+_MULTIPLE_SPACES_RE = re.compile(r' {2,}')
+
+
+def iter_pdf_page_texts(pdf_reader, pdf_path=None, workers=1, chunk_pages=16):
+    """
+    Извлекает текст из страниц PDF в исходном порядке и «чистит» его.
+    Пустые страницы пропускаются.
+
+    Если указан путь к файлу на диске и workers > 1, текст извлекается диапазонами
+    по chunk_pages страниц в пуле процессов (PyPDF2 работает на чистом Python и упирается в одно ядро).
+    """
+    total_pages_in_pdf = len(pdf_reader.pages)
+    if pdf_path and workers > 1 and total_pages_in_pdf > chunk_pages:
+        raw_page_texts = iter_page_texts_parallel(pdf_path, total_pages_in_pdf, workers, chunk_pages)
+    else:
+        raw_page_texts = (page.extract_text() for page in pdf_reader.pages)
+
+    for page_text in raw_page_texts:
+        if not page_text:
+            continue
+        yield clean_text(page_text)
+
+
+def iter_pdf_lines(page_texts, toc_threshold=TOC_CHAPTER_THRESHOLD, language=None):
+    """
+    Разбивает тексты страниц на строки и для каждой строки один раз определяет,
+    является ли она заголовком главы. Возвращает пары (строка, заголовок или None).
+
+    Если на странице toc_threshold и более потенциальных заголовков, страница считается
+    оглавлением (TOC), и обработка PDF на ней прекращается.
+    """
+    detector = get_chapter_title_detector(language)
+    for page_text in page_texts:
+        lines = page_text.split('\n')
+        titles = [detector.detect(line) for line in lines]
+
+        if sum(1 for title in titles if title) >= toc_threshold:
+            return
+
+        yield from zip(lines, titles)
+
+
+def iter_pdf_chapters(line_events):
+    """
+    Группирует строки по главам.
+    Возвращает пары (название главы, итератор фрагментов текста главы). Итератор фрагментов ленивый
+    и должен быть исчерпан до перехода к следующей главе.
+
+    - Текст до первого заголовка попадает в главу «Untitled Chapter».
+    - Из нескольких заголовков подряд (без текста между ними) используется последний.
+    """
+    current_chapter_title = None
+    for is_title, events in groupby(line_events, key=lambda event: event[1] is not None):
+        if is_title:
+            for _, title in events:
+                current_chapter_title = title
+        else:
+            yield current_chapter_title or "Untitled Chapter", (line + ' ' for line, _ in events)
+
+
+def iter_sentences(fragments):
+    """
+    Собирает предложения из потока фрагментов текста, разбивая его по точкам
+    (точка остаётся в конце предложения). Лишние пробелы внутри предложения схлопываются.
+    В памяти держится только текущее незавершённое предложение.
+    """
+    buffer_ = []
+    for fragment in fragments:
+        if '.' not in fragment:
+            buffer_.append(fragment)
+            continue
+
+        buffer_.append(fragment)
+        parts = ''.join(buffer_).split('.')
+        buffer_ = [parts.pop()]
+        for part in parts:
+            sentence = _MULTIPLE_SPACES_RE.sub(' ', part + '.').strip()
+            if sentence:
+                yield sentence
+
+    sentence = _MULTIPLE_SPACES_RE.sub(' ', ''.join(buffer_)).strip()
+    if sentence:
+        yield sentence
+
+
+def iter_paragraphs(sentences, sentences_per_paragraph=3):
+    """
+    Склеивает каждые sentences_per_paragraph предложений в один «абзац».
+    Хвостовые предложения образуют последний, неполный абзац.
+    """
+    buffer_ = []
+    for sentence in sentences:
+        buffer_.append(sentence)
+        if len(buffer_) == sentences_per_paragraph:
+            yield " ".join(buffer_)
+            buffer_ = []
+
+    if buffer_:
+        yield " ".join(buffer_)
+
+
+def _local_path(full_original_path):
+    """
+    Возвращает путь к файлу в локальной файловой системе или None,
+    если хранилище не поддерживает прямой доступ к файлам.
+    """
+    try:
+        return default_storage.path(full_original_path)
+    except NotImplementedError:
+        return None
+
 
 def combine_sentences_in_threes(text, sentences_per_paragraph=3):
     """
@@ -20,47 +141,23 @@ def combine_sentences_in_threes(text, sentences_per_paragraph=3):
          1) "Hello. This is test. One more."
          2) "Next sentence."
     """
-    # Сначала максимально «чистим» текст от лишних переносов
-    text = clean_text(text)
-
-    # Разбиваем по точкам, чтобы каждое предложение оканчивалось точкой.
-    # Используем lookbehind, чтобы точка оставалась в конце предложения,
-    # а не «съедалась» регуляркой.
-    # Затем strip, чтобы убрать пробелы/переносы вокруг.
-    sentences = re.split(r'(?<=\.)', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-
-    paragraphs = []
-    buffer_ = []
-
-    for s in sentences:
-        buffer_.append(s)
-        if len(buffer_) == sentences_per_paragraph:
-            # Склеиваем 3 предложения в один абзац
-            paragraph = " ".join(buffer_)
-            paragraphs.append(paragraph)
-            buffer_.clear()
-
-    # Если остались «хвостовые» предложения, склеиваем их тоже
-    if buffer_:
-        paragraphs.append(" ".join(buffer_))
+    paragraphs = iter_paragraphs(iter_sentences([clean_text(text)]), sentences_per_paragraph)
 
     # Склеим абзацы переводом строки: каждый абзац будет отдельной строкой
-    result_text = "\n".join(paragraphs)
-    return result_text
+    return "\n".join(paragraphs)
 
 
 def process_pdf_file(book, full_original_path):
     """
     Обрабатывает загруженный PDF-файл, извлекает из него текст, определяет главы и страницы,
-    а затем сохраняет каждую главу в базе данных. Может определить и пропустить оглавление (TOC).
+    а затем сохраняет каждую главу в базе данных. Может определить оглавление (TOC) и прекратить на нём обработку.
 
-    При сохранении глав:
-      - Если распознали новый заголовок (chapter_title) —
-        предыдущую главу (если была) сначала превращаем в абзацы по 3 предложения,
-        потом разбиваем на страницы (по строкам) и сохраняем.
-      - Если заголовок не распознали, продолжаем дописывать текст в текущую главу.
-      - Если в конце не оказалось ни одного заголовка, сохраняем «Untitled Chapter».
+    Обработка потоковая: текст страниц PDF (при BOOK_PDF_EXTRACT_WORKERS > 1 — в пуле процессов) -> строки
+    -> границы глав -> предложения -> абзацы по 3 предложения -> страницы по 10 абзацев -> пакетная запись в БД.
+    Глава целиком в памяти не собирается.
+      - Если распознали новый заголовок (chapter_title) — начинается новая глава.
+      - Если заголовок не распознали, строка дописывается в текущую главу.
+      - Текст до первого найденного заголовка сохраняется как «Untitled Chapter».
 
     :param book: Модель Book, к которой будут привязаны новые главы
     :param full_original_path: Полный путь к загруженному PDF-файлу
@@ -70,113 +167,32 @@ def process_pdf_file(book, full_original_path):
         - 'total_chapters': общее количество глав
         - 'total_pages': общее количество страниц
         - 'error': текст ошибки (если возникла)
-
-    Используя split_text_into_pages_by_lines(paragraphs_text, lines_per_page=10)
-    передаем с параметром lines_per_page=10 - 30 предложений = 10 абзацев.
     """
     try:
-        pdf_reader = PdfReader(default_storage.open(full_original_path, 'rb'))
-        total_pages_in_pdf = len(pdf_reader.pages)
-        chapter_titles_detected = []
-        total_chapters = 0
-        total_pages = 0
-        current_page_number = 1  # Начинаем с первой страницы
-
-        current_chapter_title = None
-        current_chapter_text = ''
-        untitled_created = False  # Флаг, что мы уже сохранили "Untitled Chapter"
-        toc_detected = False  # Флаг, что обнаружили оглавление (TOC) и прекратили обработку
-
-        # Пороговое количество заголовков на странице, чтобы считать её TOC
-        TOC_CHAPTER_THRESHOLD = 3
-
-        for i in range(total_pages_in_pdf):
-            if toc_detected:
-                break  # Прекращаем обработку после обнаружения TOC
-
-            page = pdf_reader.pages[i]
-            page_text = page.extract_text()
-            if not page_text:
-                continue  # Пропускаем пустые страницы
-
-            # 1) «Чистим» текст, чтобы лишние переносы не мешали
-            page_text = clean_text(page_text)
-
-            # 2) Смотрим, не является ли текущая страница оглавлением (TOC)
-            lines = page_text.split('\n')
-            chapter_count_on_page = 0
-
-            for line in lines:
-                potential_title = detect_chapter_title(line)
-                if potential_title:
-                    chapter_count_on_page += 1
-
-            # Если на странице 3+ потенциальных заголовков => считаем, что это оглавление
-            if chapter_count_on_page >= TOC_CHAPTER_THRESHOLD:
-                toc_detected = True
-                continue  # Пропускаем эту страницу без распознавания глав
-
-            # 3) Если страница не TOC, разбираемся с заголовками и текстом
-            for line in lines:
-                potential_title = detect_chapter_title(line)
-                if potential_title:
-                    # Если есть накопленная глава, сначала сохраним её
-                    if current_chapter_title and current_chapter_text:
-                        # Склеиваем 3 предложения в абзац
-                        paragraphs_text = combine_sentences_in_threes(current_chapter_text)
-                        # Разбиваем «абзацный» текст на страницы
-                        pages = split_text_into_pages_by_lines(paragraphs_text, lines_per_page=10)
-                        end_page_number = save_chapter(book, current_chapter_title, pages, current_page_number)
-                        total_chapters += 1
-                        total_pages += len(pages)
-                        chapter_titles_detected.append(current_chapter_title)
-                        current_page_number = end_page_number + 1
-                        current_chapter_text = ''  # Сброс текста
-
-                    # Если заголовок найден в первый раз, но до него уже был текст (без заголовка)
-                    if not untitled_created and not current_chapter_title and current_chapter_text:
-                        paragraphs_text = combine_sentences_in_threes(current_chapter_text)
-                        pages = split_text_into_pages_by_lines(paragraphs_text, lines_per_page=10)
-                        end_page_number = save_chapter(book, "Untitled Chapter", pages, current_page_number)
-                        total_chapters += 1
-                        total_pages += len(pages)
-                        chapter_titles_detected.append("Untitled Chapter")
-                        current_page_number = end_page_number + 1
-                        current_chapter_text = ''
-                        untitled_created = True
-
-                    # Устанавливаем новый заголовок главы
-                    current_chapter_title = potential_title
-
-                else:
-                    # Добавляем строку к текущему тексту главы
-                    # (позже всё равно склеим «переносы» в предложения)
-                    current_chapter_text += line + ' '
-
-        # 4) После обработки всех страниц, если что-то осталось в current_chapter_text
-        if current_chapter_text:
-            if current_chapter_title:
-                # Склеиваем 3 предложения в абзацы
-                paragraphs_text = combine_sentences_in_threes(current_chapter_text)
-                pages = split_text_into_pages_by_lines(paragraphs_text, lines_per_page=10)
-                end_page_number = save_chapter(book, current_chapter_title, pages, current_page_number)
-                total_chapters += 1
-                total_pages += len(pages)
-                chapter_titles_detected.append(current_chapter_title)
-            else:
-                # Не было ни одного найденного заголовка
-                paragraphs_text = combine_sentences_in_threes(current_chapter_text)
-                pages = split_text_into_pages_by_lines(paragraphs_text, lines_per_page=10)
-                end_page_number = save_chapter(book, "Untitled Chapter", pages, current_page_number)
-                total_chapters += 1
-                total_pages += len(pages)
-                chapter_titles_detected.append("Untitled Chapter")
+        with default_storage.open(full_original_path, 'rb') as pdf_file:
+            pdf_reader = PdfReader(pdf_file)
+            writer = ChapterWriter(book)
+
+            page_texts = iter_pdf_page_texts(
+                pdf_reader,
+                pdf_path=_local_path(full_original_path),
+                workers=settings.BOOK_PDF_EXTRACT_WORKERS,
+                chunk_pages=settings.BOOK_PDF_EXTRACT_CHUNK_PAGES
+            )
+            for chapter_title, fragments in iter_pdf_chapters(iter_pdf_lines(page_texts, language=book.language)):
+                writer.start_chapter(chapter_title)
+                paragraphs = iter_paragraphs(iter_sentences(fragments))
+                for page_content in iter_text_pages(paragraphs, lines_per_page=PDF_LINES_PER_PAGE):
+                    writer.add_page(page_content)
+                writer.end_chapter()
+
+            writer.close()
 
         return {
             'success': True,
-            'chapter_titles': chapter_titles_detected,
-            'total_chapters': total_chapters,
-            'total_pages': total_pages
+            'chapter_titles': writer.chapter_titles,
+            'total_chapters': writer.total_chapters,
+            'total_pages': writer.total_pages
         }
 
     except Exception as e:
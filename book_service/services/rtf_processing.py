@@ -2,7 +2,7 @@ from django.core.files.storage import default_storage
 from striprtf.striprtf import rtf_to_text
 from .utils import (
     split_text_into_chapters,
-    save_chapter,
+    ChapterWriter,
     split_text_into_pages_by_lines,
     add_paragraph_indent,
 )
@@ -37,26 +37,19 @@ def process_rtf_file(book, full_original_path):
         text_content = add_paragraph_indent(text_content, indent='    ')
 
         # Разбиваем текст на главы
-        chapters, chapter_titles_detected = split_text_into_chapters(text_content)
+        chapters, chapter_titles_detected = split_text_into_chapters(text_content, language=book.language)
 
-        total_chapters = 0
-        total_pages = 0
-        current_page_number = 1  # Инициализируем номер страницы с 1
-
-        # Сохраняем главы
+        # Сохраняем главы (страницы вставляются пачками)
+        writer = ChapterWriter(book)
         for chapter_title, chapter_text in chapters:
-            pages = split_text_into_pages_by_lines(chapter_text)
-            end_page_number = save_chapter(book, chapter_title, pages, current_page_number)
-            total_chapters += 1
-            pages_in_chapter = len(pages)
-            total_pages += pages_in_chapter
-            current_page_number = end_page_number + 1  # Обновляем номер страницы для следующей главы
+            writer.write_chapter(chapter_title, split_text_into_pages_by_lines(chapter_text))
+        writer.close()
 
         return {
             'success': True,
             'chapter_titles': chapter_titles_detected,
-            'total_chapters': total_chapters,
-            'total_pages': total_pages
+            'total_chapters': writer.total_chapters,
+            'total_pages': writer.total_pages
         }
     except Exception as e:
         return {'success': False, 'error': str(e)}
@@ -0,0 +1,117 @@
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from book_service.models import Book, Page
+from book_service.search_config import get_search_config
+
+# Количество результатов поиска по умолчанию и максимальное
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# Максимальная длина строки запроса
+SEARCH_MAX_QUERY_LENGTH = 200
+
+# Параметры ts_headline для фрагмента текста с подсветкой найденных слов
+SEARCH_HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+
+
+def _group_languages_by_config(languages):
+    groups = defaultdict(list)
+    for language in languages:
+        groups[get_search_config(language)].append(language)
+    return groups
+
+
+def search_pages(pages, query_text, languages, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Полнотекстовый поиск по страницам (индекс GIN по Page.search_vector).
+
+    Вектор каждой страницы построен конфигурацией языка её книги, поэтому запрос разбирается
+    отдельно для каждой конфигурации и сопоставляется только со страницами книг этих языков.
+
+    :param pages: QuerySet страниц (уже ограниченный книгами пользователя или одной книгой)
+    :param query_text: Строка запроса (синтаксис websearch: "фраза", -исключение, or)
+    :param languages: Языки книг, среди которых идёт поиск
+    :param limit: Максимальное количество результатов
+    :return: Список словарей с номером страницы, главой, книгой, рангом и фрагментом текста с подсветкой
+    """
+    groups = _group_languages_by_config(languages)
+    if not groups:
+        return []
+
+    match = Q()
+    rank_cases = []
+    for config, config_languages in groups.items():
+        query = SearchQuery(query_text, config=config, search_type='websearch')
+        match |= Q(book__language__in=config_languages, search_vector=query)
+        rank_cases.append(When(book__language__in=config_languages, then=SearchRank(F('search_vector'), query)))
+
+    hits = list(
+        pages.filter(match)
+        .annotate(rank=Case(*rank_cases, default=Value(0.0), output_field=FloatField()))
+        .select_related('chapter', 'book')
+        .defer('search_vector')
+        .order_by('-rank', 'book_id', 'page_number')[:limit]
+    )
+    snippets = build_headlines(
+        [(hit.get_content(), get_search_config(hit.book.language)) for hit in hits],
+        query_text
+    )
+
+    return [
+        {
+            'page_id': hit.id,
+            'page_number': hit.page_number,
+            'chapter_id': hit.chapter_id,
+            'chapter_title': hit.chapter.chapter_title,
+            'book_id': hit.book_id,
+            'book_title': hit.book.title,
+            'rank': hit.rank,
+            'snippet': snippet,
+        }
+        for hit, snippet in zip(hits, snippets)
+    ]
+
+
+def build_headlines(texts_with_configs, query_text):
+    """
+    Строит фрагменты текста с подсветкой найденных слов (ts_headline) одним запросом.
+    Текст передаётся из Python, поэтому работает и для сжатых страниц.
+
+    :param texts_with_configs: Список пар (текст страницы, конфигурация поиска)
+    :param query_text: Строка запроса
+    :return: Список фрагментов в том же порядке
+    """
+    if not texts_with_configs:
+        return []
+
+    texts = [text for text, _ in texts_with_configs]
+    configs = [config for _, config in texts_with_configs]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT ts_headline(item.config::regconfig, item.text,
+                               websearch_to_tsquery(item.config::regconfig, %s), %s)
+            FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS item(text, config, position)
+            ORDER BY item.position
+            """,
+            [query_text, SEARCH_HEADLINE_OPTIONS, texts, configs]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_library(user_id, query_text, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Поиск по всем книгам пользователя.
+    """
+    languages = Book.objects.filter(user_id=user_id).values_list('language', flat=True).distinct()
+    return search_pages(Page.objects.filter(book__user_id=user_id), query_text, list(languages), limit)
+
+
+def search_book(book, query_text, limit=SEARCH_DEFAULT_LIMIT):
+    """
+    Поиск внутри одной книги.
+    """
+    return search_pages(Page.objects.filter(book=book), query_text, [book.language], limit)
@@ -0,0 +1,72 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from book_service.serializers import PageSerializer
+
+# Количество страниц, которое читается из курсора БД за один раз
+STREAM_FETCH_SIZE = 200
+
+# Минимальный размер фрагмента ответа: мелкие куски склеиваются, чтобы не отправлять по странице на запись
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def _dumps(data):
+    # Тот же кодировщик, что и у JSONRenderer (UUID, даты, Decimal)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False)
+
+
+def iter_json_array(items, to_representation):
+    """
+    Кодирует элементы в JSON-массив по одному и возвращает его частями (str).
+    В памяти держится только текущий фрагмент ответа, а не весь список.
+
+    :param items: Итератор объектов (например, queryset.iterator())
+    :param to_representation: Функция, превращающая объект в данные для JSON
+    """
+    buffer_ = ['[']
+    size = 1
+    first = True
+    for item in items:
+        chunk = _dumps(to_representation(item))
+        if not first:
+            chunk = ',' + chunk
+        first = False
+        buffer_.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_BUFFER_SIZE:
+            yield ''.join(buffer_)
+            buffer_ = []
+            size = 0
+    buffer_.append(']')
+    yield ''.join(buffer_)
+
+
+def iter_book_export(book_data, pages):
+    """
+    Возвращает JSON-документ экспорта книги частями: {"book": {...}, "pages": [...]}.
+    Данные книги (с главами) кодируются сразу, страницы — по мере чтения из базы данных.
+    """
+    yield '{"book": ' + _dumps(book_data) + ', "pages": '
+    yield from iter_json_array(pages.iterator(chunk_size=STREAM_FETCH_SIZE), PageSerializer().to_representation)
+    yield '}'
+
+
+def stream_pages_response(pages):
+    """
+    Потоковый JSON-ответ со списком страниц (тот же формат, что и PageSerializer(pages, many=True).data).
+    Страницы читаются из базы данных порциями через queryset.iterator(), поэтому время до первого байта
+    и потребление памяти не зависят от размера главы.
+    """
+    chunks = iter_json_array(pages.iterator(chunk_size=STREAM_FETCH_SIZE), PageSerializer().to_representation)
+    return StreamingHttpResponse(chunks, content_type='application/json')
+
+
+def stream_book_export_response(book_data, pages, filename):
+    """
+    Потоковый JSON-ответ с экспортом книги целиком (см. iter_book_export).
+    """
+    response = StreamingHttpResponse(iter_book_export(book_data, pages), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
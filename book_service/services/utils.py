@@ -1,8 +1,32 @@
 import uuid
 import re
+from functools import lru_cache
+from django.conf import settings
 from book_service.models import BookChapter, Page
 
 
+# Избыточные пробелы (более одного пробела подряд)
+_MULTIPLE_SPACES_RE = re.compile(r' {2,}')
+# Избыточные переносы строк (более двух подряд)
+_EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+
+# Ключевые слова, с которых начинаются заголовки глав, по языкам (код языка без региона)
+CHAPTER_KEYWORDS = {
+    'en': ('chapter', 'part', 'section'),
+    'ru': ('глава', 'часть', 'раздел'),
+    'uk': ('розділ', 'частина', 'глава'),
+    'be': ('раздзел', 'частка', 'глава'),
+    'de': ('kapitel', 'teil', 'abschnitt'),
+    'fr': ('chapitre', 'partie', 'section'),
+    'es': ('capítulo', 'parte', 'sección'),
+    'it': ('capitolo', 'parte', 'sezione'),
+    'pl': ('rozdział', 'część'),
+}
+
+# Языки, ключевые слова которых проверяются для книги на любом языке
+DEFAULT_CHAPTER_LANGUAGES = ('en', 'ru')
+
+
 def clean_text(text):
     """
     Очищает текст от лишних табуляций, лишних пробелов и переносов строк.
@@ -14,62 +38,84 @@ def clean_text(text):
     # Заменяем символы табуляции на пробелы
     text = text.replace('\t', ' ')
 
-    # Удаляем избыточные пробелы (более одного пробела подряд)
-    text = re.sub(r' {2,}', ' ', text)
+    # Удаляем избыточные пробелы (более одного пробела подряд); регулярное выражение
+    # запускаем, только если такие пробелы вообще есть
+    if '  ' in text:
+        text = _MULTIPLE_SPACES_RE.sub(' ', text)
 
     # Удаляем избыточные переносы строк (более двух подряд)
-    text = re.sub(r'\n{3,}', '\n', text)
+    if '\n\n\n' in text:
+        text = _EXTRA_NEWLINES_RE.sub('\n', text)
 
     # Удаляем пробелы в начале и конце каждой строки
-    lines = text.split('\n')
-    cleaned_lines = [line.strip() for line in lines]
-    cleaned_text = '\n'.join(cleaned_lines)
-
-    return cleaned_text.strip()
+    return '\n'.join([line.strip() for line in text.split('\n')]).strip()
 
 
-def detect_chapter_title(line):
+class ChapterTitleDetector:
     """
-    Проверяет, является ли строка названием главы, ориентируясь на ключевые слова
-    и структуру строки. Возвращает строку, если она распознана как заголовок,
-    иначе None.
+    Определяет заголовки глав по ключевым словам в начале строки.
+    Все ключевые слова объединены в одно заранее скомпилированное регулярное выражение,
+    поэтому проверка строки — один вызов match без создания промежуточных строк.
     """
-    if not line:
-        return None
 
-    line = line.strip()
+    def __init__(self, keywords, max_words=8, min_length=3):
+        # Длинные ключевые слова раньше коротких, чтобы альтернатива не зависела от порядка
+        alternation = '|'.join(re.escape(keyword) for keyword in sorted(set(keywords), key=len, reverse=True))
+        self.regex = re.compile(rf'\s*(?:{alternation})', re.IGNORECASE)
+        self.max_words = max_words
+        self.min_length = min_length
+
+    def detect(self, line):
+        if not line or self.regex.match(line) is None:
+            return None
+
+        line = line.strip()
+        if len(line) < self.min_length or len(line.split()) > self.max_words:
+            return None
+
+        return line
+
 
-    if len(line) < 3:
-        return None
+def _chapter_languages(language):
+    languages = set(DEFAULT_CHAPTER_LANGUAGES)
+    if language:
+        languages.add(language.split('-')[0].split('_')[0].lower())
+    return frozenset(languages)
 
-    words = line.split()
-    if len(words) > 8:
-        return None
 
-    chapter_keywords = [
-        'chapter',
-        'глава',
-        'part',
-        'часть',
-        'section',
-        'раздел'
-    ]
-    line_lower = line.lower()
+@lru_cache(maxsize=None)
+def _get_detector_for_languages(languages):
+    keywords = [keyword for code in languages for keyword in CHAPTER_KEYWORDS.get(code, ())]
+    return ChapterTitleDetector(keywords)
 
-    # Проверяем наличие ключевых слов в начале строки
-    for keyword in chapter_keywords:
-        if line_lower.startswith(keyword):
-            return line
 
-    return None
+def get_chapter_title_detector(language=None):
+    """
+    Возвращает (закэшированный) детектор заголовков для языка книги ('en-US', 'ru' и т.д.).
+    Кроме ключевых слов языка книги всегда учитываются слова из DEFAULT_CHAPTER_LANGUAGES.
+    """
+    return _get_detector_for_languages(_chapter_languages(language))
 
 
-def split_text_into_chapters(text):
+def detect_chapter_title(line, language=None):
+    """
+    Проверяет, является ли строка названием главы, ориентируясь на ключевые слова
+    и структуру строки. Возвращает строку, если она распознана как заголовок,
+    иначе None.
+
+    :param line: Проверяемая строка
+    :param language: Код языка книги; добавляет ключевые слова этого языка из CHAPTER_KEYWORDS
+    """
+    return get_chapter_title_detector(language).detect(line)
+
+
+def split_text_into_chapters(text, language=None):
     """
     Разбивает весь текст на главы, опираясь на detect_chapter_title для определения заголовков.
     Если заголовок не найден, формирует главу с названием «Без названия n».
 
     :param text: Полный текст для разбивки
+    :param language: Код языка книги для выбора ключевых слов заголовков
     :return: Кортеж из списка кортежей (название главы, текст главы) и списка обнаруженных названий глав
     """
     lines = text.split('\n')
@@ -78,8 +124,10 @@ def split_text_into_chapters(text):
     current_chapter_lines = []
     chapter_titles_detected = []
 
+    detector = get_chapter_title_detector(language)
+
     for line in lines:
-        potential_title = detect_chapter_title(line)
+        potential_title = detector.detect(line)
         if potential_title:
             # Если уже есть накопленный текст, сохраняем предыдущую главу
             if current_chapter_lines:
@@ -140,10 +188,161 @@ def split_text_into_pages_by_lines(chapter_text, lines_per_page=20):
     return pages
 
 
+def iter_paragraph_lines(text, indent='    '):
+    """
+    Очищает текст одного абзаца (clean_text) и возвращает его строки,
+    добавляя отступ в начало каждой непустой строки (как add_paragraph_indent).
+    Пустой абзац не даёт ни одной строки.
+    """
+    cleaned = clean_text(text)
+    if not cleaned:
+        return
+
+    for line in cleaned.split('\n'):
+        yield indent + line if line else line
+
+
+def iter_text_pages(lines, lines_per_page=20):
+    """
+    Потоковый вариант split_text_into_pages_by_lines: собирает страницы по lines_per_page строк
+    из итератора строк. Если строк нет совсем, возвращает одну пустую страницу.
+    """
+    page_lines = []
+    emitted = False
+    for line in lines:
+        page_lines.append(line)
+        if len(page_lines) == lines_per_page:
+            yield '\n'.join(page_lines)
+            page_lines = []
+            emitted = True
+
+    if page_lines or not emitted:
+        yield '\n'.join(page_lines)
+
+
+class ChapterWriter:
+    """
+    Пакетная запись глав (BookChapter) и страниц (Page) книги.
+    Номера страниц сквозные по всей книге, диапазон start/end главы вычисляется при записи.
+    Строки накапливаются в памяти и вставляются через bulk_create пачками
+    по BOOK_PAGE_BULK_BATCH_SIZE (или batch_size) страниц, вместо одного INSERT на страницу.
+
+    Главу можно записать целиком (write_chapter) или постранично:
+    start_chapter -> add_page ... -> end_chapter. После записи всех глав нужно вызвать close().
+    """
+
+    def __init__(self, book, start_page_number=1, batch_size=None):
+        self.book = book
+        self.batch_size = batch_size or settings.BOOK_PAGE_BULK_BATCH_SIZE
+        self.current_page_number = start_page_number
+        self.total_chapters = 0
+        self.total_pages = 0
+        self.chapter_titles = []
+
+        self._chapter = None
+        self._chapter_inserted = False
+        self._pending_chapters = []
+        self._pending_pages = []
+
+    def write_chapter(self, chapter_title, pages_content):
+        """
+        Записывает главу целиком.
+
+        :param chapter_title: Название главы
+        :param pages_content: Список текстов страниц (список строк)
+        :return: Последний номер страницы, использованный для главы
+        """
+        self.start_chapter(chapter_title)
+        for page_content in pages_content:
+            self.add_page(page_content)
+        return self.end_chapter()
+
+    def start_chapter(self, chapter_title):
+        """
+        Начинает новую главу (предыдущая незакрытая глава закрывается).
+        Пустое название заменяется на «Untitled Chapter n».
+        """
+        if self._chapter is not None:
+            self.end_chapter()
+
+        if not chapter_title or chapter_title.strip() == '':
+            chapter_title = f"Untitled Chapter {self.total_chapters + 1}"
+        chapter_title = chapter_title[:BookChapter._meta.get_field('chapter_title').max_length]
+
+        self._chapter = BookChapter(
+            id=uuid.uuid4(),
+            book=self.book,
+            chapter_title=chapter_title,
+            start_page_number=self.current_page_number,
+            end_page_number=self.current_page_number - 1
+        )
+        self._chapter_inserted = False
+        self._pending_chapters.append(self._chapter)
+
+    def add_page(self, page_content):
+        """
+        Добавляет страницу в текущую главу под следующим сквозным номером.
+        """
+        page = Page(
+            id=uuid.uuid4(),
+            chapter=self._chapter,
+            book=self.book,
+            page_number=self.current_page_number
+        )
+        page.set_content(page_content, language=self.book.language)
+        self._pending_pages.append(page)
+        self._chapter.end_page_number = self.current_page_number
+        self.current_page_number += 1
+        self.total_pages += 1
+
+        if len(self._pending_pages) >= self.batch_size:
+            self.flush()
+
+    def end_chapter(self):
+        """
+        Закрывает текущую главу.
+
+        :return: Последний номер страницы, использованный для главы
+        """
+        chapter = self._chapter
+        # Глава уже вставлена при промежуточном flush — дописываем конечный номер страницы
+        if self._chapter_inserted:
+            BookChapter.objects.filter(id=chapter.id).update(end_page_number=chapter.end_page_number)
+
+        self.total_chapters += 1
+        self.chapter_titles.append(chapter.chapter_title)
+        self._chapter = None
+        self._chapter_inserted = False
+        return chapter.end_page_number
+
+    def flush(self):
+        """
+        Вставляет накопленные главы и страницы в базу данных.
+        """
+        if self._pending_chapters:
+            BookChapter.objects.bulk_create(self._pending_chapters, batch_size=self.batch_size)
+            self._pending_chapters = []
+            if self._chapter is not None:
+                self._chapter_inserted = True
+
+        if self._pending_pages:
+            Page.objects.bulk_create(self._pending_pages, batch_size=self.batch_size)
+            self._pending_pages = []
+
+    def close(self):
+        """
+        Закрывает незавершённую главу и записывает оставшиеся строки.
+        """
+        if self._chapter is not None:
+            self.end_chapter()
+        self.flush()
+
+
 def save_chapter(book, chapter_title, pages_content, current_page_number):
     """
     Создаёт модель главы (BookChapter) и связанные с ней страницы (Page) в базе данных.
     Возвращает последний номер страницы, использованный для сохранённой главы.
+    Для записи книги целиком используйте ChapterWriter, чтобы не делать отдельный запрос на каждую главу.
 
     :param book: Модель Book, к которой привязана глава
     :param chapter_title: Название главы
@@ -154,29 +353,9 @@ def save_chapter(book, chapter_title, pages_content, current_page_number):
     if not chapter_title or chapter_title.strip() == '':
         chapter_title = f"Untitled Chapter {book.chapters.count() + 1}"
 
-    chapter = BookChapter.objects.create(
-        id=uuid.uuid4(),
-        book=book,
-        chapter_title=chapter_title
-    )
-
-    start_page_number = current_page_number
-    page_number = start_page_number
-
-    for page_content in pages_content:
-        Page.objects.create(
-            id=uuid.uuid4(),
-            chapter=chapter,
-            page_number=page_number,
-            content=page_content
-        )
-        page_number += 1
-
-    end_page_number = page_number - 1
-    chapter.start_page_number = start_page_number
-    chapter.end_page_number = end_page_number
-    chapter.save()
-
+    writer = ChapterWriter(book, start_page_number=current_page_number)
+    end_page_number = writer.write_chapter(chapter_title, pages_content)
+    writer.close()
     return end_page_number
 
 
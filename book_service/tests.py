@@ -1,3 +1,1128 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from book_service.compression import compress_text, decompress_text
+from book_service.models import Book, BookChapter, BookGenre, Genre, IngestionJob, Page
+from book_service.services import ingestion, page_cache
+from book_service.services.chapter_operations import move_chapter, renumber_book
+from book_service.services.content_version import mark_book_content_changed
+from book_service.services.deduplication import find_processed_duplicate
+from book_service.services.pdf_extraction import iter_page_texts_parallel
+from book_service.services.search import search_book
+from book_service.services.utils import ChapterWriter
+from book_service.serializers import PageSerializer
+from book_service.services.epub_processing import iter_html_blocks
+from book_service.services.fb2_processing import iter_fb2_paragraphs
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def create_book(user_id=None, **kwargs):
+    kwargs.setdefault('title', 'Книга')
+    kwargs.setdefault('language', 'en')
+    return Book.objects.create(user_id=user_id or uuid.uuid4(), **kwargs)
+
+
+def create_chapter(book, start_page_number, page_count, **kwargs):
+    """
+    Создаёт главу с page_count страницами начиная с start_page_number (без пересчёта итогов книги).
+    """
+    chapter = BookChapter.objects.create(
+        book=book,
+        start_page_number=start_page_number if page_count else None,
+        end_page_number=start_page_number + page_count - 1 if page_count else None,
+        **kwargs
+    )
+    Page.objects.bulk_create(
+        Page(book=book, chapter=chapter, page_number=start_page_number + offset, content=f'Страница {offset + 1}')
+        for offset in range(page_count)
+    )
+    return chapter
+
+
+class ApiTestCase(TestCase):
+    """
+    Базовый класс для тестов API: клиент с JWT пользователя user_id.
+    """
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        token = jwt.encode({'user_id': str(self.user_id), 'username': 'reader'}, settings.JWT_SECRET_KEY,
+                           algorithm='HS256')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+@override_settings(BOOK_INGESTION_JOB_TIMEOUT=60, BOOK_INGESTION_MAX_ATTEMPTS=2, BOOK_INGESTION_QUEUED_GRACE=10)
+@mock.patch('book_service.services.ingestion._delete_source_file')
+@mock.patch('book_service.services.ingestion.submit_ingestion_job')
+class IngestionRecoveryTests(TestCase):
+    """
+    Восстановление задач обработки, потерянных при перезапуске процесса (recover_ingestion_jobs).
+    """
+
+    def create_job(self, status, minutes_ago, attempts=1, heartbeat_minutes_ago=None):
+        book = create_book()
+        moment = timezone.now() - timedelta(minutes=minutes_ago)
+        job = IngestionJob.objects.create(
+            user_id=book.user_id, book=book, file_path='u/book.txt', file_extension='txt',
+            status=status, attempts=attempts,
+            started_at=moment if status == IngestionJob.STATUS_RUNNING else None,
+            heartbeat_at=(timezone.now() - timedelta(minutes=heartbeat_minutes_ago)
+                          if heartbeat_minutes_ago is not None else None)
+        )
+        IngestionJob.objects.filter(id=job.id).update(updated_at=moment)
+        return job
+
+    def test_stale_running_job_is_requeued_and_submitted(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=5)
+
+        result = ingestion.recover_ingestion_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_QUEUED)
+        self.assertIsNone(job.started_at)
+        self.assertEqual(result['requeued'], 1)
+        submit.assert_called_once_with(job.id)
+
+    def test_recent_running_job_is_left_alone(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=0)
+
+        ingestion.recover_ingestion_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_RUNNING)
+        submit.assert_not_called()
+
+    def test_long_running_job_with_heartbeat_is_left_alone(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=120, heartbeat_minutes_ago=0)
+
+        ingestion.recover_ingestion_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_RUNNING)
+        submit.assert_not_called()
+
+    def test_job_without_recent_heartbeat_is_requeued(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=3, heartbeat_minutes_ago=2)
+
+        result = ingestion.recover_ingestion_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.heartbeat_at), (IngestionJob.STATUS_QUEUED, None))
+        self.assertEqual(result['requeued'], 1)
+
+    def test_heartbeat_marks_only_own_run(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=5, heartbeat_minutes_ago=5)
+        own_job = IngestionJob.objects.filter(id=job.id, status=IngestionJob.STATUS_RUNNING, started_at=job.started_at)
+        heartbeat = ingestion.IngestionHeartbeat(own_job)
+
+        self.assertTrue(heartbeat.beat())
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, timezone.now() - timedelta(seconds=5))
+
+        # Отметка свежая — восстановление задачу не трогает
+        self.assertEqual(ingestion.recover_ingestion_jobs()['requeued'], 0)
+        # Воркер перестал отмечаться, задачу вернули в очередь — прежний запуск её больше не отмечает
+        IngestionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(ingestion.recover_ingestion_jobs()['requeued'], 1)
+        self.assertFalse(heartbeat.beat())
+
+    def test_recovery_runs_in_one_process_at_a_time(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=5)
+        # Другой процесс уже выполняет восстановление и держит блокировку
+        other = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [ingestion.INGESTION_RECOVERY_LOCK_ID])
+
+        result = ingestion.recover_ingestion_jobs()
+
+        self.assertTrue(result['skipped'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_RUNNING)
+        submit.assert_not_called()
+
+        with other.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [ingestion.INGESTION_RECOVERY_LOCK_ID])
+        self.assertEqual(ingestion.recover_ingestion_jobs()['requeued'], 1)
+
+    def test_running_job_out_of_attempts_fails_and_discards_book(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_RUNNING, minutes_ago=5, attempts=2)
+        book_id = job.book_id
+
+        result = ingestion.recover_ingestion_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_FAILED)
+        self.assertIsNotNone(job.error)
+        self.assertFalse(Book.objects.filter(id=book_id).exists())
+        self.assertEqual(result['failed'], 1)
+        delete_file.assert_called_once_with(job.file_path)
+        submit.assert_not_called()
+
+    def test_waiting_queued_job_is_resubmitted(self, submit, delete_file):
+        waiting = self.create_job(IngestionJob.STATUS_QUEUED, minutes_ago=1)
+        self.create_job(IngestionJob.STATUS_QUEUED, minutes_ago=0)
+
+        ingestion.recover_ingestion_jobs()
+
+        submit.assert_called_once_with(waiting.id)
+
+    def test_superseded_run_discards_its_result(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_QUEUED, minutes_ago=0)
+
+        def processor(book, file_path):
+            # Пока воркер обрабатывал файл, задачу вернуло в очередь восстановление
+            BookChapter.objects.create(book=book, start_page_number=1, end_page_number=1)
+            IngestionJob.objects.filter(id=job.id).update(status=IngestionJob.STATUS_QUEUED, started_at=None)
+            return {'success': True, 'total_chapters': 1, 'total_pages': 1, 'chapter_titles': []}
+
+        with mock.patch.dict(ingestion.FILE_PROCESSORS, {'txt': processor}):
+            ingestion.process_ingestion_job(job.id)
+
+        # Результат запуска откатан, а задача не помечена ни done, ни failed: её завершит новый запуск
+        job.refresh_from_db()
+        self.assertNotIn(job.status, (IngestionJob.STATUS_DONE, IngestionJob.STATUS_FAILED))
+        self.assertTrue(Book.objects.filter(id=job.book_id).exists())
+        self.assertFalse(BookChapter.objects.filter(book_id=job.book_id).exists())
+        delete_file.assert_not_called()
+
+    def test_completed_run_marks_job_done(self, submit, delete_file):
+        job = self.create_job(IngestionJob.STATUS_QUEUED, minutes_ago=0, attempts=0)
+
+        def processor(book, file_path):
+            chapter = BookChapter.objects.create(book=book, start_page_number=1, end_page_number=1)
+            Page.objects.create(chapter=chapter, page_number=1, content='text')
+            return {'success': True, 'total_chapters': 1, 'total_pages': 1, 'chapter_titles': ['Untitled Chapter']}
+
+        with mock.patch.dict(ingestion.FILE_PROCESSORS, {'txt': processor}):
+            ingestion.process_ingestion_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestionJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.book.total_pages, 1)
+        delete_file.assert_called_once_with(job.file_path)
+
+
+class Fb2ChapterTests(SimpleTestCase):
+    """
+    Границы глав при потоковом разборе FB2 (iter_fb2_paragraphs).
+    """
+
+    def chapters(self, body):
+        document = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<FictionBook xmlns="http://www.gribuser.ru/xml/fictionbook/2.0">'
+            f'<body>{body}</body><body name="notes"><section><p>note</p></section></body></FictionBook>'
+        ).encode()
+        result = {}
+        for index, title, text in iter_fb2_paragraphs(io.BytesIO(document)):
+            result.setdefault((index, title), []).append(text)
+        return list(result.items())
+
+    def test_untitled_subsection_stays_in_chapter(self):
+        chapters = self.chapters(
+            '<section><title><p>Chapter 1</p></title><p>a</p>'
+            '<section><p>b</p></section>'
+            '<p>c</p></section>'
+            '<section><title><p>Chapter 2</p></title><p>d</p></section>'
+        )
+        self.assertEqual(chapters, [((0, 'Chapter 1'), ['a', 'b', 'c']), ((1, 'Chapter 2'), ['d'])])
+
+    def test_titled_subsections_start_chapters(self):
+        chapters = self.chapters(
+            '<section><title><p>Part</p></title>'
+            '<section><title><p>One</p></title><p>a</p></section>'
+            '<section><title><p>Two</p></title><p>b</p></section>'
+            '<p>c</p></section>'
+        )
+        self.assertEqual(chapters, [((0, 'One'), ['a']), ((1, 'Two'), ['b']), ((2, 'Part'), ['c'])])
+
+    def test_untitled_top_level_sections_are_chapters(self):
+        chapters = self.chapters('<section><p>a</p></section><section><p>b</p></section>')
+        self.assertEqual(chapters, [((0, None), ['a']), ((1, None), ['b'])])
+
+
+class EpubHtmlBlocksTests(SimpleTestCase):
+    """
+    Разбор документов EPUB (iter_html_blocks).
+    """
+
+    def test_empty_document_is_skipped(self):
+        self.assertEqual(list(iter_html_blocks(b'')), [])
+        self.assertEqual(list(iter_html_blocks(b'  \n\t ')), [])
+
+    def test_blocks_and_anchors(self):
+        content = b'<html><body><p>One</p><h2 id="c2">Two</h2><p>Three</p></body></html>'
+        self.assertEqual(
+            list(iter_html_blocks(content, {'c2': 'Chapter 2'})),
+            [('text', 'One'), ('anchor', 'Chapter 2'), ('text', 'Two'), ('text', 'Three')]
+        )
+
+
+class ChapterWriterTests(TestCase):
+    """
+    Пакетная запись глав и страниц (ChapterWriter): вставка пачками по batch_size и дозапись остатка в close().
+    """
+
+    def setUp(self):
+        self.book = create_book()
+
+    def stored_pages(self):
+        return list(Page.objects.filter(book=self.book).order_by('page_number').values_list('page_number', 'content'))
+
+    def stored_chapters(self):
+        return list(
+            BookChapter.objects.filter(book=self.book).order_by('start_page_number')
+            .values_list('chapter_title', 'start_page_number', 'end_page_number')
+        )
+
+    def test_flushes_at_batch_size_boundary(self):
+        writer = ChapterWriter(self.book, batch_size=3)
+        writer.start_chapter('Глава 1')
+        with self.assertNumQueries(0):
+            writer.add_page('1')
+            writer.add_page('2')
+        self.assertEqual(self.stored_pages(), [])
+
+        # Третья страница заполняет пачку: глава и страницы вставляются двумя bulk_create
+        with self.assertNumQueries(2):
+            writer.add_page('3')
+        self.assertEqual(self.stored_pages(), [(1, '1'), (2, '2'), (3, '3')])
+        self.assertEqual(self.stored_chapters(), [('Глава 1', 1, 3)])
+
+        with self.assertNumQueries(0):
+            writer.add_page('4')
+
+    def test_close_writes_partial_batch(self):
+        writer = ChapterWriter(self.book, batch_size=10)
+        with self.assertNumQueries(0):
+            writer.write_chapter('Глава 1', ['1', '2'])
+            writer.start_chapter('')
+            writer.add_page('3')
+
+        # Незакрытая глава закрывается, главы и страницы вставляются двумя bulk_create
+        with self.assertNumQueries(2):
+            writer.close()
+        self.assertEqual(self.stored_chapters(), [('Глава 1', 1, 2), ('Untitled Chapter 2', 3, 3)])
+        self.assertEqual(self.stored_pages(), [(1, '1'), (2, '2'), (3, '3')])
+        self.assertEqual((writer.total_chapters, writer.total_pages), (2, 3))
+
+    def test_chapter_spanning_batches_gets_final_end_page(self):
+        writer = ChapterWriter(self.book, start_page_number=5, batch_size=2)
+        writer.write_chapter('Глава 1', ['5'])
+        writer.start_chapter('Глава 2')
+        for content in ('6', '7', '8', '9'):
+            writer.add_page(content)
+        self.assertEqual(self.stored_chapters(), [('Глава 1', 5, 5), ('Глава 2', 6, 6)])
+
+        # Глава 2 уже вставлена: close() дописывает её конечный номер и оставшуюся страницу
+        with self.assertNumQueries(2):
+            writer.close()
+        self.assertEqual(self.stored_chapters(), [('Глава 1', 5, 5), ('Глава 2', 6, 9)])
+        self.assertEqual([number for number, _ in self.stored_pages()], [5, 6, 7, 8, 9])
+
+
+class FakePdfPage:
+    def __init__(self, number, delay):
+        self.number = number
+        self.delay = delay
+
+    def extract_text(self):
+        time.sleep(self.delay)
+        FakePdfReader.extracted.append(self.number)
+        return f'Страница {self.number}'
+
+
+class FakePdfReader:
+    """
+    Источник страниц вместо PdfReader: первые страницы извлекаются дольше последних,
+    поэтому диапазоны в пуле завершаются не по порядку.
+    """
+    page_count = 20
+    extracted = []
+
+    def __init__(self, pdf_path):
+        self.pages = [FakePdfPage(number, (self.page_count - number) * 0.002) for number in range(self.page_count)]
+
+
+def thread_pool_executor(max_workers, mp_context, initializer, initargs):
+    # Пул потоков вместо процессов: поддельный источник страниц не нужно загружать в дочерних процессах
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+@mock.patch('book_service.services.pdf_extraction.ProcessPoolExecutor', thread_pool_executor)
+@mock.patch('book_service.services.pdf_extraction.PdfReader', FakePdfReader)
+class PdfPageExtractionTests(SimpleTestCase):
+    """
+    Извлечение текста страниц PDF в пуле (iter_page_texts_parallel).
+    """
+
+    def setUp(self):
+        FakePdfReader.extracted = []
+
+    def test_pages_are_returned_in_source_order(self):
+        for chunk_pages in (1, 3, 20, 50):
+            with self.subTest(chunk_pages=chunk_pages):
+                texts = list(iter_page_texts_parallel('book.pdf', 20, workers=4, chunk_pages=chunk_pages))
+                self.assertEqual(texts, [f'Страница {number}' for number in range(20)])
+
+    def test_extraction_stops_when_consumer_stops(self):
+        pages = iter_page_texts_parallel('book.pdf', 20, workers=2, chunk_pages=1)
+        self.assertEqual([next(pages) for _ in range(3)], ['Страница 0', 'Страница 1', 'Страница 2'])
+        pages.close()
+
+        # В работе не более 2 * workers диапазонов, остальные отменяются
+        self.assertLessEqual(len(FakePdfReader.extracted), 3 + 2 * 2)
+
+
+class DeduplicationTests(TestCase):
+    """
+    Поиск ранее обработанной копии загружаемого файла (find_processed_duplicate).
+    """
+
+    def create_processed_book(self, user_id):
+        book = create_book(user_id=user_id, content_hash='a' * 64)
+        IngestionJob.objects.create(user_id=user_id, book=book, file_path='book.txt', file_extension='txt',
+                                    status=IngestionJob.STATUS_DONE)
+        return book
+
+    def test_finds_own_processed_book(self):
+        user_id = uuid.uuid4()
+        book = self.create_processed_book(user_id)
+        self.assertEqual(find_processed_duplicate('a' * 64, 'en', user_id), book)
+
+    def test_ignores_books_of_other_users(self):
+        self.create_processed_book(uuid.uuid4())
+        self.assertIsNone(find_processed_duplicate('a' * 64, 'en', uuid.uuid4()))
+
+
+@unittest.skipIf(zstandard is None, 'zstandard не установлен')
+class ZstdDictionaryTests(SimpleTestCase):
+    """
+    Сжатие страниц zstd со словарями: страницы читаются и после переобучения словаря языка.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.paths = []
+        for seed in range(2):
+            samples = [f'Страница {i} книги {seed}: текст для обучения словаря номер {i * seed}'.encode() * 3
+                       for i in range(500)]
+            path = os.path.join(directory.name, f'ru-{seed}.dict')
+            with open(path, 'wb') as f:
+                f.write(zstandard.train_dictionary(2048, samples).as_bytes())
+            self.paths.append(path)
+
+    def test_pages_survive_dictionary_retraining(self):
+        text = 'Страница 7 книги 0: текст для обучения словаря'
+        with self.settings(BOOK_PAGE_ZSTD_DICTIONARIES={'ru': self.paths[0]}):
+            value = compress_text(text, codec='zstd', language='ru-RU')
+            self.assertEqual(decompress_text(value), text)
+
+        with self.settings(BOOK_PAGE_ZSTD_DICTIONARIES={'ru': self.paths[1]},
+                           BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES=[self.paths[0]]):
+            self.assertEqual(decompress_text(value), text)
+
+        with self.settings(BOOK_PAGE_ZSTD_DICTIONARIES={'ru': self.paths[1]}, BOOK_PAGE_ZSTD_RETIRED_DICTIONARIES=[]):
+            with self.assertRaises(ImproperlyConfigured):
+                decompress_text(value)
+
+    def test_without_dictionary(self):
+        with self.settings(BOOK_PAGE_ZSTD_DICTIONARIES={}):
+            self.assertEqual(decompress_text(compress_text('text', codec='zstd', language='en')), 'text')
+
+
+def require_index(test, index_name):
+    """
+    Пропускает тест, если индекса нет в базе (например, без расширения pg_trgm триграммные индексы не создаются).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [index_name])
+        if cursor.fetchone() is None:
+            test.skipTest(f'индекс {index_name} отсутствует в базе')
+
+
+class LookupIndexTests(TestCase):
+    """
+    Горячие выборки страниц, глав и книг обслуживаются составными индексами, поиск книг по подстроке
+    названия — триграммным GIN-индексом (EXPLAIN показывает индекс).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        for book_number in range(20):
+            book = create_book(user_id=cls.user_id if book_number % 2 else None, title=f'Книга {book_number}')
+            chapters = BookChapter.objects.bulk_create(
+                BookChapter(book=book, start_page_number=number * 10 + 1, end_page_number=number * 10 + 10)
+                for number in range(10)
+            )
+            Page.objects.bulk_create(
+                Page(book=book, chapter=chapter, page_number=chapter.start_page_number + offset, content='Текст')
+                for chapter in chapters for offset in range(10)
+            )
+        cls.book = book
+        cls.chapter = chapters[3]
+        with connection.cursor() as cursor:
+            for model in (Book, BookChapter, Page):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def explain(self, queryset):
+        # На маленьких таблицах планировщик может предпочесть полный или bitmap-просмотр;
+        # проверяем, что упорядоченный индексный просмотр применим
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        return queryset.explain()
+
+    def test_page_by_chapter_and_number(self):
+        plan = self.explain(Page.objects.filter(chapter=self.chapter, page_number=35))
+        self.assertIn('page_chapter_page_number_uniq', plan)
+
+    def test_chapters_of_book_by_start_page(self):
+        plan = self.explain(BookChapter.objects.filter(book=self.book).order_by('start_page_number'))
+        self.assertIn('bookchapter_book_start_page_uniq', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_books_of_user_by_created_at(self):
+        plan = self.explain(Book.objects.filter(user_id=self.user_id).order_by('-created_at'))
+        self.assertIn('book_user_created_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_books_by_title_substring(self):
+        # GIN поддерживает только bitmap-просмотр, поэтому здесь отключаем лишь полный просмотр таблицы
+        require_index(self, 'book_title_trgm_idx')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Book.objects.filter(title__icontains='ниг').explain()
+        self.assertIn('book_title_trgm_idx', plan)
+
+
+class BookChapterApiTests(ApiTestCase):
+    """
+    Изменение глав через API.
+    """
+
+    def test_chapter_cannot_be_moved_to_another_book(self):
+        book = create_book(user_id=self.user_id)
+        other_book = create_book(user_id=self.user_id)
+        chapter = create_chapter(book, 1, 2)
+        create_chapter(other_book, 1, 2)
+
+        response = self.client.patch(f'/chapters/{chapter.id}/', {'book': str(other_book.id)}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('book', response.data)
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.book_id, book.id)
+        self.assertEqual(set(chapter.pages.values_list('book_id', flat=True)), {book.id})
+
+    def test_chapter_title_update_keeps_book(self):
+        book = create_book(user_id=self.user_id)
+        chapter = create_chapter(book, 1, 2)
+
+        response = self.client.patch(
+            f'/chapters/{chapter.id}/', {'book': str(book.id), 'chapter_title': 'Пролог'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        chapter.refresh_from_db()
+        self.assertEqual(chapter.chapter_title, 'Пролог')
+
+
+class RenumberBookTests(TestCase):
+    """
+    Перенумерация глав и страниц книги после удаления глав (renumber_book).
+    """
+
+    def assert_constraints_hold(self):
+        # Уникальность номеров проверяется отложенно — проверяем её сейчас, не дожидаясь конца транзакции
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    def test_renumber_after_deleting_middle_chapter(self):
+        book = create_book(total_chapters=4, total_pages=8)
+        first = create_chapter(book, 1, 3)
+        middle = create_chapter(book, 4, 2)
+        empty = create_chapter(book, 0, 0)
+        last = create_chapter(book, 6, 3)
+        last_pages = list(last.pages.order_by('page_number').values_list('id', flat=True))
+        middle.delete()
+
+        self.assertEqual(renumber_book(book.id), (3, 6))
+        self.assert_constraints_hold()
+
+        ranges = {
+            chapter.id: (chapter.start_page_number, chapter.end_page_number)
+            for chapter in BookChapter.objects.filter(book=book)
+        }
+        self.assertEqual(ranges, {first.id: (1, 3), last.id: (4, 6), empty.id: (None, None)})
+        self.assertEqual(
+            list(Page.objects.filter(book=book).order_by('page_number').values_list('page_number', flat=True)),
+            [1, 2, 3, 4, 5, 6]
+        )
+        self.assertEqual(
+            list(last.pages.order_by('page_number').values_list('id', flat=True)), last_pages
+        )
+        self.assertEqual(
+            set(last.pages.values_list('page_number', flat=True)), {4, 5, 6}
+        )
+        book.refresh_from_db()
+        self.assertEqual((book.total_chapters, book.total_pages), (3, 6))
+
+    def test_renumber_is_noop_for_contiguous_book(self):
+        book = create_book()
+        create_chapter(book, 1, 2)
+        create_chapter(book, 3, 2)
+
+        self.assertEqual(renumber_book(book.id), (2, 4))
+        self.assertEqual(
+            list(BookChapter.objects.filter(book=book).order_by('start_page_number')
+                 .values_list('start_page_number', 'end_page_number')),
+            [(1, 2), (3, 4)]
+        )
+
+
+class MoveChapterTests(TestCase):
+    """
+    Перенос главы вместе со страницами (move_chapter).
+    """
+
+    def setUp(self):
+        self.book = create_book(total_chapters=4, total_pages=9)
+        self.first = create_chapter(self.book, 1, 2)
+        self.second = create_chapter(self.book, 3, 3)
+        self.third = create_chapter(self.book, 6, 1)
+        self.fourth = create_chapter(self.book, 7, 3)
+
+    def assert_layout(self, *chapters):
+        """
+        Проверяет, что главы идут в порядке chapters подряд с первой страницы, а страницы каждой главы
+        занимают её диапазон в прежнем порядке.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        start = 1
+        for chapter in chapters:
+            chapter.refresh_from_db()
+            size = chapter.pages.count()
+            self.assertEqual((chapter.start_page_number, chapter.end_page_number), (start, start + size - 1))
+            self.assertEqual(
+                list(chapter.pages.order_by('page_number').values_list('page_number', 'content')),
+                [(start + offset, f'Страница {offset + 1}') for offset in range(size)]
+            )
+            start += size
+
+    def assert_version(self, version):
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.content_version, version)
+
+    def test_move_forward(self):
+        move_chapter(self.first, self.fourth)
+        self.assert_layout(self.second, self.third, self.first, self.fourth)
+        self.assert_version(2)
+
+    def test_move_backward(self):
+        move_chapter(self.fourth, self.second)
+        self.assert_layout(self.first, self.fourth, self.second, self.third)
+        self.assert_version(2)
+
+    def test_move_to_end(self):
+        move_chapter(self.second)
+        self.assert_layout(self.first, self.third, self.fourth, self.second)
+        self.assert_version(2)
+
+    def test_move_in_place_is_noop(self):
+        move_chapter(self.second, self.third)
+        move_chapter(self.fourth)
+        self.assert_layout(self.first, self.second, self.third, self.fourth)
+        self.assert_version(1)
+
+
+class BookApiQueryCountTests(ApiTestCase):
+    """
+    Количество SQL-запросов списка и детального представления книг не зависит от числа книг, жанров и глав.
+    """
+
+    def setUp(self):
+        super().setUp()
+        genres = Genre.objects.bulk_create(Genre(name=f'Жанр {number}') for number in range(2))
+        self.books = [create_book(user_id=self.user_id, title=f'Книга {number}') for number in range(24)]
+        BookGenre.objects.bulk_create(BookGenre(book=book, genre=genre) for book in self.books for genre in genres)
+        for book in self.books[:2]:
+            create_chapter(book, 3, 2)
+            create_chapter(book, 1, 2)
+
+    def test_list_query_count(self):
+        # count, книги страницы, жанры всех книг страницы
+        with self.assertNumQueries(3):
+            response = self.client.get('/books/', {'page_size': 24})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 24)
+        self.assertNotIn('chapters', response.data['results'][0])
+        self.assertEqual(len(response.data['results'][0]['genres']), 2)
+
+    def test_cursor_list_query_count(self):
+        # книги страницы, жанры всех книг страницы (без count)
+        with self.assertNumQueries(2):
+            response = self.client.get('/books/', {'pagination': 'cursor', 'page_size': 24})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 24)
+
+    def test_retrieve_query_count(self):
+        book = self.books[0]
+        # книга, жанры, главы
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/books/{book.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(response.data['genres']), 2)
+        self.assertEqual([chapter['start_page_number'] for chapter in response.data['chapters']], [1, 3])
+        # Главы берутся из prefetch (_prefetched_objects_cache), get_chapters не делает отдельного запроса
+        chapter_table = BookChapter._meta.db_table
+        chapter_queries = [query['sql'] for query in queries if f'FROM "{chapter_table}"' in query['sql']]
+        self.assertEqual(len(chapter_queries), 1)
+        self.assertIn(' IN (', chapter_queries[0])
+
+
+class BookAdminTests(TestCase):
+    """
+    Изменение глав через инлайн BookAdmin меняет версию содержимого книги.
+    """
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.book = create_book(title='Книга')
+        self.chapter = create_chapter(self.book, 1, 2, chapter_title='Первая')
+
+    def post_change_form(self, **chapter_data):
+        data = {
+            'title': self.book.title,
+            'language': self.book.language,
+            'bookgenre_set-TOTAL_FORMS': 0,
+            'bookgenre_set-INITIAL_FORMS': 0,
+            'chapters-TOTAL_FORMS': 1,
+            'chapters-INITIAL_FORMS': 1,
+            'chapters-0-id': self.chapter.id,
+            'chapters-0-book': self.book.id,
+            'chapters-0-chapter_title': self.chapter.chapter_title,
+            'chapters-0-start_page_number': 1,
+            'chapters-0-end_page_number': 2,
+        }
+        data.update({f'chapters-0-{name}': value for name, value in chapter_data.items()})
+        response = self.client.post(f'/admin/book_service/book/{self.book.id}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        self.book.refresh_from_db()
+
+    def test_book_fields_change_keeps_version(self):
+        self.post_change_form()
+        self.assertEqual(self.book.content_version, 1)
+
+    def test_inline_chapter_change_bumps_version(self):
+        self.post_change_form(chapter_title='Пролог')
+        self.assertEqual(self.book.content_version, 2)
+
+    def test_inline_chapter_delete_bumps_version(self):
+        self.post_change_form(DELETE='on')
+        self.assertEqual(self.book.content_version, 2)
+        self.assertFalse(BookChapter.objects.filter(id=self.chapter.id).exists())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-cache-tests'}},
+    BOOK_PAGE_CACHE_ALIAS='default'
+)
+class PageCacheTests(ApiTestCase):
+    """
+    Read-through кэш страниц (get_page_payload, cached_page_response) и его счётчики.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_book(user_id=self.user_id)
+        self.chapter = create_chapter(self.book, 1, 1)
+        self.cache = page_cache.get_page_cache()
+        self.cache.clear()
+
+    def get_payload(self):
+        return page_cache.get_page_payload(
+            self.book.id, self.book.content_version, 1, lambda: Page.objects.get(book=self.book, page_number=1)
+        )
+
+    def test_second_read_is_hit(self):
+        self.assertEqual(self.get_payload()[1], 'MISS')
+        with self.assertNumQueries(0):
+            payload, cache_status = self.get_payload()
+        self.assertEqual(cache_status, 'HIT')
+        self.assertEqual(payload['content'], 'Страница 1')
+        self.assertEqual(page_cache.get_page_cache_stats()['hits'], 1)
+        self.assertEqual(page_cache.get_page_cache_stats()['misses'], 1)
+
+    def test_evicted_counter_is_recreated(self):
+        self.get_payload()
+        self.cache.delete(page_cache.PAGE_CACHE_STATS_KEYS['hits'])
+        self.cache.delete(page_cache.PAGE_CACHE_STATS_KEYS['misses'])
+
+        self.assertEqual(self.get_payload()[1], 'HIT')
+        self.assertEqual(page_cache.get_page_cache_stats()['hits'], 1)
+
+    def test_counter_errors_do_not_break_reads(self):
+        with mock.patch.object(self.cache, 'incr', side_effect=ConnectionError), \
+                self.assertLogs('book_service.services.page_cache', 'WARNING'):
+            payload, cache_status = self.get_payload()
+        self.assertEqual(cache_status, 'MISS')
+        self.assertEqual(payload['page_number'], 1)
+
+    def test_page_endpoints_report_cache_status(self):
+        response = self.client.get(f'/books/{self.book.id}/pages/1/')
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+        response = self.client.get('/pages/get_page_by_number/', {'chapter_id': self.chapter.id, 'page_number': 1})
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'HIT'))
+        response = self.client.get(f'/books/{self.book.id}/pages/2/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BOOK_PAGE_CACHE_ALIAS='')
+class ConditionalGetTests(ApiTestCase):
+    """
+    Условный GET для страниц книги (conditional_content_response): ETag по версии содержимого и 304.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_book(user_id=self.user_id)
+        self.chapter = create_chapter(self.book, 1, 2)
+        self.url = f'/books/{self.book.id}/pages/1/'
+
+    def test_response_has_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.book.id}-1"')
+        self.assertIn('Last-Modified', response)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_if_none_match_returns_304_without_loading_page(self):
+        etag = self.client.get(self.url)['ETag']
+        # Только версия содержимого книги, страница не читается
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_chapter_pages_return_304(self):
+        url = '/chapters/get_chapter_pages/'
+        etag = self.client.get(url, {'chapter_id': self.chapter.id})['ETag']
+        # глава с версией содержимого книги
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'chapter_id': self.chapter.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_after_content_change(self):
+        etag = self.client.get(self.url)['ETag']
+        mark_book_content_changed(self.book.id)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['ETag'], f'"{self.book.id}-2"')
+        self.assertEqual(response.data['content'], 'Страница 1')
+
+
+class SearchTests(ApiTestCase):
+    """
+    Полнотекстовый поиск по страницам: по всем книгам пользователя (books/search/) и внутри книги.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.english = create_book(user_id=self.user_id, title='English', language='en-US')
+        self.russian = create_book(user_id=self.user_id, title='Русская', language='ru')
+        self.other = create_book(title='Чужая', language='en')
+        self.add_pages(self.english, [
+            'The quick brown fox jumps over the lazy dog.',
+            'Cats are running. Cats are sleeping. Cats everywhere, a cat on every roof.',
+            'A cat and a dog were friends.',
+        ])
+        self.add_pages(self.russian, ['Кошки бегали по крышам всю ночь.', 'Собака спала у двери.'])
+        self.add_pages(self.other, ['Secret cats of another reader.'])
+
+    def add_pages(self, book, texts):
+        chapter = BookChapter.objects.create(book=book, start_page_number=1, end_page_number=len(texts))
+        for number, text in enumerate(texts, start=1):
+            page = Page(book=book, chapter=chapter, page_number=number)
+            page.set_content(text, language=book.language)
+            page.save()
+
+    def search(self, q, book=None, **params):
+        url = f'/books/{book.id}/search/' if book else '/books/search/'
+        response = self.client.get(url, {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_results_are_ranked(self):
+        results = self.search('cat')
+        self.assertEqual([(result['book_id'], result['page_number']) for result in results],
+                         [(self.english.id, 2), (self.english.id, 3)])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_language_config_of_each_book(self):
+        # english и russian приводят слова к основе: cats -> cat, кошки -> кошк
+        self.assertEqual([result['book_id'] for result in self.search('кошка')], [self.russian.id])
+        self.assertEqual([result['page_number'] for result in self.search('running')], [2])
+        self.assertEqual([(result['book_id'], result['page_number']) for result in self.search('собаки')],
+                         [(self.russian.id, 2)])
+        self.assertEqual([result['page_number'] for result in self.search('dogs', book=self.english)], [1, 3])
+
+    def test_simple_config_for_unknown_language(self):
+        book = create_book(user_id=self.user_id, language='xx')
+        self.add_pages(book, ['Cats sleeping'])
+        self.assertEqual(search_book(book, 'cat'), [])
+        self.assertEqual(len(search_book(book, 'cats')), 1)
+
+    def test_snippet_highlights_matches(self):
+        result = self.search('fox', book=self.english)[0]
+        self.assertIn('<mark>fox</mark>', result['snippet'])
+        self.assertEqual(result['chapter_id'], Page.objects.get(book=self.english, page_number=1).chapter_id)
+
+    def test_websearch_syntax(self):
+        self.assertEqual([result['page_number'] for result in self.search('"quick brown"')], [1])
+        self.assertEqual(self.search('"brown quick"'), [])
+        self.assertEqual([result['page_number'] for result in self.search('cat -dog')], [2])
+        self.assertEqual(
+            sorted(result['page_number'] for result in self.search('fox or roof', book=self.english)), [1, 2]
+        )
+
+    def test_limit(self):
+        self.assertEqual(len(self.search('cat', limit=1)), 1)
+
+    def test_other_users_books_are_not_searched(self):
+        self.assertNotIn(self.other.id, [result['book_id'] for result in self.search('secret')])
+        response = self.client.get(f'/books/{self.other.id}/search/', {'q': 'cats'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_params(self):
+        for params in ({}, {'q': '   '}, {'q': 'cat\x00'}, {'q': 'cat ' * 100}, {'q': 'cat', 'limit': 'many'}):
+            for url in ('/books/search/', f'/books/{self.english.id}/search/'):
+                with self.subTest(url=url, params=params):
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', response.data)
+
+
+class StreamingExportTests(ApiTestCase):
+    """
+    Потоковые ответы (StreamingHttpResponse): экспорт книги и страницы главы с ?stream=1.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_book(user_id=self.user_id, total_chapters=2, total_pages=5)
+        self.chapters = [create_chapter(self.book, 1, 3), create_chapter(self.book, 4, 2)]
+
+    def read_stream(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        return json.loads(''.join(chunks)), len(chunks)
+
+    def expected_pages(self, pages):
+        return json.loads(json.dumps(PageSerializer(pages.order_by('page_number'), many=True).data, default=str))
+
+    def test_export_matches_non_streamed_payload(self):
+        detail = self.client.get(f'/books/{self.book.id}/').json()
+
+        response = self.client.get(f'/books/{self.book.id}/export/')
+        data, _ = self.read_stream(response)
+
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{self.book.id}.json"')
+        self.assertEqual(data['book'], detail)
+        self.assertEqual(data['pages'], self.expected_pages(Page.objects.filter(book=self.book)))
+        self.assertEqual([page['page_number'] for page in data['pages']], [1, 2, 3, 4, 5])
+
+    def test_export_of_book_without_chapters(self):
+        book = create_book(user_id=self.user_id)
+
+        data, _ = self.read_stream(self.client.get(f'/books/{book.id}/export/'))
+
+        self.assertEqual(data['pages'], [])
+        self.assertEqual(data['book']['chapters'], [])
+        self.assertEqual(data['book']['id'], str(book.id))
+
+    def test_small_buffer_splits_stream(self):
+        with mock.patch('book_service.services.streaming.STREAM_BUFFER_SIZE', 10):
+            data, chunk_count = self.read_stream(self.client.get(f'/books/{self.book.id}/export/'))
+        self.assertGreater(chunk_count, 5)
+        self.assertEqual(len(data['pages']), 5)
+
+    def test_chapter_pages_stream_matches_regular_response(self):
+        url = '/chapters/get_chapter_pages/'
+        for chapter in self.chapters + [create_chapter(self.book, 0, 0)]:
+            with self.subTest(chapter=chapter.id):
+                regular = self.client.get(url, {'chapter_id': chapter.id}).json()
+                streamed, _ = self.read_stream(self.client.get(url, {'chapter_id': chapter.id, 'stream': '1'}))
+                self.assertEqual(streamed, regular)
+                self.assertEqual(streamed, self.expected_pages(chapter.pages.all()))
+
+
+@override_settings(BOOK_PAGE_WINDOW_MAX_RADIUS=3)
+class PageWindowTests(ApiTestCase):
+    """
+    Окно страниц вокруг текущей (books/{id}/page_window/).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_book(user_id=self.user_id)
+        create_chapter(self.book, 1, 4)
+        create_chapter(self.book, 5, 6)
+        self.url = f'/books/{self.book.id}/page_window/'
+
+    def window(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_window_around_page(self):
+        data = self.window(page_number=5, radius=1)
+        self.assertEqual([page['page_number'] for page in data['pages']], [4, 5, 6])
+        self.assertEqual((data['page_number'], data['radius']), (5, 1))
+        self.assertEqual(data['pages'][1]['content'], 'Страница 1')
+
+    def test_radius_is_clamped(self):
+        data = self.window(page_number=5, radius=100)
+        self.assertEqual(data['radius'], 3)
+        self.assertEqual([page['page_number'] for page in data['pages']], [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(self.window(page_number=5, radius=0)['pages'][0]['page_number'], 5)
+
+    def test_window_is_trimmed_at_book_edges(self):
+        self.assertEqual([page['page_number'] for page in self.window(page_number=1, radius=2)['pages']], [1, 2, 3])
+        self.assertEqual([page['page_number'] for page in self.window(page_number=10, radius=2)['pages']], [8, 9, 10])
+
+    def test_neighbour_fields_projection(self):
+        # книга, окно страниц без текста, текст текущей страницы
+        with self.assertNumQueries(3):
+            data = self.window(page_number=5, radius=1, neighbour_fields='id, page_number')
+        previous, current, following = data['pages']
+        self.assertEqual(set(previous), {'id', 'page_number'})
+        self.assertEqual(set(following), {'id', 'page_number'})
+        self.assertEqual(set(current), set(PageSerializer.Meta.fields))
+        self.assertEqual(current['content'], 'Страница 1')
+
+    def test_errors(self):
+        missing = self.client.get(self.url, {'page_number': 11})
+        self.assertEqual(missing.status_code, 404)
+        other_book = create_book()
+        create_chapter(other_book, 1, 1)
+        self.assertEqual(self.client.get(f'/books/{other_book.id}/page_window/', {'page_number': 1}).status_code, 404)
+        for params in ({}, {'page_number': 'x'}, {'page_number': 1, 'radius': -1},
+                       {'page_number': 1, 'neighbour_fields': 'id,secret'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class MergeSplitChapterTests(ApiTestCase):
+    """
+    Объединение соседних глав и разделение главы через API (merge_chapters, split_chapter).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.book = create_book(user_id=self.user_id, total_chapters=3, total_pages=7)
+        self.first = create_chapter(self.book, 1, 2, chapter_title='Первая')
+        self.second = create_chapter(self.book, 3, 3, chapter_title='Вторая')
+        self.third = create_chapter(self.book, 6, 2, chapter_title='Третья')
+
+    def assert_book(self, total_chapters, content_version):
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_chapters, self.book.content_version), (total_chapters, content_version))
+        # Номера страниц не меняются
+        self.assertEqual(list(Page.objects.filter(book=self.book).order_by('page_number')
+                              .values_list('page_number', flat=True)), list(range(1, 8)))
+
+    def page_numbers(self, chapter):
+        return list(chapter.pages.order_by('page_number').values_list('page_number', flat=True))
+
+    def test_merge_with_next_and_previous_chapter(self):
+        response = self.client.post(f'/chapters/{self.second.id}/merge/', {'chapter_id': str(self.first.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['start_page_number'], response.data['end_page_number']),
+                         (str(self.first.id), 1, 5))
+        self.assertFalse(BookChapter.objects.filter(id=self.second.id).exists())
+        self.assertEqual(self.page_numbers(self.first), [1, 2, 3, 4, 5])
+        self.assert_book(total_chapters=2, content_version=2)
+
+        response = self.client.post(f'/chapters/{self.first.id}/merge/', {'chapter_id': str(self.third.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.page_numbers(self.first), list(range(1, 8)))
+        self.assert_book(total_chapters=1, content_version=3)
+
+    def test_merge_rejects_non_adjacent_chapters(self):
+        response = self.client.post(f'/chapters/{self.first.id}/merge/', {'chapter_id': str(self.third.id)})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+        self.assertEqual(self.page_numbers(self.first), [1, 2])
+        self.assert_book(total_chapters=3, content_version=1)
+
+    def test_merge_rejects_other_book_and_missing_chapter(self):
+        other_book = create_book(user_id=self.user_id)
+        other_chapter = create_chapter(other_book, 1, 1)
+        response = self.client.post(f'/chapters/{self.first.id}/merge/', {'chapter_id': str(other_chapter.id)})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'/chapters/{self.first.id}/merge/', {'chapter_id': str(uuid.uuid4())})
+        self.assertEqual(response.status_code, 404)
+
+    def test_split(self):
+        response = self.client.post(f'/chapters/{self.second.id}/split/', {'page_number': 4, 'chapter_title': 'Часть'})
+
+        self.assertEqual(response.status_code, 201)
+        original, new = response.data
+        self.assertEqual((original['start_page_number'], original['end_page_number']), (3, 3))
+        self.assertEqual((new['start_page_number'], new['end_page_number'], new['chapter_title']), (4, 5, 'Часть'))
+        self.assertEqual(self.page_numbers(self.second), [3])
+        self.assertEqual(self.page_numbers(BookChapter.objects.get(id=new['id'])), [4, 5])
+        self.assert_book(total_chapters=4, content_version=2)
+
+    def test_split_point_out_of_range(self):
+        # Первая страница главы, страница за пределами главы, не число
+        for page_number in (3, 6, 0, 'x'):
+            with self.subTest(page_number=page_number):
+                response = self.client.post(f'/chapters/{self.second.id}/split/', {'page_number': page_number})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.page_numbers(self.second), [3, 4, 5])
+        self.assert_book(total_chapters=3, content_version=1)
@@ -1,6 +1,6 @@
 from rest_framework import routers
 from django.urls import path, include
-from .views import BookViewSet, BookChapterViewSet, GenreViewSet, PageViewSet
+from .views import BookViewSet, BookChapterViewSet, GenreViewSet, PageViewSet, IngestionJobViewSet
 
 # Routers
 router = routers.DefaultRouter()
@@ -8,6 +8,7 @@ router.register(r'books', BookViewSet, basename='book')
 router.register(r'chapters', BookChapterViewSet, basename='chapters')
 router.register(r'genres', GenreViewSet, basename='genres')
 router.register(r'pages', PageViewSet, basename='pages')
+router.register(r'ingestion_jobs', IngestionJobViewSet, basename='ingestion_jobs')
 
 # URLs
 urlpatterns = [
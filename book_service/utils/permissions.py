@@ -1,11 +1,11 @@
 from rest_framework import permissions
-from book_service.models import Book, BookChapter
+from book_service.models import Book, BookChapter, IngestionJob
 
 
 class IsOwner(permissions.BasePermission):
     """
     Разрешает доступ только владельцам объекта.
-    Поддерживаются модели Book и BookChapter.
+    Поддерживаются модели Book, BookChapter и IngestionJob.
     """
 
     def has_object_permission(self, request, view, obj):
@@ -13,4 +13,6 @@ class IsOwner(permissions.BasePermission):
             return str(obj.user_id) == str(request.user.id)
         elif isinstance(obj, BookChapter):
             return str(obj.book.user_id) == str(request.user.id)
+        elif isinstance(obj, IngestionJob):
+            return str(obj.user_id) == str(request.user.id)
         return False
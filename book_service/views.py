@@ -1,45 +1,67 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Prefetch
 from django.core.files.storage import default_storage
-from django.db.models import Count
 from rest_framework.response import Response
 from rest_framework import status
 
 from book_service.filters import BookFilter
-from book_service.models import Book, Genre, BookChapter, Page
-from book_service.pagination import BookPagination
-from book_service.serializers import BookSerializer, GenreSerializer, BookChapterSerializer, PageSerializer
+from book_service.models import Book, Genre, BookChapter, Page, IngestionJob
+from book_api.pagination import CursorPaginationMixin
+from book_service.pagination import BookCursorPagination, BookPagination
+from book_service.serializers import BookSerializer, BookListSerializer, GenreSerializer, BookChapterSerializer, PageSerializer, \
+    IngestionJobSerializer
 from rest_framework.decorators import action
 from rest_framework import viewsets, permissions
 from book_service.services.book_processing import process_uploaded_book
+from book_service.services.chapter_operations import ChapterOperationError, merge_chapters, move_chapter, \
+    renumber_book, split_chapter
+from book_service.services.content_version import mark_book_content_changed
+from book_service.services.http_cache import conditional_content_response
+from book_service.services.page_cache import cached_page_response, get_page_cache_stats
+from book_service.services.search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, SEARCH_MAX_QUERY_LENGTH, search_book, \
+    search_library
+from book_service.services.streaming import stream_book_export_response, stream_pages_response
 
 from .utils.permissions import IsOwner
 
 
 # TODO isAuth, isOwner... доделать для остальных действий, изменение, удаление и т.д.
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с книгами (Book).
     - Позволяет просматривать, создавать, редактировать и удалять книги.
     - Подключён кастомный фильтр BookFilter для поиска по названию и жанрам.
-    - Имеет отдельный метод «upload_book», который обрабатывает загружаемую книгу.
+    - Имеет отдельный метод «upload_book», который принимает книгу и ставит её в очередь на фоновую обработку.
+    - Список поддерживает курсорную пагинацию: ?pagination=cursor (см. BookCursorPagination).
     """
-    queryset = Book.objects.all().order_by('-created_at').prefetch_related(
-        'bookgenre_set__genre',
-        'chapters'
-    )
+    queryset = Book.objects.all().order_by('-created_at')
     serializer_class = BookSerializer
     pagination_class = BookPagination
+    cursor_pagination_class = BookCursorPagination
     filterset_class = BookFilter
     permission_classes = [permissions.IsAuthenticated, IsOwner]
 
     def get_queryset(self):
         """
         Возвращает только те книги, которые принадлежат текущему пользователю.
+        Жанры загружаются одним запросом на всю страницу списка; главы (уже упорядоченные) —
+        только для детального представления и экспорта, в списке их нет (BookListSerializer).
         """
-        return Book.objects.filter(user_id=self.request.user.id).order_by('-created_at').prefetch_related(
-            'bookgenre_set__genre',
-            'chapters'
-        )
+        queryset = Book.objects.filter(user_id=self.request.user.id).order_by('-created_at')
+        if self.action in ('list', 'retrieve', 'export'):
+            queryset = queryset.prefetch_related('genres')
+        if self.action in ('retrieve', 'export'):
+            queryset = queryset.prefetch_related(
+                Prefetch('chapters', queryset=BookChapter.objects.order_by('start_page_number'))
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return BookListSerializer
+        return super().get_serializer_class()
 
     """
     Больше не получаем user_id из request.data, а берем ид юзера из самого токена.
@@ -53,6 +75,154 @@ class BookViewSet(viewsets.ModelViewSet):
         response = process_uploaded_book(request)
         return response
 
+    @action(detail=True, methods=['get'], url_path=r'pages/(?P<page_number>\d+)')
+    def page_by_number(self, request, pk=None, page_number=None):
+        """
+        Возвращает страницу книги по сквозному номеру (books/{id}/pages/{n}) без chapter_id:
+        запрос по индексу (book, page_number) после проверки владельца книги.
+        Поддерживает условный GET: при совпадении ETag страница не читается из базы (304).
+        Готовые ответы кэшируются по версии содержимого книги (см. services/page_cache.py).
+        """
+        book = self._get_content_book(pk)
+        if book is None:
+            return Response({'error': 'Страница не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+        return conditional_content_response(
+            request, book.id, book.content_version, book.updated_at,
+            lambda: cached_page_response(book, int(page_number))
+        )
+
+    @action(detail=True, methods=['get'], url_path='page_window')
+    def page_window(self, request, pk=None):
+        """
+        Возвращает окно страниц книги [n - radius, n + radius] одним диапазонным запросом по индексу (book, page_number),
+        чтобы читалка могла подгружать соседние страницы заранее.
+
+        Параметры запроса:
+          - page_number: номер центральной страницы (обязательный);
+          - radius: количество страниц с каждой стороны (по умолчанию 2, не больше BOOK_PAGE_WINDOW_MAX_RADIUS);
+          - neighbour_fields: поля соседних страниц через запятую (например, id,page_number,chapter —
+            без текста). Центральная страница всегда возвращается целиком.
+        Поддерживает условный GET (ETag по версии содержимого книги).
+        """
+        try:
+            page_number = int(request.query_params['page_number'])
+            radius = int(request.query_params.get('radius', 2))
+        except KeyError:
+            return Response({'error': 'Необходимо указать page_number'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'page_number и radius должны быть целыми числами'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if radius < 0:
+            return Response({'error': 'radius не может быть отрицательным'}, status=status.HTTP_400_BAD_REQUEST)
+        radius = min(radius, settings.BOOK_PAGE_WINDOW_MAX_RADIUS)
+
+        page_fields = PageSerializer.Meta.fields
+        neighbour_fields = page_fields
+        if request.query_params.get('neighbour_fields'):
+            neighbour_fields = [name.strip() for name in request.query_params['neighbour_fields'].split(',')]
+            unknown_fields = set(neighbour_fields) - set(page_fields)
+            if unknown_fields:
+                return Response({'error': f"Неизвестные поля: {', '.join(sorted(unknown_fields))}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        book = self._get_content_book(pk)
+        if book is None:
+            return Response({'error': 'Страница не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+        def build_response():
+            pages = Page.objects.filter(
+                book_id=book.id,
+                page_number__range=(page_number - radius, page_number + radius)
+            ).order_by('page_number')
+            if 'content' not in neighbour_fields:
+                # Текст соседних страниц не читаем; у центральной страницы он загружается отдельно
+                pages = pages.defer('content', 'content_compressed')
+            pages = list(pages)
+
+            current_page = next((page for page in pages if page.page_number == page_number), None)
+            if current_page is None:
+                return Response({'error': 'Страница не найдена'}, status=status.HTTP_404_NOT_FOUND)
+            if 'content' not in neighbour_fields:
+                current_page.refresh_from_db(fields=['content', 'content_compressed'])
+
+            page_serializer = PageSerializer()
+            neighbour_serializer = PageSerializer(fields=neighbour_fields)
+            data = [
+                (page_serializer if page is current_page else neighbour_serializer).to_representation(page)
+                for page in pages
+            ]
+            return Response({
+                'page_number': page_number,
+                'radius': radius,
+                'pages': data
+            }, status=status.HTTP_200_OK)
+
+        return conditional_content_response(request, book.id, book.content_version, book.updated_at, build_response)
+
+    def _get_content_book(self, pk):
+        """
+        Возвращает книгу текущего пользователя только с полями для условного GET (версия содержимого, updated_at)
+        или None, если книга не найдена.
+        """
+        try:
+            return Book.objects.only('id', 'content_version', 'updated_at').get(id=pk, user_id=self.request.user.id)
+        except (Book.DoesNotExist, ValueError, ValidationError):
+            return None
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search_library(self, request):
+        """
+        Полнотекстовый поиск по страницам всех книг пользователя (books/search/?q=...&limit=...).
+        Возвращает найденные страницы по убыванию релевантности: номер страницы, глава, книга
+        и фрагмент текста с подсветкой найденных слов.
+        """
+        query_text, limit, error = self._search_params(request)
+        if error:
+            return error
+        results = search_library(request.user.id, query_text, limit)
+        return Response({'query': query_text, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='search')
+    def search_book(self, request, pk=None):
+        """
+        Полнотекстовый поиск внутри одной книги (books/{id}/search/?q=...&limit=...).
+        """
+        query_text, limit, error = self._search_params(request)
+        if error:
+            return error
+        results = search_book(self.get_object(), query_text, limit)
+        return Response({'query': query_text, 'results': results}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _search_params(request):
+        query_text = request.query_params.get('q', '').strip()
+        if not query_text:
+            return None, None, Response({'error': 'Необходимо указать q'}, status=status.HTTP_400_BAD_REQUEST)
+        # Символ NUL не принимается PostgreSQL в строках, слишком длинный запрос не нужен для поиска по страницам
+        if '\x00' in query_text or len(query_text) > SEARCH_MAX_QUERY_LENGTH:
+            return None, None, Response(
+                {'error': f'q должен быть строкой не длиннее {SEARCH_MAX_QUERY_LENGTH} символов без символа NUL'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return None, None, Response({'error': 'limit должен быть целым числом'},
+                                        status=status.HTTP_400_BAD_REQUEST)
+        return query_text, max(1, min(limit, SEARCH_MAX_LIMIT)), None
+
+    @action(detail=True, methods=['get'], url_path='export')
+    def export(self, request, pk=None):
+        """
+        Экспорт книги целиком в JSON ({"book": {...}, "pages": [...]}) потоковым ответом:
+        страницы читаются из базы порциями и отправляются клиенту по мере кодирования.
+        """
+        book = self.get_object()
+        book_data = self.get_serializer(book).data
+        pages = Page.objects.filter(book=book).order_by('page_number')
+        return stream_book_export_response(book_data, pages, filename=f'{book.id}.json')
+
     def perform_destroy(self, instance):
         if instance.cover_image and default_storage.exists(instance.cover_image.path):
             try:
@@ -65,7 +235,8 @@ class BookViewSet(viewsets.ModelViewSet):
 class BookChapterViewSet(viewsets.ModelViewSet):
     """
     ViewSet для работы с главами книги (BookChapter).
-    Позволяет просматривать, создавать, редактировать и удалять главы.
+    Позволяет просматривать, создавать, редактировать и удалять главы,
+    а также объединять соседние главы (merge), разделять главу (split) и переносить её (move).
     Пользователь может видеть и управлять только своими главами.
     """
     serializer_class = BookChapterSerializer
@@ -75,8 +246,21 @@ class BookChapterViewSet(viewsets.ModelViewSet):
         """
         Возвращает только те главы, которые принадлежат книгам текущего пользователя.
         """
-        return BookChapter.objects.filter(book__user_id=self.request.user.id).order_by(
-            'start_page_number').prefetch_related('pages')
+        return BookChapter.objects.filter(book__user_id=self.request.user.id).order_by('start_page_number')
+
+    # Любое изменение глав и страниц увеличивает версию содержимого книги (ETag) и сбрасывает её хэш
+    def perform_create(self, serializer):
+        chapter = serializer.save()
+        mark_book_content_changed(chapter.book_id)
+
+    def perform_update(self, serializer):
+        chapter = serializer.save()
+        mark_book_content_changed(chapter.book_id)
+
+    def perform_destroy(self, instance):
+        book_id = instance.book_id
+        instance.delete()
+        mark_book_content_changed(book_id)
 
     @action(detail=False, methods=['get'], url_path='get_chapter_pages')
     def get_chapter_pages(self, request):
@@ -85,21 +269,99 @@ class BookChapterViewSet(viewsets.ModelViewSet):
         if not chapter_id:
             return Response({'error': 'Необходимо указать chapter_id'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            chapter = self.get_queryset().get(id=chapter_id)
+            chapter = self.get_queryset().select_related('book').get(id=chapter_id)
         except BookChapter.DoesNotExist:
             return Response({'error': 'Глава не найдена'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        pages = chapter.pages.all().order_by('page_number')
-        serializer = PageSerializer(pages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build_response():
+            pages = chapter.pages.all().order_by('page_number')
+            if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+                # Страницы кодируются и отправляются по мере чтения из базы, без сборки всего ответа в памяти
+                return stream_pages_response(pages)
+
+            serializer = PageSerializer(pages, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        # При совпадении ETag (версии содержимого книги) страницы главы не читаются из базы — ответ 304
+        book = chapter.book
+        return conditional_content_response(request, book.id, book.content_version, book.updated_at, build_response)
+
+    def _get_related_chapter(self, chapter_id):
+        """
+        Возвращает главу пользователя по ID из тела запроса или None, если она не найдена.
+        """
+        try:
+            return self.get_queryset().get(id=chapter_id)
+        except (BookChapter.DoesNotExist, ValueError, ValidationError):
+            return None
+
+    @action(detail=True, methods=['post'], url_path='merge')
+    def merge(self, request, pk=None):
+        """
+        Объединяет главу с соседней главой chapter_id (предыдущей или следующей).
+        Страницы не перенумеровываются — меняется только принадлежность страниц присоединяемой главы.
+        """
+        chapter = self.get_object()
+        other_chapter = self._get_related_chapter(request.data.get('chapter_id'))
+        if other_chapter is None:
+            return Response({'error': 'Глава chapter_id не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            merged_chapter = merge_chapters(chapter, other_chapter)
+        except ChapterOperationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(BookChapterSerializer(merged_chapter).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'], url_path='split')
+    def split(self, request, pk=None):
+        """
+        Разделяет главу: страницы начиная с page_number переходят в новую главу с заголовком chapter_title.
+        Страницы не перенумеровываются.
+        """
+        chapter = self.get_object()
+        try:
+            page_number = int(request.data.get('page_number'))
+        except (TypeError, ValueError):
+            return Response({'error': 'page_number должен быть целым числом'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chapter, new_chapter = split_chapter(chapter, page_number, request.data.get('chapter_title'))
+        except ChapterOperationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = BookChapterSerializer([chapter, new_chapter], many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='move')
+    def move(self, request, pk=None):
+        """
+        Переносит главу вместе со страницами перед главой before_chapter_id (или в конец книги, если он не указан).
+        Перенумеровываются только страницы и главы между старым и новым местом главы.
+        """
+        chapter = self.get_object()
+        before_chapter = None
+        before_chapter_id = request.data.get('before_chapter_id')
+        if before_chapter_id:
+            before_chapter = self._get_related_chapter(before_chapter_id)
+            if before_chapter is None:
+                return Response({'error': 'Глава before_chapter_id не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            chapter = move_chapter(chapter, before_chapter)
+        except ChapterOperationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(BookChapterSerializer(chapter).data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='bulk_delete')
     def bulk_delete(self, request):
         """
         Массовое удаление глав из книги. Удаление глав также удаляет связанные страницы.
-        После удаления необходимо обновить данные книги и глав, а также номера страниц.
+        После удаления оставшиеся главы и страницы перенумеровываются в базе данных (renumber_book),
+        без загрузки страниц в Python.
         """
         chapter_ids = request.data.get('chapter_ids', [])
 
@@ -131,47 +393,11 @@ class BookChapterViewSet(viewsets.ModelViewSet):
                 # Удаляем главы (и связанные страницы через on_delete=models.CASCADE)
                 chapters_to_delete.delete()
 
-                # Обновляем количество страниц в книге
-                book.total_pages -= total_deleted_pages
-
-                # Получаем оставшиеся главы, аннотированные количеством страниц, упорядоченные по start_page_number
-                remaining_chapters = BookChapter.objects.filter(book_id=book_id).annotate(
-                    page_count=Count('pages')
-                ).order_by('start_page_number')
-
-                # Подготовка данных для bulk_update глав
-                updated_chapters = []
-                current_page_number = 1  # Инициализируем для назначения номеров глав
-
-                for chapter in remaining_chapters:
-                    chapter.start_page_number = current_page_number
-                    chapter.end_page_number = current_page_number + chapter.page_count - 1
-                    updated_chapters.append(chapter)
-                    current_page_number += chapter.page_count
-
-                # Массовое обновление глав
-                BookChapter.objects.bulk_update(updated_chapters, ['start_page_number', 'end_page_number'])
-
-                # Сбросим current_page_number для назначения номеров страниц
-                current_page_number = 1
-
-                # Получаем все оставшиеся страницы, упорядоченные по новым номерам глав и старым номерам страниц
-                pages = Page.objects.filter(chapter__book_id=book_id).select_related('chapter').order_by(
-                    'chapter__start_page_number', 'page_number'
-                )
+                # Перенумеровываем оставшиеся главы и страницы и обновляем счётчики книги одним SQL-запросом
+                renumber_book(book.id)
 
-                # Подготовка данных для bulk_update страниц
-                updated_pages = []
-                for page in pages:
-                    page.page_number = current_page_number
-                    updated_pages.append(page)
-                    current_page_number += 1
-
-                # Массовое обновление страниц
-                Page.objects.bulk_update(updated_pages, ['page_number'])
-
-                # Сохраняем изменения в книге
-                book.save()
+                # Новая версия содержимого книги (ETag); изменённая книга больше не совпадает с исходным файлом
+                mark_book_content_changed(book.id)
 
                 return Response({'status': 'success', 'deleted_pages': total_deleted_pages}, status=status.HTTP_200_OK)
 
@@ -186,11 +412,26 @@ class PageViewSet(viewsets.ModelViewSet):
     """
     ViewSet для работы со страницами (Page).
     - Позволяет просматривать, создавать, редактировать и удалять страницы.
-    - Содержит метод «get_page_by_number» для получения конкретной страницы по номеру и ID главы.
+    - Содержит метод «get_page_by_number» для получения конкретной страницы по номеру и ID главы;
+      страницы отдаются через кэш страниц, счётчики кэша — в «cache_stats».
     """
     queryset = Page.objects.all()
     serializer_class = PageSerializer
 
+    # Любое изменение глав и страниц увеличивает версию содержимого книги (ETag) и сбрасывает её хэш
+    def perform_create(self, serializer):
+        page = serializer.save()
+        mark_book_content_changed(page.chapter.book_id)
+
+    def perform_update(self, serializer):
+        page = serializer.save()
+        mark_book_content_changed(page.chapter.book_id)
+
+    def perform_destroy(self, instance):
+        book_id = instance.chapter.book_id
+        instance.delete()
+        mark_book_content_changed(book_id)
+
     @action(detail=False, methods=['get'], url_path='get_page_by_number')
     def get_page_by_number(self, request):
         chapter_id = request.query_params.get('chapter_id')
@@ -200,14 +441,31 @@ class PageViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Необходимо указать chapter_id и page_number'},
                             status=status.HTTP_400_BAD_REQUEST)
         try:
-            page = Page.objects.get(chapter_id=chapter_id, page_number=page_number)
-        except Page.DoesNotExist:
+            page_number = int(page_number)
+        except ValueError:
+            return Response({'error': 'page_number должен быть целым числом'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Сначала читается только версия содержимого книги: при совпадении ETag страница не загружается (304)
+            chapter = BookChapter.objects.select_related('book').only(
+                'id', 'book__id', 'book__content_version', 'book__updated_at'
+            ).get(id=chapter_id)
+        except BookChapter.DoesNotExist:
             return Response({'error': 'Страница не найдена'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        serializer = PageSerializer(page)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        book = chapter.book
+        return conditional_content_response(
+            request, book.id, book.content_version, book.updated_at,
+            lambda: cached_page_response(book, page_number, chapter_id=chapter.id)
+        )
+
+    @action(detail=False, methods=['get'], url_path='cache_stats', permission_classes=[permissions.IsAuthenticated])
+    def cache_stats(self, request):
+        """
+        Счётчики кэша страниц (BOOK_PAGE_CACHE_ALIAS): попадания, промахи и доля попаданий.
+        """
+        return Response(get_page_cache_stats(), status=status.HTTP_200_OK)
 
 
 class GenreViewSet(viewsets.ModelViewSet):
@@ -218,3 +476,16 @@ class GenreViewSet(viewsets.ModelViewSet):
     """
     queryset = Genre.objects.all().order_by('name')
     serializer_class = GenreSerializer
+
+
+class IngestionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для просмотра задач фоновой обработки загруженных книг (IngestionJob).
+    Позволяет узнать статус обработки (queued/running/done/failed), количество глав и страниц.
+    Пользователь видит только свои задачи.
+    """
+    serializer_class = IngestionJobSerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+
+    def get_queryset(self):
+        return IngestionJob.objects.filter(user_id=self.request.user.id).order_by('-created_at')
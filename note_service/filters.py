@@ -1,3 +1,7 @@
+import operator
+from functools import reduce
+
+from django.db.models import Count, Q
 from django_filters import rest_framework as filters
 from .models import Note
 
@@ -6,42 +10,69 @@ class PartialTagFilter(filters.Filter):
     """
     Фильтр для частичного поиска по тегам.
 
-    Этот фильтр извлекает все значения параметра 'tags' из данных запроса и применяет фильтрацию к QuerySet.
-    Он проверяет наличие непустых значений в параметрах, а затем для каждого тега выполняет фильтрацию по подстроке
-    (case-insensitive) в поле tags__name.
+    Этот фильтр извлекает все значения параметра 'tags' из данных запроса и отбирает заметки, у которых есть теги,
+    содержащие эти значения как подстроку (без учёта регистра, tags__name__icontains).
+
+    Режим задаётся параметром 'tags_mode':
+      - all (по умолчанию) — для каждого значения у заметки должен найтись подходящий тег;
+      - any — достаточно подходящего тега хотя бы для одного значения.
 
     Как работает:
     1. Извлекается список значений параметра 'tags' с помощью self.parent.data.getlist('tags').
     2. Если список пуст или все значения состоят только из пробелов, фильтрация не применяется и возвращается
     исходный QuerySet.
-    3. Для каждого переданного тега:
-       - Значение очищается от лишних пробелов.
-       - QuerySet фильтруется с использованием метода filter(tags__name__icontains=tag),
-         что позволяет найти объекты, у которых имя тега содержит данное значение (без учёта регистра).
-    4. Итоговый отфильтрованный QuerySet возвращается.
+    3. Строится один подзапрос к промежуточной таблице заметка-тег: связи с тегами, подходящими хотя бы под одно
+       значение, группируются по заметке, и для режима all в HAVING проверяется, что каждому значению соответствует
+       хотя бы один тег заметки.
+    4. QuerySet фильтруется по id заметок из подзапроса (pk IN (...)), поэтому число JOIN не растёт
+       с количеством тегов в запросе, а заметки не дублируются.
 
     Пример использования:
-      Если в URL присутствует параметр tags, например:
-        ?tags=python,redux
-      Фильтр выполнит последовательное применение:
-        qs = qs.filter(tags__name__icontains='python').filter(tags__name__icontains='redux')
+      Если в URL присутствуют параметры ?tags=python&tags=redux, фильтр выполнит подзапрос вида:
+        SELECT note_id FROM note_tags JOIN tag ...
+        WHERE tag.name ILIKE '%python%' OR tag.name ILIKE '%redux%'
+        GROUP BY note_id
+        HAVING COUNT(*) FILTER (WHERE tag.name ILIKE '%python%') > 0
+           AND COUNT(*) FILTER (WHERE tag.name ILIKE '%redux%') > 0
     """
+    MODE_ALL = 'all'
+    MODE_ANY = 'any'
+
     def filter(self, qs, value):
         # Получаем список всех значений параметра 'tags' из запроса
         raw_tags = self.parent.data.getlist('tags')
+        tags = [tag.strip() for tag in raw_tags if tag.strip()]
         # Если параметр отсутствует или состоит только из пустых значений – фильтр не применяется
-        if not raw_tags or all(not t.strip() for t in raw_tags):
+        if not tags:
             return qs
-        # Для каждого переданного значения применяем фильтрацию по подстроке
-        for tag in raw_tags:
-            tag = tag.strip()
-            qs = qs.filter(tags__name__icontains=tag)
-        return qs
+
+        tag_conditions = [Q(tag__name__icontains=tag) for tag in tags]
+        matched_links = Note.tags.through.objects.filter(reduce(operator.or_, tag_conditions))
+
+        if self.parent.data.get('tags_mode', self.MODE_ALL) != self.MODE_ANY:
+            # Для каждого значения считаем подходящие теги заметки и требуем, чтобы нашёлся хотя бы один
+            term_counts = {
+                f'term_{index}': Count('tag_id', filter=condition)
+                for index, condition in enumerate(tag_conditions)
+            }
+            matched_links = (
+                matched_links.values('note_id')
+                .annotate(**term_counts)
+                .filter(**{f'{name}__gt': 0 for name in term_counts})
+            )
+
+        return qs.filter(pk__in=matched_links.values('note_id'))
 
 
 class NoteFilter(filters.FilterSet):
     # Используем наш кастомный фильтр для тегов
     tags = PartialTagFilter()
+    # Режим сопоставления тегов (all/any); применяется в PartialTagFilter, здесь только проверяется значение
+    tags_mode = filters.ChoiceFilter(
+        choices=[(PartialTagFilter.MODE_ALL, 'All tags'), (PartialTagFilter.MODE_ANY, 'Any tag')],
+        method='filter_tags_mode',
+        label='Tags mode'
+    )
 
     created_at_after = filters.DateTimeFilter(
         field_name='created_at',
@@ -69,3 +100,6 @@ class NoteFilter(filters.FilterSet):
         fields = {
             'language': ['exact'],
         }
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('note_service', '0002_tag_note_tags'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user_id', '-created_at'], name='note_user_created_idx'),
+        ),
+    ]
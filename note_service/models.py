@@ -1,5 +1,7 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class Tag(models.Model):
@@ -19,6 +21,10 @@ class Tag(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Триграммный индекс для поиска тегов по подстроке (tags__name__icontains)
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='tag_name_trgm_idx'),
+        ]
         verbose_name = "Tag"
         verbose_name_plural = "Tags"
 
@@ -51,5 +57,13 @@ class Note(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     tags = models.ManyToManyField(Tag, related_name='notes', blank=True)
 
+    class Meta:
+        indexes = [
+            # Список заметок пользователя: WHERE user_id = ... ORDER BY created_at DESC
+            models.Index(fields=['user_id', '-created_at'], name='note_user_created_idx'),
+            # Триграммный индекс для поиска по подстроке заголовка (SearchFilter по title)
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='note_title_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.title
@@ -1,7 +1,22 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class NotePagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+class NoteCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация заметок в порядке (-created_at, -id).
+    Курсор хранит created_at последней заметки (первое поле ordering) и смещение среди заметок с тем же
+    created_at; следующая страница выбирается условием created_at < курсора (индекс note_user_created_idx),
+    а не OFFSET по всему списку, поэтому дальние страницы стоят столько же, сколько первая, и не «съезжают»
+    при добавлении новых заметок. id только делает порядок однозначным и в курсор не входит.
+    Если задан ?ordering=..., курсор строится по первому полю этой сортировки.
+    """
+    page_size = NotePagination.page_size
+    page_size_query_param = 'page_size'
+    max_page_size = NotePagination.max_page_size
+    ordering = ('-created_at', '-id')
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Note, Tag
+from .utils.tags import resolve_tags
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -18,7 +19,7 @@ class NoteSerializer(serializers.ModelSerializer):
     Сериализатор для модели Note.
     - Поле tags возвращается с помощью TagSerializer (read-only).
     - Поле tag_names (write-only) позволяет передавать список имен тегов,
-      которые будут привязаны к заметке.
+      которые будут привязаны к заметке (теги находятся и создаются пакетно, см. resolve_tags).
     """
     tags = TagSerializer(many=True, read_only=True)
     tag_names = serializers.ListField(
@@ -45,11 +46,7 @@ class NoteSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         tag_names = validated_data.pop('tag_names', [])
         note = Note.objects.create(**validated_data)
-        tags = []
-        for name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=name)
-            tags.append(tag)
-        note.tags.set(tags)
+        note.tags.set(resolve_tags(tag_names))
         return note
 
     def update(self, instance, validated_data):
@@ -60,10 +57,6 @@ class NoteSerializer(serializers.ModelSerializer):
 
         # Если передан список tag_names, обновляем связь тегов
         if tag_names is not None:
-            tags = []
-            for name in tag_names:
-                tag, created = Tag.objects.get_or_create(name=name)
-                tags.append(tag)
-            instance.tags.set(tags)
+            instance.tags.set(resolve_tags(tag_names))
 
         return instance
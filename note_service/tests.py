@@ -1,3 +1,377 @@
+import uuid
+
+import jwt
+from django.conf import settings
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from note_service.filters import NoteFilter
+from note_service.models import Note, Tag
+from note_service.utils.tags import resolve_tags
+
+
+def api_client(user_id):
+    """
+    Клиент API с JWT пользователя user_id.
+    """
+    token = jwt.encode({'user_id': str(user_id), 'username': 'reader'}, settings.JWT_SECRET_KEY, algorithm='HS256')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def require_index(test, index_name):
+    """
+    Пропускает тест, если индекса нет в базе (например, без расширения pg_trgm триграммные индексы не создаются).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [index_name])
+        if cursor.fetchone() is None:
+            test.skipTest(f'индекс {index_name} отсутствует в базе')
+
+
+class LookupIndexTests(TestCase):
+    """
+    Список заметок пользователя обслуживается составным индексом (user_id, created_at),
+    поиск по подстроке заголовка заметки и имени тега — триграммными GIN-индексами.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        Note.objects.bulk_create(
+            Note(user_id=cls.user_id if number % 4 == 0 else uuid.uuid4(), title=f'Заметка {number}', language='en')
+            for number in range(200)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Note._meta.db_table}')
+
+    def test_notes_of_user_by_created_at(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = Note.objects.filter(user_id=self.user_id).order_by('-created_at').explain()
+        self.assertIn('note_user_created_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_notes_by_title_substring(self):
+        # GIN поддерживает только bitmap-просмотр, поэтому здесь отключаем лишь полный просмотр таблицы
+        require_index(self, 'note_title_trgm_idx')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Note.objects.filter(title__icontains='метк').explain()
+        self.assertIn('note_title_trgm_idx', plan)
+
+    def test_tags_by_name_substring(self):
+        require_index(self, 'tag_name_trgm_idx')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Tag.objects.filter(name__icontains='pyth').explain()
+        self.assertIn('tag_name_trgm_idx', plan)
+
+
+class NoteApiTests(TestCase):
+    """
+    Список и просмотр заметок: постоянное число SQL-запросов и курсорная пагинация.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        tags = Tag.objects.bulk_create(Tag(name=f'tag-{number}') for number in range(3))
+        cls.notes = Note.objects.bulk_create(
+            Note(user_id=cls.user_id, title=f'Заметка {number}', language='en') for number in range(30)
+        )
+        for note in cls.notes:
+            note.tags.set(tags)
+
+    def setUp(self):
+        self.client = api_client(self.user_id)
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        # count, заметки страницы, теги всех заметок страницы
+        for page_size in (5, 30):
+            with self.subTest(page_size=page_size), self.assertNumQueries(3):
+                response = self.client.get('/notes/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertEqual(len(response.data['results'][0]['tags']), 3)
+
+    def test_retrieve_query_count(self):
+        # заметка, её теги
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/notes/{self.notes[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['tags']), 3)
+
+    def test_cursor_pagination_returns_every_note_once(self):
+        # Часть заметок с одинаковым created_at: курсор различает их по смещению
+        Note.objects.filter(id__in=[note.id for note in self.notes[:10]]).update(created_at=self.notes[0].created_at)
+        seen = []
+        response = self.client.get('/notes/', {'pagination': 'cursor', 'page_size': 4})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(note['id'] for note in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), len(self.notes))
+        self.assertEqual(set(seen), {str(note.id) for note in self.notes})
+
+
+class BulkNoteActionTests(TestCase):
+    """
+    Массовые действия над заметками (BulkNoteActionView): результаты по каждому элементу в порядке запроса.
+    """
+    url = '/notes/bulk_action/'
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        self.client = api_client(self.user_id)
+        self.notes = [
+            Note.objects.create(user_id=self.user_id, title=f'Заметка {number}', text='Текст', language='en')
+            for number in range(3)
+        ]
+        self.other_note = Note.objects.create(user_id=uuid.uuid4(), title='Чужая', language='en')
+
+    def post(self, action, **data):
+        response = self.client.post(self.url, {'action': action, **data}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def tag_names(self, note):
+        return sorted(note.tags.values_list('name', flat=True))
+
+    def test_delete(self):
+        response = self.client.post(
+            self.url, {'action': 'delete', 'note_ids': [str(self.notes[0].id), str(self.other_note.id)]}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {'action': 'delete', 'note_ids': ['not-a-uuid']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Note.objects.count(), 4)
+
+        response = self.client.post(
+            self.url, {'action': 'delete', 'note_ids': [str(note.id) for note in self.notes[:2]]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Note.objects.filter(user_id=self.user_id)), [self.notes[2]])
+
+    def test_create(self):
+        results = self.post('create', notes=[
+            {'title': 'Первая', 'language': 'en', 'tag_names': ['a', 'b', 'a']},
+            {'language': 'en'},
+            {'title': 'Вторая', 'language': 'ru'},
+        ])
+
+        self.assertEqual([result['status'] for result in results], ['created', 'invalid', 'created'])
+        self.assertIn('title', results[1]['errors'])
+        first = Note.objects.get(id=results[0]['id'])
+        self.assertEqual((first.title, first.user_id), ('Первая', self.user_id))
+        self.assertEqual(self.tag_names(first), ['a', 'b'])
+        self.assertEqual(Note.objects.get(id=results[2]['id']).title, 'Вторая')
+
+    def test_update_statuses_in_request_order(self):
+        first, second, third = self.notes
+        results = self.post('update', notes=[
+            {'id': str(second.id), 'title': 'Новый заголовок'},
+            {'id': str(self.other_note.id), 'title': 'Взлом'},
+            {'id': str(first.id), 'language': 'x' * 20},
+            {'id': 'not-a-uuid', 'title': 'Нет'},
+            {'id': str(third.id), 'text': 'Новый текст'},
+        ])
+
+        self.assertEqual(
+            [(result['id'], result['status']) for result in results],
+            [(str(second.id), 'updated'), (str(self.other_note.id), 'not_found'), (str(first.id), 'invalid'),
+             ('not-a-uuid', 'not_found'), (str(third.id), 'updated')]
+        )
+        self.assertIn('language', results[2]['errors'])
+        self.other_note.refresh_from_db()
+        self.assertEqual(self.other_note.title, 'Чужая')
+        first.refresh_from_db()
+        self.assertEqual(first.language, 'en')
+
+    def test_update_writes_only_changed_fields_of_each_note(self):
+        first, second, _ = self.notes
+        with CaptureQueriesContext(connection) as queries:
+            self.post('update', notes=[
+                {'id': str(first.id), 'title': 'Новый заголовок'},
+                {'id': str(second.id), 'text': 'Новый текст'},
+            ])
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        title_update = next(sql for sql in updates if '"title" = ' in sql)
+        self.assertNotIn('"text" = ', title_update)
+        self.assertNotIn('"language" = ', title_update)
+        self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.title, first.text), ('Новый заголовок', 'Текст'))
+        self.assertEqual((second.title, second.text), ('Заметка 1', 'Новый текст'))
+
+    def test_update_retags_notes(self):
+        first, second, _ = self.notes
+        first.tags.set(Tag.objects.bulk_create([Tag(name='old'), Tag(name='keep')]))
+
+        self.post('update', notes=[
+            {'id': str(first.id), 'tag_names': ['keep', 'new']},
+            {'id': str(second.id), 'tag_names': []},
+        ])
+
+        self.assertEqual(self.tag_names(first), ['keep', 'new'])
+        self.assertEqual(self.tag_names(second), [])
+        self.assertTrue(Tag.objects.filter(name='old').exists())
+
+    def test_update_query_count_does_not_depend_on_note_count(self):
+        counts = []
+        for size in (2, 20):
+            notes = Note.objects.bulk_create(
+                Note(user_id=self.user_id, title='Заметка', language='en') for _ in range(size)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.post('update', notes=[
+                    {'id': str(note.id), 'title': f'Заметка {index}', 'tag_names': [f'tag-{index}', 'shared']}
+                    for index, note in enumerate(notes)
+                ])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        # SELECT ... FOR UPDATE, bulk_update, удаление старых связей, resolve_tags (3), новые связи + точка сохранения
+        self.assertLessEqual(counts[1], 9)
+
+    def test_add_and_remove_tags_in_request_order(self):
+        first, _, third = self.notes
+        note_ids = [str(third.id), str(self.other_note.id), 'not-a-uuid', str(first.id)]
+
+        results = self.post('add_tags', note_ids=note_ids, tag_names=['x', 'y'])
+        self.assertEqual(
+            [(str(result['id']), result['status']) for result in results],
+            [(str(third.id), 'updated'), (str(self.other_note.id), 'not_found'), ('not-a-uuid', 'not_found'),
+             (str(first.id), 'updated')]
+        )
+        self.assertEqual(self.tag_names(first), ['x', 'y'])
+        self.assertEqual(self.tag_names(self.other_note), [])
+
+        results = self.post('remove_tags', note_ids=note_ids, tag_names=['x'])
+        self.assertEqual([str(result['id']) for result in results], note_ids)
+        self.assertEqual(self.tag_names(third), ['y'])
+
+    def test_set_language_in_request_order(self):
+        first, second, _ = self.notes
+        note_ids = [str(second.id), str(self.other_note.id), str(first.id)]
+
+        results = self.post('set_language', note_ids=note_ids, language='ru')
+
+        self.assertEqual([str(result['id']) for result in results], note_ids)
+        self.assertEqual([result['status'] for result in results], ['updated', 'not_found', 'updated'])
+        self.assertEqual(
+            sorted(Note.objects.filter(language='ru').values_list('id', flat=True)), sorted([first.id, second.id])
+        )
+
+
+class ResolveTagsTests(TestCase):
+    """
+    Пакетное разрешение имён тегов (resolve_tags): число запросов не зависит от количества имён.
+    """
+
+    def setUp(self):
+        Tag.objects.bulk_create(Tag(name=f'tag-{number}') for number in range(10))
+        self.names = [f'tag-{number}' for number in range(20)]
+
+    def test_existing_and_new_tags(self):
+        # SELECT существующих, bulk_create недостающих, SELECT созданных
+        with self.assertNumQueries(3):
+            tags = resolve_tags(self.names)
+        self.assertEqual([tag.name for tag in tags], self.names)
+        self.assertEqual(Tag.objects.count(), 20)
+
+    def test_only_existing_tags(self):
+        with self.assertNumQueries(1):
+            tags = resolve_tags(self.names[:10])
+        self.assertEqual(len(tags), 10)
+
+    def test_duplicates(self):
+        # Повторы схлопываются; имена, различающиеся регистром, — разные теги (name уникален с учётом регистра)
+        with self.assertNumQueries(3):
+            tags = resolve_tags(['tag-0', 'Tag-0', 'tag-0', 'new', 'NEW', 'new'])
+        self.assertEqual([tag.name for tag in tags], ['tag-0', 'Tag-0', 'new', 'NEW'])
+        self.assertEqual(len({tag.pk for tag in tags}), 4)
+        self.assertEqual(Tag.objects.filter(name__iexact='new').count(), 2)
+
+    def test_note_write_with_twenty_tags(self):
+        client = api_client(uuid.uuid4())
+        # INSERT заметки, resolve_tags (3), связи tags.set (2: SELECT, INSERT), теги для ответа
+        with self.assertNumQueries(7):
+            response = client.post(
+                '/notes/', {'title': 'Заметка', 'language': 'en', 'tag_names': self.names}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(tag['name'] for tag in response.data['tags']), sorted(self.names))
+
+        names = self.names[5:] + [f'extra-{number}' for number in range(5)]
+        # заметка с тегами (2), UPDATE заметки, resolve_tags (3),
+        # связи tags.set (3: SELECT, DELETE, INSERT), теги для ответа
+        with self.assertNumQueries(10):
+            response = client.patch(f'/notes/{response.data["id"]}/', {'tag_names': names}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(tag['name'] for tag in response.data['tags']), sorted(names))
+
+
+class TagFilterTests(TestCase):
+    """
+    Фильтр заметок по частям имён тегов (PartialTagFilter) в режимах all и any.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = uuid.uuid4()
+        tags = {name: Tag.objects.create(name=name) for name in ('Python', 'python-web', 'Redux', 'rust', 'go')}
+        cls.notes = {}
+        for title, names in {
+            'python+redux': ['Python', 'Redux'],
+            'python-web+go': ['python-web', 'go'],
+            'redux': ['Redux'],
+            'rust': ['rust'],
+            'none': [],
+        }.items():
+            note = Note.objects.create(user_id=cls.user_id, title=title, language='en')
+            note.tags.set(tags[name] for name in names)
+            cls.notes[title] = note
+
+    def filter_titles(self, query):
+        queryset = NoteFilter(QueryDict(query), queryset=Note.objects.filter(user_id=self.user_id)).qs
+        # Один запрос независимо от количества значений tags
+        with self.assertNumQueries(1):
+            return sorted(note.title for note in queryset)
+
+    def test_all_mode_requires_every_term(self):
+        self.assertEqual(self.filter_titles('tags=PYT&tags=dux'), ['python+redux'])
+        self.assertEqual(self.filter_titles('tags=pyt&tags=go&tags_mode=all'), ['python-web+go'])
+        self.assertEqual(self.filter_titles('tags=pyt&tags=dux&tags=go'), [])
+
+    def test_all_mode_matches_term_against_any_tag(self):
+        # Одному тегу может соответствовать несколько значений
+        self.assertEqual(self.filter_titles('tags=py&tags=thon'), ['python+redux', 'python-web+go'])
+
+    def test_any_mode_requires_one_term(self):
+        self.assertEqual(self.filter_titles('tags=pyt&tags=dux&tags_mode=any'),
+                         ['python+redux', 'python-web+go', 'redux'])
+        self.assertEqual(self.filter_titles('tags=ru&tags=nothing&tags_mode=any'), ['rust'])
+
+    def test_blank_terms_are_ignored(self):
+        self.assertEqual(len(self.filter_titles('tags=+&tags=')), 5)
+
+    def test_notes_are_not_duplicated(self):
+        # Заметка с двумя подходящими тегами возвращается один раз
+        self.assertEqual(self.filter_titles('tags=o&tags_mode=any'), ['python+redux', 'python-web+go'])
 
-# Create your tests here.
+    def test_api_filter(self):
+        response = api_client(self.user_id).get('/notes/', {'tags': ['pyt', 'dux'], 'tags_mode': 'any'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        response = api_client(self.user_id).get('/notes/', {'tags': ['pyt'], 'tags_mode': 'some'})
+        self.assertEqual(response.status_code, 400)
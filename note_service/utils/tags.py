@@ -0,0 +1,50 @@
+from note_service.models import Note, Tag
+
+
+def resolve_tags(names):
+    """
+    Возвращает теги с указанными именами, создавая недостающие, за фиксированное число запросов
+    независимо от количества имён:
+      1. один SELECT существующих тегов;
+      2. один bulk_create недостающих с ignore_conflicts=True — если параллельный запрос уже создал тег
+         с тем же именем (name уникален), конфликт пропускается, а не приводит к IntegrityError;
+      3. один повторный SELECT только что созданных (bulk_create с ignore_conflicts не возвращает их id).
+
+    Подходит и для одной заметки, и для массового импорта (имена всех заметок передаются одним списком).
+
+    :param names: Итерируемый набор имён тегов (повторы допускаются)
+    :return: Список объектов Tag в порядке первого появления имён, без повторов
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+
+    tags_by_name = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+
+    missing_names = [name for name in names if name not in tags_by_name]
+    if missing_names:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing_names], ignore_conflicts=True)
+        tags_by_name.update({tag.name: tag for tag in Tag.objects.filter(name__in=missing_names)})
+
+    return [tags_by_name[name] for name in names]
+
+
+def link_tags(notes, tag_names_per_note):
+    """
+    Привязывает теги к заметкам одним bulk_create по промежуточной таблице (уже существующие связи пропускаются).
+    Имена всех тегов разрешаются одним вызовом resolve_tags.
+
+    :param notes: Список сохранённых заметок
+    :param tag_names_per_note: Списки имён тегов для каждой заметки (в том же порядке)
+    """
+    tags_by_name = {
+        tag.name: tag for tag in resolve_tags(name for names in tag_names_per_note for name in names)
+    }
+    through = Note.tags.through
+    links = [
+        through(note_id=note.pk, tag_id=tags_by_name[name].pk)
+        for note, names in zip(notes, tag_names_per_note)
+        for name in dict.fromkeys(names)
+    ]
+    if links:
+        through.objects.bulk_create(links, ignore_conflicts=True)
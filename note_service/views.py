@@ -1,35 +1,44 @@
+import uuid
+
 from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from .models import Note, Tag
 from .serializers import NoteSerializer, TagSerializer
-from .pagination import NotePagination
+from .pagination import NoteCursorPagination, NotePagination
 from .filters import NoteFilter
+from book_api.pagination import CursorPaginationMixin
 from note_service.utils.permissions import IsOwner
+from note_service.utils.tags import link_tags
 from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с заметками.
     Позволяет просматривать, создавать, редактировать и удалять заметки.
     Применяет пагинацию, фильтрацию (по language, датам, тегам) и поиск по title.
+    Для больших списков есть курсорная пагинация: ?pagination=cursor (см. NoteCursorPagination).
     Доступ разрешён только аутентифицированным пользователям, и только владельцу заметки.
     """
     serializer_class = NoteSerializer
     pagination_class = NotePagination
+    cursor_pagination_class = NoteCursorPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = NoteFilter
     search_fields = ['title']
     ordering_fields = ['created_at', 'updated_at', 'title']  # Разрешённые поля для сортировки
-    ordering = ['-created_at']  # Сортировка по умолчанию
+    ordering = ['-created_at', '-id']  # Сортировка по умолчанию (id — для однозначного порядка при равных датах)
     permission_classes = [permissions.IsAuthenticated, IsOwner]
 
     def get_queryset(self):
-        return Note.objects.filter(user_id=self.request.user.id)
+        # Теги всех заметок страницы загружаются одним дополнительным запросом, а не запросом на каждую заметку
+        return Note.objects.filter(user_id=self.request.user.id).prefetch_related('tags')
 
     def perform_create(self, serializer):
         serializer.save(user_id=self.request.user.id)
@@ -50,44 +59,250 @@ class BulkNoteActionView(APIView):
     """
     View для выполнения массовых операций над заметками.
 
-    Поддерживается действие "delete" - массовое удаление заметок.
-    Доступ разрешён только аутентифицированным пользователям.
+    Поддерживаемые действия (поле "action"):
+      - "delete": массовое удаление заметок note_ids;
+      - "create": создание заметок из списка notes ([{title, text, language, tag_names}, ...]);
+      - "update": изменение заметок из списка notes ([{id, title?, text?, language?, tag_names?}, ...]),
+        tag_names заменяет теги заметки;
+      - "add_tags" / "remove_tags": добавление / удаление тегов tag_names у заметок note_ids;
+      - "set_language": установка языка language заметкам note_ids.
+
+    Каждое действие выполняется несколькими set-based запросами (bulk_create, bulk_update, update)
+    в одной транзакции, независимо от количества заметок. Действия, кроме delete, возвращают результат
+    по каждому элементу: {"id": ..., "status": "created" | "updated" | "not_found" | "invalid", "errors": ...}.
+    Доступ разрешён только аутентифицированным пользователям и только к своим заметкам.
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    # Максимальное количество заметок в одном запросе
+    max_items = 1000
+
     def post(self, request, *args, **kwargs):
         action = request.data.get("action")
-        note_ids = request.data.get("note_ids", [])
-
-        if not note_ids or not isinstance(note_ids, list):
+        handlers = {
+            "delete": self.bulk_delete,
+            "create": self.bulk_create,
+            "update": self.bulk_update,
+            "add_tags": self.add_tags,
+            "remove_tags": self.remove_tags,
+            "set_language": self.set_language,
+        }
+        handler = handlers.get(action)
+        if handler is None:
             return Response(
-                {"detail": "note_ids must be a non-empty list"},
+                {"detail": f"Unknown action: {action}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return handler(request)
 
-        if action == "delete":
-            with transaction.atomic():
-                # Выбираем заметки, принадлежащие текущему пользователю
-                notes_qs = Note.objects.filter(pk__in=note_ids, user_id=request.user.id)
+    def _get_list(self, request, key):
+        """
+        Возвращает непустой список request.data[key] или Response с ошибкой валидации.
+        """
+        items = request.data.get(key)
+        if not items or not isinstance(items, list):
+            return None, Response(
+                {"detail": f"{key} must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_items:
+            return None, Response(
+                {"detail": f"{key} must contain at most {self.max_items} items"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return items, None
 
-                # Если количество найденных заметок меньше переданного списка,
-                # значит некоторые заметки не принадлежат пользователю.
-                if notes_qs.count() != len(note_ids):
-                    return Response(
-                        {"detail": "Some notes do not belong to the current user."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+    def _get_tag_names(self, request):
+        tag_names, error = self._get_list(request, "tag_names")
+        if error:
+            return None, error
+        field = serializers.ListField(child=serializers.CharField(max_length=100))
+        try:
+            return field.run_validation(tag_names), None
+        except serializers.ValidationError as e:
+            return None, Response({"tag_names": e.detail}, status=status.HTTP_400_BAD_REQUEST)
 
-                delete_count = notes_qs.count()
-                notes_qs.delete()
+    @staticmethod
+    def _normalize_id(value):
+        """
+        Приводит id заметки к каноническому виду UUID (строкой) или возвращает None, если id некорректен.
+        """
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            return None
 
-            return Response(
-                {"detail": f"Deleted {delete_count} notes."},
-                status=status.HTTP_200_OK
+    def _get_user_notes(self, request, note_ids, only_id=True):
+        """
+        Возвращает заметки текущего пользователя из note_ids: словарь {канонический id: заметка}.
+        Заметки блокируются (select_for_update) до конца транзакции, поэтому вызывать внутри transaction.atomic().
+        С only_id=True из базы загружаются только id заметок.
+        """
+        normalized_ids = [note_id for note_id in map(self._normalize_id, note_ids) if note_id]
+        notes = Note.objects.select_for_update().filter(pk__in=normalized_ids, user_id=request.user.id)
+        if only_id:
+            notes = notes.only('id')
+        return {str(note.pk): note for note in notes}
+
+    def _get_results(self, note_ids, notes_by_id):
+        """
+        Результаты по каждому id из note_ids в порядке запроса: updated для найденных заметок, иначе not_found.
+        """
+        results = []
+        for note_id in note_ids:
+            note = notes_by_id.get(self._normalize_id(note_id))
+            if note is None:
+                results.append({"id": note_id, "status": "not_found"})
+            else:
+                results.append({"id": note.pk, "status": "updated"})
+        return results
+
+    def bulk_delete(self, request):
+        note_ids, error = self._get_list(request, "note_ids")
+        if error:
+            return error
+
+        with transaction.atomic():
+            # Выбираем заметки, принадлежащие текущему пользователю
+            notes_qs = Note.objects.filter(
+                pk__in=[note_id for note_id in map(self._normalize_id, note_ids) if note_id],
+                user_id=request.user.id
             )
+            delete_count = notes_qs.count()
 
-        else:
-            return Response(
-                {"detail": f"Unknown action: {action}"},
-                status=status.HTTP_400_BAD_REQUEST
+            # Если количество найденных заметок меньше переданного списка,
+            # значит некоторые заметки не принадлежат пользователю.
+            if delete_count != len(note_ids):
+                return Response(
+                    {"detail": "Some notes do not belong to the current user."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            notes_qs.delete()
+
+        return Response(
+            {"detail": f"Deleted {delete_count} notes."},
+            status=status.HTTP_200_OK
+        )
+
+    def bulk_create(self, request):
+        items, error = self._get_list(request, "notes")
+        if error:
+            return error
+
+        results = []
+        notes = []
+        note_tag_names = []
+        for item in items:
+            serializer = NoteSerializer(data=item)
+            if not serializer.is_valid():
+                results.append({"id": None, "status": "invalid", "errors": serializer.errors})
+                continue
+            data = dict(serializer.validated_data)
+            note_tag_names.append(data.pop('tag_names', []))
+            note = Note(user_id=request.user.id, **data)
+            notes.append(note)
+            results.append({"id": note.id, "status": "created"})
+
+        with transaction.atomic():
+            Note.objects.bulk_create(notes)
+            link_tags(notes, note_tag_names)
+
+        return Response({"action": "create", "results": results}, status=status.HTTP_200_OK)
+
+    def bulk_update(self, request):
+        items, error = self._get_list(request, "notes")
+        if error:
+            return error
+
+        if not all(isinstance(item, dict) for item in items):
+            return Response({"detail": "notes must be a list of objects"}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        results = []
+        # Поля, изменённые у каждой заметки: записываются только они, чтобы не перезаписать
+        # чужие изменения остальных полей устаревшими значениями
+        note_fields = {}
+        retagged = {}
+        with transaction.atomic():
+            notes_by_id = self._get_user_notes(request, [item.get('id') for item in items], only_id=False)
+            for item in items:
+                note_id = item.get('id')
+                note = notes_by_id.get(self._normalize_id(note_id))
+                if note is None:
+                    results.append({"id": note_id, "status": "not_found"})
+                    continue
+
+                serializer = NoteSerializer(note, data=item, partial=True)
+                if not serializer.is_valid():
+                    results.append({"id": note_id, "status": "invalid", "errors": serializer.errors})
+                    continue
+
+                data = dict(serializer.validated_data)
+                if 'tag_names' in data:
+                    retagged[note.pk] = (note, data.pop('tag_names'))
+                for attr, value in data.items():
+                    setattr(note, attr, value)
+                # bulk_update не вызывает auto_now, поэтому время изменения выставляем сами
+                note.updated_at = now
+                note_fields.setdefault(note.pk, set()).update(data, {'updated_at'})
+                results.append({"id": note_id, "status": "updated"})
+
+            # Один bulk_update на каждый набор изменённых полей
+            groups = {}
+            for note_pk, fields in note_fields.items():
+                groups.setdefault(frozenset(fields), []).append(notes_by_id[str(note_pk)])
+            for fields, notes in groups.items():
+                Note.objects.bulk_update(notes, sorted(fields))
+            if retagged:
+                Note.tags.through.objects.filter(note_id__in=retagged).delete()
+                link_tags([note for note, _ in retagged.values()], [names for _, names in retagged.values()])
+
+        return Response({"action": "update", "results": results}, status=status.HTTP_200_OK)
+
+    def add_tags(self, request):
+        return self._change_tags(request, add=True)
+
+    def remove_tags(self, request):
+        return self._change_tags(request, add=False)
+
+    def _change_tags(self, request, add):
+        note_ids, error = self._get_list(request, "note_ids")
+        if error:
+            return error
+        tag_names, error = self._get_tag_names(request)
+        if error:
+            return error
+
+        with transaction.atomic():
+            notes_by_id = self._get_user_notes(request, note_ids)
+            notes = list(notes_by_id.values())
+            note_pks = [note.pk for note in notes]
+            if add:
+                link_tags(notes, [tag_names] * len(notes))
+            else:
+                Note.tags.through.objects.filter(note_id__in=note_pks, tag__name__in=tag_names).delete()
+            Note.objects.filter(pk__in=note_pks).update(updated_at=timezone.now())
+
+        results = self._get_results(note_ids, notes_by_id)
+        return Response({"action": "add_tags" if add else "remove_tags", "results": results},
+                        status=status.HTTP_200_OK)
+
+    def set_language(self, request):
+        note_ids, error = self._get_list(request, "note_ids")
+        if error:
+            return error
+        try:
+            language = NoteSerializer().fields['language'].run_validation(request.data.get('language', ''))
+        except serializers.ValidationError as e:
+            return Response({"language": e.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            notes_by_id = self._get_user_notes(request, note_ids)
+            Note.objects.filter(pk__in=[note.pk for note in notes_by_id.values()]).update(
+                language=language,
+                updated_at=timezone.now()
             )
+
+        results = self._get_results(note_ids, notes_by_id)
+        return Response({"action": "set_language", "results": results}, status=status.HTTP_200_OK)